@@ -0,0 +1,31 @@
+import inspect
+import sys
+from typing import Iterable, Optional
+
+# Finished Battle objects each agent keeps; older ones are summarized and evicted
+KEEP_LAST_BATTLES = 3
+
+
+def peak_rss_mb() -> Optional[float]:
+    """Peak resident set size of this process so far, None where the resource module is missing"""
+    try:
+        import resource
+    except ImportError:  # Windows
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / 2**20 if sys.platform == "darwin" else peak / 2**10  # bytes on macOS, KiB elsewhere
+
+
+def retention_kwargs(agent_class) -> dict:
+    """Only agents that support the retention policy get a keep-last-N setting"""
+    if "keep_last_battles" in inspect.signature(agent_class).parameters:
+        return {"keep_last_battles": KEEP_LAST_BATTLES}
+    return {}
+
+
+def close_players(players: Iterable) -> None:
+    """Writes out what each agent still buffers; players without close() have nothing to flush"""
+    for player in players:
+        close = getattr(player, "close", None)
+        if close is not None:
+            close()
@@ -0,0 +1,20 @@
+import argparse
+
+from offline_battles import AGENT_PATH, load_module
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Rebuild the shipped damage/KO score tables for our team")
+    parser.add_argument("--agent", default=AGENT_PATH)
+    args = parser.parse_args()
+
+    module = load_module(args.agent, "score_agent")
+    table = module.ScoreTable.build(module.team)
+    table.save()
+    n_moves, n_species, n_buckets, _ = table.table.shape
+    print(f"{n_moves} moves x {n_species} species x {n_buckets} spread buckets")
+    print(f"Score table written to {module.ScoreTable.TABLE_FILE}")
+
+
+if __name__ == "__main__":
+    main()
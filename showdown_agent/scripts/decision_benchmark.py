@@ -0,0 +1,166 @@
+import argparse
+import glob
+import inspect
+import json
+import os
+import sys
+import time
+import tracemalloc
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+from tabulate import tabulate
+
+from offline_battles import fresh_agent, load_module
+from replay_log import battle_tag, read_log, rebuild_battles
+
+SCRIPTS = os.path.dirname(os.path.abspath(__file__))
+PLAYERS_FOLDER = os.path.join(SCRIPTS, "players")
+REPLAYS_FOLDER = os.path.join(SCRIPTS, "replays")
+BASELINE_FILE = os.path.join(SCRIPTS, "results", "decision_benchmark_baseline.json")
+
+
+def list_agents(names: List[str]) -> Dict[str, str]:
+    """Agent name to module path for players/ and players/iterations/"""
+    paths = sorted(glob.glob(os.path.join(PLAYERS_FOLDER, "*.py")))
+    paths += sorted(glob.glob(os.path.join(PLAYERS_FOLDER, "iterations", "*.py")))
+    agents = {os.path.relpath(p, PLAYERS_FOLDER)[:-3].replace(os.sep, "/"): p for p in paths}
+    if names:
+        agents = {name: path for name, path in agents.items() if name in names or os.path.basename(name) in names}
+    return agents
+
+
+def load_corpus(folder: str, limit: Optional[int]) -> List[Tuple[str, str, List[List[str]]]]:
+    """(replay owner, battle tag, protocol lines) for every saved replay under the folder"""
+    corpus = []
+    for path in sorted(glob.glob(os.path.join(folder, "**", "*.html"), recursive=True)):
+        username = os.path.basename(path).split(" - ", 1)[0]
+        corpus.append((username, battle_tag(path), read_log(path)))
+    return corpus[:limit] if limit else corpus
+
+
+def build_states(corpus) -> list:
+    """Fresh Battles for one agent, so no agent sees state another agent's run left behind"""
+    return [battle for username, tag, lines in corpus for battle in rebuild_battles(lines, username, tag)]
+
+
+def decide(agent, battle):
+    action = agent.choose_move(battle)
+    if inspect.isawaitable(action):
+        raise TypeError("asynchronous choose_move is not supported offline")
+    return action
+
+
+def measure(agent, states: list, repeats: int) -> Dict:
+    for battle in states:  # first pass builds per-battle models, as the first turn of a live battle does
+        decide(agent, battle)
+
+    timings = np.zeros((repeats, len(states)))
+    start = time.perf_counter()
+    for repeat in range(repeats):
+        for i, battle in enumerate(states):
+            begin = time.perf_counter()
+            decide(agent, battle)
+            timings[repeat, i] = time.perf_counter() - begin
+    elapsed = time.perf_counter() - start
+
+    # Allocations in a separate pass: tracing slows every allocation down
+    tracemalloc.start()
+    peaks, allocated = [], []
+    for battle in states:
+        tracemalloc.reset_peak()
+        before = tracemalloc.get_traced_memory()[0]
+        decide(agent, battle)
+        current, peak = tracemalloc.get_traced_memory()
+        peaks.append(peak - before)
+        allocated.append(max(current - before, 0))
+    tracemalloc.stop()
+
+    # Each state's median over the repeats, so one scheduler hiccup does not move the percentiles
+    latencies_ms = np.median(timings, axis=0) * 1000
+    return {
+        "decisions": timings.size,
+        "p50_ms": float(np.percentile(latencies_ms, 50)),
+        "p90_ms": float(np.percentile(latencies_ms, 90)),
+        "p99_ms": float(np.percentile(latencies_ms, 99)),
+        "max_ms": float(latencies_ms.max()),
+        "decisions_per_s": timings.size / elapsed,
+        "peak_kib": float(np.mean(peaks)) / 1024,
+        "retained_kib": float(np.mean(allocated)) / 1024,
+    }
+
+
+def regressions(results: Dict[str, Dict], baseline: Dict[str, Dict], threshold: float, min_delta_ms: float) -> List[str]:
+    """Agents whose median or p90 latency grew by more than `threshold` and `min_delta_ms` over the baseline"""
+    failures = []
+    for name, result in results.items():
+        if name not in baseline:
+            continue
+        for key in ("p50_ms", "p90_ms"):
+            limit = max(baseline[name][key] * (1 + threshold), baseline[name][key] + min_delta_ms)
+            if result[key] > limit:
+                failures.append(f"{name} {key} {result[key]:.2f} > {limit:.2f} ({baseline[name][key]:.2f} + {threshold:.0%})")
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Offline choose_move latency, allocations and throughput on battle states rebuilt from saved replays"
+    )
+    parser.add_argument("agents", nargs="*", help="agents to run, e.g. tlim334 or 0005_tlim334_beat_simple_uber "
+                                                  "(default: players/ and players/iterations/)")
+    parser.add_argument("--replays", default=REPLAYS_FOLDER)
+    parser.add_argument("--limit", type=int, help="use only the first N replays")
+    parser.add_argument("--repeats", type=int, default=5, help="timed passes over the corpus")
+    parser.add_argument("--baseline", default=BASELINE_FILE, help="latencies to compare against (machine specific)")
+    parser.add_argument("--threshold", type=float, default=0.25, help="allowed relative latency growth")
+    parser.add_argument("--min-delta-ms", type=float, default=0.05,
+                        help="ignore growth smaller than this, below timer and scheduler noise")
+    parser.add_argument("--save-baseline", action="store_true", help="record this run as the new baseline")
+    parser.add_argument("--output", help="write the results as JSON")
+    args = parser.parse_args()
+
+    corpus = load_corpus(args.replays, args.limit)
+    if not corpus:
+        parser.error(f"no replays under {args.replays}")
+    print(f"{len(corpus)} replays, {len(build_states(corpus))} decision states")
+
+    results: Dict[str, Dict] = {}
+    for name, path in list_agents(args.agents).items():
+        try:
+            module = load_module(path, f"benchmark_{name.replace('/', '_').replace('.', '_')}")
+            if not hasattr(module, "CustomAgent"):
+                continue
+            results[name] = measure(fresh_agent(module, "benchmark"), build_states(corpus), args.repeats)
+        except Exception as error:
+            print(f"{name}: skipped ({type(error).__name__}: {error})")
+    print(tabulate([{"agent": name, **result} for name, result in results.items()], headers="keys", floatfmt=".2f"))
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as file:
+            json.dump(results, file, indent=2)
+    if args.save_baseline:
+        baseline = {}
+        if os.path.exists(args.baseline):
+            with open(args.baseline, "r", encoding="utf-8") as file:
+                baseline = json.load(file)
+        baseline.update(results)
+        with open(args.baseline, "w", encoding="utf-8") as file:
+            json.dump(baseline, file, indent=2, sort_keys=True)
+        print(f"Baseline written to {args.baseline}")
+        return
+    if not os.path.exists(args.baseline):
+        print("No baseline yet; run with --save-baseline to record one")
+        return
+
+    with open(args.baseline, "r", encoding="utf-8") as file:
+        failures = regressions(results, json.load(file), args.threshold, args.min_delta_ms)
+    for failure in failures:
+        print(f"REGRESSION {failure}")
+    if failures:
+        sys.exit(1)
+    print(f"No latency regression beyond {args.threshold:.0%}")
+
+
+if __name__ == "__main__":
+    main()
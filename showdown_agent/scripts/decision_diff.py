@@ -0,0 +1,147 @@
+import argparse
+import glob
+import json
+import os
+import random
+import time
+import zlib
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Tuple
+
+import numpy as np
+from tabulate import tabulate
+
+from decision_benchmark import REPLAYS_FOLDER, decide, list_agents
+from offline_battles import fresh_agent, load_module, spawn_context
+from replay_log import battle_tag, read_log, rebuild_battles
+
+
+def label(agent, battle) -> str:
+    # every iteration shares _assess_battle_state/_determine_strategy, so strategies compare across them
+    try:
+        return agent._determine_strategy(agent._assess_battle_state(battle))
+    except Exception as error:
+        return f"error: {type(error).__name__}"
+
+
+def run_chunk(agent_name: str, agent_path: str, replay_paths: List[str]) -> Tuple[List[Dict], float]:
+    """Runs in a worker process: one agent over whole replays, each turn decided as its own battle"""
+    module = load_module(agent_path, f"diff_{agent_name.replace('/', '_').replace('.', '_')}")
+    agent = fresh_agent(module, "diff")
+    rows = []
+    start = time.perf_counter()
+    for path in replay_paths:
+        tag = battle_tag(path)
+        # agents that fall back on a random move must fall back the same way for both sides
+        seed = zlib.crc32(tag.encode())
+        random.seed(seed)
+        np.random.seed(seed)
+        username = os.path.basename(path).split(" - ", 1)[0]
+        for battle in rebuild_battles(read_log(path), username, tag):
+            strategy = label(agent, battle)
+            begin = time.perf_counter()
+            try:
+                action = decide(agent, battle).message
+            except Exception as error:
+                action = f"error: {type(error).__name__}: {error}"
+            elapsed = time.perf_counter() - begin
+            context = agent._context(battle.battle_tag) if hasattr(agent, "contexts") else None
+            rows.append({"battle_tag": tag, "turn": battle.turn, "action": action, "strategy": strategy,
+                         "rule": getattr(context, "rule", None) or "-", "seconds": elapsed})
+    return rows, time.perf_counter() - start
+
+
+def run(agents: Dict[str, str], replay_paths: List[str], workers: int) -> Dict[str, Dict]:
+    """Both agents over the corpus, split into per-worker chunks of whole replays"""
+    n_chunks = max(1, min(len(replay_paths), workers // len(agents) or 1))
+    chunks = [replay_paths[i::n_chunks] for i in range(n_chunks)]
+    results: Dict[str, Dict] = {name: {"rows": [], "worker_seconds": 0.0} for name in agents}
+    start = time.perf_counter()
+    with ProcessPoolExecutor(workers, mp_context=spawn_context()) as pool:
+        futures = {pool.submit(run_chunk, name, path, chunk): name for name, path in agents.items() for chunk in chunks}
+        for future, name in futures.items():
+            rows, seconds = future.result()
+            results[name]["rows"] += rows
+            results[name]["worker_seconds"] += seconds
+    print(f"Ran in {time.perf_counter() - start:.1f}s on {workers} workers")
+    return results
+
+
+def compare(results: Dict[str, Dict], first: str, second: str) -> Tuple[List[Dict], List[Dict]]:
+    """Per (strategy, rule) of the first agent: how often the second chose differently, plus every difference"""
+    theirs = {(r["battle_tag"], r["turn"]): r for r in results[second]["rows"]}
+    groups: Dict[Tuple[str, str], Dict] = defaultdict(lambda: {"states": 0, "differ": 0, "their_rules": defaultdict(int)})
+    differences = []
+    for ours in results[first]["rows"]:
+        other = theirs.get((ours["battle_tag"], ours["turn"]))
+        if other is None:
+            continue
+        group = groups[(ours["strategy"], ours["rule"])]
+        group["states"] += 1
+        if ours["action"] != other["action"]:
+            group["differ"] += 1
+            group["their_rules"][f"{other['strategy']} / {other['rule']}"] += 1
+            differences.append({"battle_tag": ours["battle_tag"], "turn": ours["turn"],
+                                first: ours["action"], second: other["action"],
+                                "strategy": ours["strategy"], "rule": ours["rule"],
+                                "their_strategy": other["strategy"], "their_rule": other["rule"]})
+    summary = []
+    for (strategy, rule), group in sorted(groups.items(), key=lambda item: -item[1]["differ"]):
+        top = max(group["their_rules"].items(), key=lambda item: item[1])[0] if group["their_rules"] else ""
+        summary.append({"strategy": strategy, "rule": rule, "states": group["states"], "differ": group["differ"],
+                        "differ_rate": group["differ"] / group["states"], "their strategy / rule": top})
+    return summary, differences
+
+
+def timing(results: Dict[str, Dict]) -> List[Dict]:
+    rows = []
+    for name, result in results.items():
+        seconds = np.array([r["seconds"] for r in result["rows"]]) * 1000
+        rows.append({"agent": name, "decisions": len(seconds), "p50_ms": np.percentile(seconds, 50),
+                     "p99_ms": np.percentile(seconds, 99), "max_ms": seconds.max(),
+                     "errors": sum(r["action"].startswith("error") for r in result["rows"]),
+                     "worker_s": result["worker_seconds"]})
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Where two agent iterations choose differently on states rebuilt from saved replays"
+    )
+    parser.add_argument("first", help="agent name as in players/, e.g. tlim334 or iterations/0007_tlim334_completely_unorthodox")
+    parser.add_argument("second")
+    parser.add_argument("--replays", default=REPLAYS_FOLDER)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--examples", type=int, default=10, help="differing states to print")
+    parser.add_argument("--output", help="write the summary and every difference as JSON")
+    args = parser.parse_args()
+
+    available = list_agents([])
+    agents = {}
+    for name in (args.first, args.second):
+        match = available.get(name) or next((p for n, p in available.items() if os.path.basename(n) == name), None)
+        if match is None:
+            parser.error(f"unknown agent {name}; choose from {sorted(available)}")
+        agents[name] = match
+    if len(agents) < 2:
+        parser.error("compare two different agents")
+    replay_paths = sorted(glob.glob(os.path.join(args.replays, "**", "*.html"), recursive=True))
+    if not replay_paths:
+        parser.error(f"no replays under {args.replays}")
+
+    results = run(agents, replay_paths, args.workers)
+    summary, differences = compare(results, args.first, args.second)
+    n_states = sum(row["states"] for row in summary)
+    print(f"{len(differences)} of {n_states} states differ")
+    print(tabulate(summary, headers="keys", floatfmt=".2f"))
+    print(tabulate(differences[:args.examples], headers="keys"))
+    print(tabulate(timing(results), headers="keys", floatfmt=".2f"))
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as file:
+            json.dump({"summary": summary, "differences": differences, "timing": timing(results)}, file, indent=2, default=float)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,128 @@
+import argparse
+import json
+import os
+from collections import defaultdict
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from tabulate import tabulate
+
+from replay_log import hp_fraction, read_log, replay_path, role_of
+
+HP_EVENTS = ("switch", "drag", "replace", "-damage", "-heal", "-sethp")
+
+
+def mon_key(ident: str) -> str:
+    # "p2a: Zacian" and "p2: Zacian" name the same Pokemon
+    role, _, name = ident.partition(": ")
+    return f"{role[:2]}: {name}"
+
+
+def turn_outcomes(lines: List[List[str]], role: str) -> Dict[int, Dict[str, float]]:
+    """HP dealt and taken (fractions of a Pokemon) and faints on each side, per turn"""
+    hp: Dict[str, float] = {}
+    outcomes: Dict[int, Dict[str, float]] = {}
+    current = {"dealt": 0.0, "taken": 0.0, "ko": 0, "fainted": 0}
+    turn = 0
+    for line in lines:
+        if len(line) < 2:
+            continue
+        event = line[1]
+        if event in ("turn", "win", "tie"):
+            outcomes[turn] = current
+            current = {"dealt": 0.0, "taken": 0.0, "ko": 0, "fainted": 0}
+            turn = int(line[2]) if event == "turn" else turn + 1
+        elif event in HP_EVENTS and len(line) > 3:
+            key = mon_key(line[2])
+            value = hp_fraction(line[4] if event in ("switch", "drag", "replace") and len(line) > 4 else line[3])
+            before = hp.get(key, 1.0)
+            hp[key] = value
+            if event in ("-damage", "-sethp") and value < before:
+                current["dealt" if not key.startswith(role) else "taken"] += before - value
+        elif event == "faint" and len(line) > 2:
+            current["fainted" if line[2].startswith(role) else "ko"] += 1
+    outcomes[turn] = current
+    return outcomes
+
+
+def read_records(path: str) -> Iterator[Dict]:
+    with open(path, "r", encoding="utf-8") as file:
+        for line in file:
+            line = line.strip()
+            if line:
+                yield json.loads(line)
+
+
+def join(log_path: str, replay_folder: str) -> Iterator[Tuple[Dict, Optional[Dict[str, float]], Dict]]:
+    """(decision, its turn's outcome, battle result) streamed as each battle's result record arrives"""
+    pending: Dict[str, List[Dict]] = defaultdict(list)
+    for record in read_records(log_path):
+        if record["kind"] == "decision":
+            pending[record["battle_tag"]].append(record)
+            continue
+        decisions = pending.pop(record["battle_tag"], [])
+        outcomes: Dict[int, Dict[str, float]] = {}
+        path = replay_path(replay_folder, record["username"], record["battle_tag"])
+        if path is not None:
+            lines = read_log(path)
+            role = role_of(lines, record["username"])
+            if role is not None:
+                outcomes = turn_outcomes(lines, role)
+        for decision in decisions:
+            yield decision, outcomes.get(decision["turn"]), record
+    if pending:
+        print(f"{len(pending)} battles have decisions but no result (still running or crashed)")
+
+
+def summarize(rows: Iterator[Tuple[Dict, Optional[Dict[str, float]], Dict]]) -> List[Dict]:
+    totals: Dict[str, Dict[str, float]] = defaultdict(lambda: defaultdict(float))
+    battles: Dict[str, bool] = {}
+    for decision, outcome, result in rows:
+        battles[result["battle_tag"]] = bool(result["won"])
+        total = totals[decision["rule"] or "unknown"]
+        total["n"] += 1
+        total["wins"] += bool(result["won"])
+        if outcome is not None:
+            total["joined"] += 1
+            for key, value in outcome.items():
+                total[key] += value
+    baseline = sum(battles.values()) / max(len(battles), 1)
+
+    summary = []
+    for rule, total in sorted(totals.items(), key=lambda item: -item[1]["n"]):
+        joined = max(total["joined"], 1)
+        win_rate = total["wins"] / total["n"]
+        summary.append({
+            "rule": rule,
+            "decisions": int(total["n"]),
+            "win_rate": win_rate,
+            "vs_baseline": win_rate - baseline,
+            "dealt": total["dealt"] / joined,
+            "taken": total["taken"] / joined,
+            "ko_rate": total["ko"] / joined,
+            "faint_rate": total["fainted"] / joined,
+            "joined": int(total["joined"]),
+        })
+    print(f"{len(battles)} battles, baseline win rate {baseline:.3f}")
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Join the agent's decision log with saved replays: win rate and next-turn outcome per deciding rule"
+    )
+    parser.add_argument("log", help="decisions.jsonl written by CustomAgent(decision_log=...)")
+    parser.add_argument("--replays", help="folder of saved replays (default: the log's folder)")
+    parser.add_argument("--output", help="write the summary as JSON")
+    args = parser.parse_args()
+
+    folder = args.replays or os.path.dirname(os.path.abspath(args.log))
+    summary = summarize(join(args.log, folder))
+    print(tabulate(summary, headers="keys", floatfmt=".3f"))
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as file:
+            json.dump(summary, file, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+import argparse
+import asyncio
+import inspect
+import time
+from typing import List
+
+import numpy as np
+
+from poke_env.teambuilder import Teambuilder
+
+from offline_battles import AGENT_PATH, build_battle, fresh_agent, load_module, read_bot_teams, species_name
+
+
+def build_battles(module, n_battles: int) -> list:
+    """n concurrent mid-game positions spread over every bot team and active pairing"""
+    teams = [[species_name(m) for m in Teambuilder.parse_showdown_team(t)] for t in read_bot_teams().values()]
+    battles = []
+    for k in range(n_battles):
+        opponents = teams[k % len(teams)]
+        battles.append(build_battle(
+            module.team, opponents, our_active=(k // len(teams)) % 6, opponent_active=(k // 30) % 6,
+            turn=6, battle_tag=f"battle-gen9ubers-throughput{k}",
+        ))
+    return battles
+
+
+async def decide(agent, battle):
+    # As poke_env does: choose_move hands back an awaitable when decisions are offloaded
+    action = agent.choose_move(battle)
+    return await action if inspect.isawaitable(action) else action
+
+
+async def run_round(agent, battles: list) -> list:
+    # One task per battle, like concurrent requests arriving from the server
+    return await asyncio.gather(*(decide(agent, battle) for battle in battles))
+
+
+async def heartbeat(interval: float, stalls: list):
+    """Stands in for the websocket keepalives: records how late each tick of the event loop runs"""
+    expected = time.perf_counter() + interval
+    while True:
+        await asyncio.sleep(interval)
+        now = time.perf_counter()
+        stalls.append(max(now - expected, 0.0))
+        expected = now + interval
+
+
+async def measure(agent, battles: list, rounds: int) -> tuple:
+    await run_round(agent, battles)  # first round builds the per-battle models
+    stalls: List[float] = []
+    ticker = asyncio.create_task(heartbeat(0.001, stalls))
+    await asyncio.sleep(0)
+    start = time.perf_counter()
+    for _ in range(rounds):
+        await run_round(agent, battles)
+    elapsed = time.perf_counter() - start
+    ticker.cancel()
+    return rounds * len(battles) / elapsed, np.array(stalls or [0.0]) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Decisions per second and event-loop stalls: sequential and offloaded to a thread"
+    )
+    parser.add_argument("--agent", default=AGENT_PATH)
+    parser.add_argument("--battles", type=int, default=64)
+    parser.add_argument("--rounds", type=int, default=10)
+    args = parser.parse_args()
+
+    module = load_module(args.agent, "throughput_agent")
+    battles = build_battles(module, args.battles)
+    modes = [
+        ("sequential", {}),
+        ("offloaded (thread)", {"offload_decisions": True}),
+    ]
+    print(f"{args.battles} concurrent battles, loop stalls measured by a 1 ms heartbeat")
+    for label, kwargs in modes:
+        agent = fresh_agent(module, "throughput", **kwargs)
+        rate, stalls = asyncio.run(measure(agent, battles, args.rounds))
+        agent.close()
+        print(
+            f"{label:>22}: {rate:8.0f} decisions/s, loop stall p50 {np.percentile(stalls, 50):6.1f} ms"
+            f" / p99 {np.percentile(stalls, 99):6.1f} ms / max {stalls.max():6.1f} ms"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -14,6 +14,8 @@ import poke_env as pke
 from poke_env import AccountConfiguration
 from poke_env.player.player import Player
 
+from agent_settings import close_players, peak_rss_mb, retention_kwargs
+
 
 def convert_results_to_html(csv_file: str, html_file: str):
     with open(csv_file, newline="", encoding="utf-8") as infile:
@@ -114,6 +116,7 @@ def gather_players():
                     agent_class(
                         account_configuration=account_config,
                         battle_format="gen9ubers",
+                        **retention_kwargs(agent_class),
                     )
                 )
 
@@ -366,6 +369,9 @@ def run_swiss_phase(top_k: int, competitors: List[Competitor]):
         )
 
     print(f"\nSWISS Rounds 🏆 Tournament Summary (Top {top_k}):")
+    peak = peak_rss_mb()
+    if peak is not None:
+        print(f"Peak RSS after the Swiss rounds: {peak:.0f} MB")
     for competitor in competitors:
         print(
             f"Player {competitor.id:3d} {competitor.username} | W: {competitor.wins}, L: {competitor.losses}"
@@ -468,13 +474,19 @@ def run_competition(
     print("\n🏁 Knockout Rounds:")
     winner = run_knockout_phase(top_k_competitors)
     print(f"\n🏆 Final Winner: {winner.username} (ID: {winner.id})")
+    peak = peak_rss_mb()
+    if peak is not None:
+        print(f"Peak RSS: {peak:.0f} MB")
 
 
 def main():
 
     players = gather_players()
 
-    run_competition(players, top_k=16)
+    try:
+        run_competition(players, top_k=16)
+    finally:
+        close_players(players)
 
 
 if __name__ == "__main__":
@@ -2,6 +2,7 @@
 
 import asyncio
 import importlib
+import inspect
 import os
 import sys
 from typing import List
@@ -11,6 +12,8 @@ from poke_env import AccountConfiguration
 from poke_env.player.player import Player
 from tabulate import tabulate
 
+from agent_settings import close_players, peak_rss_mb, retention_kwargs
+
 
 def rank_players_by_victories(results_dict, top_k=10):
     victory_scores = {}
@@ -28,6 +31,13 @@ def rank_players_by_victories(results_dict, top_k=10):
     return sorted_players[:top_k]
 
 
+def decision_log_kwargs(agent_class, agent_replay_dir: str) -> dict:
+    """Agents that can log their decisions write them beside their replays, for decision_outcomes.py"""
+    if "decision_log" in inspect.signature(agent_class).parameters:
+        return {"decision_log": os.path.join(agent_replay_dir, "decisions.jsonl")}
+    return {}
+
+
 def gather_players():
     player_folders = os.path.join(os.path.dirname(__file__), "players")
     players = []
@@ -54,6 +64,8 @@ def gather_players():
                 player = agent_class(
                     account_configuration=account_config,
                     battle_format="gen9ubers",
+                    **retention_kwargs(agent_class),
+                    **decision_log_kwargs(agent_class, agent_replay_dir),
                 )
                 player._save_replays = agent_replay_dir
                 players.append(player)
@@ -130,6 +142,7 @@ def assign_marks(rank: int) -> float:
 
 
 def main():
+    players: List[Player] = []
     try:
         generic_bots = gather_bots()
         players = gather_players()
@@ -156,7 +169,16 @@ def main():
                     player_rank = rank
                     player_mark = mark
 
-            print(f"{player.username} ranked #{player_rank} with a mark of {player_mark}\n")
+            print(f"{player.username} ranked #{player_rank} with a mark of {player_mark}")
+            if hasattr(player, "get_performance_metrics"):
+                print(f"{player.username} metrics: {player.get_performance_metrics()}")
+            if hasattr(player, "rule_stats"):
+                print(f"{player.username} rules:")
+                print(tabulate(player.rule_stats.table(), headers="keys", floatfmt=".3f"))
+            peak = peak_rss_mb()
+            if peak is not None:
+                print(f"Peak RSS so far: {peak:.0f} MB")
+            print()
 
             with open(results_file, "a", encoding="utf-8") as file:
                 file.write(f"{player.username} #{player_rank} {player_mark}\n")
@@ -164,6 +186,7 @@ def main():
     except KeyboardInterrupt:
         print("\n⚠️ Evaluation interrupted! Saving progress...")
     finally:
+        close_players(players)
         print("✅ Exiting gracefully. Results saved to:", results_file)
 
 
@@ -2,43 +2,20 @@ import os
 import re
 from collections import Counter, defaultdict
 from bs4 import BeautifulSoup
+from poke_env.data import to_id_str
 import matplotlib.pyplot as plt
 
+from players.tlim334 import MoveIndex, MoveTag
+
 # --- CONFIG ---
 FOLDER = r'C:\Users\HP\Documents\2025_University\COMPSYS_726\showdown_agent\showdown_agent\scripts\replays'
 PLAYER_TAG = 'p1a:'  # Your agent's moves start with this in the logs
 
-TEAM_MOVES = {
-    'Spikes': 'hazard',
-    'Thunder Wave': 'status',
-    'Taunt': 'anti-setup',
-    'Psycho Boost': 'attack',
-    'Swords Dance': 'setup',
-    'Kowtow Cleave': 'attack',
-    'Iron Head': 'attack',
-    'Sucker Punch': 'attack',
-    'Calm Mind': 'setup',
-    'Judgment': 'attack',
-    'Recover': 'healing',
-    'Dynamax Cannon': 'attack',
-    'Sludge Bomb': 'attack',
-    'Fire Blast': 'attack',
-    'Meteor Beam': 'attack',
-    'Scale Shot': 'attack',
-    'Close Combat': 'attack',
-    'Flame Charge': 'attack',
-    'U-turn': 'pivot',
-    'Brave Bird': 'attack',
-    'Sacred Fire': 'attack',
-    'Earthquake': 'attack'
-}
 
 def classify_move(move):
-    if move in TEAM_MOVES:
-        return TEAM_MOVES[move]
     if move == 'switch':
         return 'switching'
-    return 'other'
+    return MoveIndex.label(move)
 
 def is_super_effective(line):
     return "supereffective|p2" in line
@@ -48,7 +25,7 @@ def is_ko(line):
     return re.match(r'\|faint\|p2a:', line)
 
 def is_hazard(move):
-    return TEAM_MOVES.get(move, '') == 'hazard'
+    return MoveIndex.has(to_id_str(move), MoveTag.HAZARD)
 
 def extract_moves_from_html(filepath):
     with open(filepath, encoding='utf-8') as f:
@@ -0,0 +1,87 @@
+import argparse
+import time
+
+import numpy as np
+
+from offline_battles import AGENT_PATH, load_module
+
+# Cells per call: one matchup matrix, one score table move, a large synthetic batch
+SIZES = {"matrix": 36, "score_table": 1435 * 4, "bulk": 1_000_000}
+
+
+def make_inputs(size: int, n_types: int, seed: int = 0) -> dict:
+    rng = np.random.default_rng(seed)
+    return {
+        "power": rng.choice([40.0, 60.0, 80.0, 90.0, 100.0, 120.0, 150.0], size),
+        "attack": rng.uniform(150, 500, size),
+        "defense": rng.uniform(100, 450, size),
+        "effectiveness": rng.choice([0.0, 0.25, 0.5, 1.0, 2.0, 4.0], size),
+        "modifier": rng.choice([1.0, 1.2, 1.5, 1.8], size),
+        "hp": rng.uniform(200, 700, size),
+        "remaining": rng.choice([0.0, 0.25, 0.5, 1.0], size),
+        "attacking": rng.integers(0, n_types, size),
+        "defending_1": rng.integers(0, n_types, size),
+        "defending_2": rng.integers(0, n_types + 1, size),
+    }
+
+
+def run_kernels(kernels, level: float, chart: np.ndarray, x: dict) -> tuple:
+    low, high = kernels.damage_fractions(level, x["power"], x["attack"], x["defense"], x["effectiveness"], x["modifier"], x["hp"])
+    ko = kernels.ko_odds(low, high, x["remaining"])
+    types = kernels.type_products(chart, x["attacking"], x["defending_1"], x["defending_2"])
+    return low, high, ko, types
+
+
+def time_call(fn, repeats: int) -> float:
+    start = time.perf_counter()
+    for _ in range(repeats):
+        fn()
+    return (time.perf_counter() - start) / repeats
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare numeric kernel backends on decision-sized and bulk arrays")
+    parser.add_argument("--agent", default=AGENT_PATH)
+    parser.add_argument("--repeats", type=int, default=200)
+    args = parser.parse_args()
+
+    module = load_module(args.agent, "kernel_agent")
+    print(f"Auto-selected backend: {module.KERNELS.name}")
+    rng = np.random.default_rng(1)
+    chart = rng.choice([0.0, 0.5, 1.0, 2.0], (19, 20))
+    chart[:, -1] = 1.0  # padding column for single-typed defenders
+    level = module.ScoreTable.LEVEL
+
+    backends = {}
+    for name in module.KERNEL_BACKENDS:
+        try:
+            backends[name] = module.select_kernels(name)
+            backends[name].MIN_ELEMENTS = 0  # time the compiled path itself at every size
+            run_kernels(backends[name], level, chart, make_inputs(8, 19))  # compile outside the timings
+        except ImportError as error:
+            print(f"{name}: unavailable ({error})")
+            backends.pop(name, None)
+
+    reference = backends["numpy"]
+    for label, size in SIZES.items():
+        x = make_inputs(size, 19)
+        expected = run_kernels(reference, level, chart, x)
+        repeats = max(1, args.repeats * 1000 // size) if size > 1000 else args.repeats * 10
+        timings = {}
+        for name, kernels in backends.items():
+            for want, got in zip(expected, run_kernels(kernels, level, chart, x)):
+                assert np.array_equal(want, got), f"{name} differs from numpy on {label}"
+            timings[name] = time_call(lambda: run_kernels(kernels, level, chart, x), repeats)
+        print(f"{label} ({size} cells): " + ", ".join(
+            f"{name} {seconds * 1e6:.1f}us ({timings['numpy'] / seconds:.2f}x)" for name, seconds in timings.items()
+        ))
+
+    module.ScoreTable.build(module.team)  # dex and move data load once, outside the timings
+    for name in backends:
+        module.KERNELS = module.select_kernels(name)
+        seconds = time_call(lambda: module.ScoreTable.build(module.team), 3)
+        print(f"ScoreTable.build with {name}: {seconds:.3f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,62 @@
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+from offline_battles import AGENT_PATH, load_module
+
+# Runs in a fresh interpreter so nothing is warm; battle setup is excluded from the timings
+FIRST_DECISION = """
+import json, sys, time
+start = time.perf_counter()
+sys.path.insert(0, {scripts!r})
+from offline_battles import build_battle, create_agent, load_module, read_bot_teams, species_name
+from poke_env.teambuilder import Teambuilder
+module = load_module({agent!r}, "snapshot_agent")
+if {bypass!r}:
+    module.KnowledgeSnapshot.SNAPSHOT_FILE = ""
+imported = time.perf_counter()
+agent = create_agent(module, "snapshot-timing")
+agent.opening_book = None
+opponents = [species_name(m) for m in Teambuilder.parse_showdown_team(next(iter(read_bot_teams().values())))]
+battle = build_battle(module.team, opponents, turn=5)
+agent.choose_move(battle)
+print(json.dumps({{
+    "import": imported - start,
+    "first_decision": agent.first_decision_seconds,
+    "end_to_end": imported - start + agent.first_decision_seconds,
+    "snapshot": module.KnowledgeSnapshot.stats(),
+}}))
+"""
+
+
+def measure(agent_path: str, bypass: bool, runs: int) -> dict:
+    code = FIRST_DECISION.format(scripts=os.path.dirname(os.path.abspath(__file__)), agent=agent_path, bypass=bypass)
+    results = [json.loads(subprocess.run([sys.executable, "-c", code], capture_output=True, text=True,
+                                         check=True).stdout.strip().splitlines()[-1]) for _ in range(runs)]
+    return {key: sorted(r[key] for r in results)[runs // 2] for key in ("import", "first_decision", "end_to_end")}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Rebuild the knowledge snapshot and report time-to-first-decision")
+    parser.add_argument("--agent", default=AGENT_PATH)
+    parser.add_argument("--measure", action="store_true", help="time cold starts with and without the snapshot")
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args()
+
+    module = load_module(args.agent, "snapshot_agent")
+    module.KnowledgeSnapshot.save()
+    size = os.path.getsize(module.KnowledgeSnapshot.SNAPSHOT_FILE)
+    print(f"Knowledge snapshot written to {module.KnowledgeSnapshot.SNAPSHOT_FILE} ({size / 1024:.0f} KB)")
+
+    if args.measure:
+        for label, bypass in (("from source", True), ("from snapshot", False)):
+            timing = measure(args.agent, bypass, args.runs)
+            print(f"{label:>14}: import {timing['import'] * 1000:.0f} ms, "
+                  f"first decision {timing['first_decision'] * 1000:.1f} ms, "
+                  f"import + decision {timing['end_to_end'] * 1000:.0f} ms (median of {args.runs})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,185 @@
+import importlib.util
+import logging
+import multiprocessing
+import os
+import sys
+from multiprocessing.context import BaseContext
+from types import ModuleType
+from typing import Any, Dict, List, Optional, Sequence
+
+from poke_env import AccountConfiguration
+from poke_env.battle import Battle
+from poke_env.data import GenData, to_id_str
+from poke_env.stats import compute_raw_stats
+from poke_env.teambuilder import Teambuilder, TeambuilderPokemon
+
+AGENT_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "players", "tlim334.py")
+
+OUR_ROLE = "p1"
+OPP_ROLE = "p2"
+OPP_NAME = "opponent"
+
+
+def load_module(module_path: str, module_name: Optional[str] = None) -> ModuleType:
+    module_name = module_name or os.path.basename(module_path)
+    spec = importlib.util.spec_from_file_location(module_name, module_path)
+    if spec is None or spec.loader is None:
+        raise ImportError(f"cannot load an agent from {module_path}")
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[module_name] = module
+    spec.loader.exec_module(module)
+    return module
+
+
+def create_agent(module: ModuleType, username: str = "offline", **kwargs) -> Any:
+    """Instantiates a module's CustomAgent without connecting to a server; its type is only known at runtime"""
+    agent_class = getattr(module, "CustomAgent")
+    return agent_class(
+        account_configuration=AccountConfiguration(username, None),
+        battle_format="gen9ubers",
+        start_listening=False,
+        **kwargs,
+    )
+
+
+def fresh_agent(module: ModuleType, username: str = "offline", **kwargs) -> Any:
+    """An agent that decides every request from scratch, for timing and comparing decisions"""
+    agent = create_agent(module, username, **kwargs)
+    # Measure real decisions, not lookups: book and memoised replies would hide the work
+    if hasattr(agent, "opening_book"):
+        agent.opening_book = None
+    if hasattr(module, "DecisionCache") and hasattr(agent, "decision_cache"):
+        agent.decision_cache = module.DecisionCache(max_entries=0)
+    return agent
+
+
+def spawn_context() -> BaseContext:
+    # poke_env starts its event-loop thread at import, which a forked child would not inherit
+    return multiprocessing.get_context("spawn")
+
+
+def read_bot_teams() -> Dict[str, str]:
+    teams_folder = os.path.join(os.path.dirname(__file__), "bots", "teams")
+    teams = {}
+    for team_file in sorted(os.listdir(teams_folder)):
+        if team_file.endswith(".txt"):
+            with open(os.path.join(teams_folder, team_file), "r", encoding="utf-8") as file:
+                teams[team_file[:-4]] = file.read()
+    return teams
+
+
+def species_name(mon: TeambuilderPokemon) -> str:
+    return (mon.species or mon.nickname or "").strip()
+
+
+def tera_type(mon: TeambuilderPokemon, data: GenData) -> str:
+    """Declared Tera type, else the species' first type as the server defaults to"""
+    if mon.tera_type:
+        return mon.tera_type.strip()
+    return data.pokedex[to_id_str(species_name(mon))]["types"][0]
+
+
+def side_request(
+    mons: List[TeambuilderPokemon],
+    active: Optional[int],
+    hp: Optional[Sequence[float]] = None,
+    force_switch: bool = False,
+    trapped: bool = False,
+    disabled: Sequence[str] = (),
+    pp: Optional[Dict[str, int]] = None,
+    can_tera: bool = True,
+) -> Dict:
+    """A showdown request for our side, as the server would send it"""
+    data = GenData.from_gen(9)
+    side: Dict = {"name": "offline", "id": OUR_ROLE, "pokemon": []}
+    for i, mon in enumerate(mons):
+        name = species_name(mon)
+        stats = compute_raw_stats(
+            to_id_str(name), mon.evs, mon.ivs, mon.level or 100, (mon.nature or "serious").lower(), data
+        )
+        current = stats[0] if hp is None else int(round(stats[0] * hp[i]))
+        if hp is not None and hp[i] > 0:
+            current = max(current, 1)
+        side["pokemon"].append(
+            {
+                "ident": f"{OUR_ROLE}: {name}",
+                "details": f"{name}, L{mon.level or 100}",
+                "condition": f"{current}/{stats[0]}" if current > 0 else "0 fnt",
+                "active": i == active,
+                "stats": dict(zip(["atk", "def", "spa", "spd", "spe"], stats[1:])),
+                "moves": [to_id_str(m) for m in mon.moves],
+                "baseAbility": to_id_str(mon.ability or ""),
+                "item": to_id_str(mon.item or ""),
+                "pokeball": "pokeball",
+                "ability": to_id_str(mon.ability or ""),
+                "teraType": tera_type(mon, data),
+                "terastallized": "",
+            }
+        )
+    request: Dict = {"side": side, "rqid": 1}
+    if force_switch:
+        request["forceSwitch"] = [True]
+    elif active is not None:
+        active_mon = mons[active]
+        moves = []
+        for move in active_mon.moves:
+            move_id = to_id_str(move)
+            moves.append(
+                {
+                    "move": move,
+                    "id": move_id,
+                    "pp": (pp or {}).get(move_id, 16),
+                    "maxpp": 16,
+                    "target": "normal",
+                    "disabled": move_id in disabled,
+                }
+            )
+        active_request: Dict = {"moves": moves}
+        if can_tera:
+            active_request["canTerastallize"] = tera_type(active_mon, data)
+        if trapped:
+            active_request["trapped"] = True
+        request["active"] = [active_request]
+    return request
+
+
+def build_battle(
+    our_team: str,
+    opponent_species: Sequence[str],
+    our_active: Optional[int] = 0,
+    opponent_active: Optional[int] = 0,
+    turn: int = 1,
+    battle_tag: str = "battle-gen9ubers-offline",
+    username: str = "offline",
+    our_hp: Optional[Sequence[float]] = None,
+    opponent_hp: str = "100/100",
+    opponent_level: int = 100,
+    opponent_preview: bool = True,
+    opponent_hazards: Sequence[str] = (),
+    our_hazards: Sequence[str] = (),
+    **request_kwargs,
+) -> Battle:
+    """Rebuilds a Battle as seen by our agent from team strings and a few position facts"""
+    mons = Teambuilder.parse_showdown_team(our_team)
+    battle = Battle(battle_tag, username, logging.getLogger(battle_tag), gen=9)
+    battle.player_role = OUR_ROLE
+    # without team preview the opponent's Pokemon are only known once they switch in
+    for species in opponent_species if opponent_preview else ():
+        battle.parse_message(["", "poke", OPP_ROLE, species, ""])
+
+    request = side_request(mons, our_active, our_hp, **request_kwargs)
+    battle.parse_request(request)
+    if our_active is not None:
+        name = species_name(mons[our_active])
+        condition = request["side"]["pokemon"][our_active]["condition"]
+        battle.parse_message(["", "switch", f"{OUR_ROLE}a: {name}", f"{name}, L100", condition])
+    if opponent_active is not None:
+        name = opponent_species[opponent_active]
+        battle.parse_message(["", "switch", f"{OPP_ROLE}a: {name}", f"{name}, L{opponent_level}", opponent_hp])
+    for hazard in opponent_hazards:
+        battle.parse_message(["", "-sidestart", f"{OPP_ROLE}: {OPP_NAME}", hazard])
+    for hazard in our_hazards:
+        battle.parse_message(["", "-sidestart", f"{OUR_ROLE}: {username}", hazard])
+    battle.parse_message(["", "turn", str(turn)])
+    battle.parse_request(request)
+    return battle
@@ -0,0 +1,75 @@
+import argparse
+import json
+import os
+
+from poke_env.data import to_id_str
+from poke_env.teambuilder import Teambuilder
+
+from offline_battles import AGENT_PATH, build_battle, create_agent, load_module, read_bot_teams, species_name
+
+
+def generate_book(module, turns: int) -> dict:
+    agent = create_agent(module, "opening-book")
+    agent.opening_book = None  # never read the book while writing it
+
+    our_mons = Teambuilder.parse_showdown_team(module.team)
+    entries = {}
+    n_positions = 0
+
+    for team_name, bot_team in read_bot_teams().items():
+        opponent_species = [species_name(m) for m in Teambuilder.parse_showdown_team(bot_team)]
+        team_key = None
+        lines = {}
+        for turn in range(1, turns + 1):
+            # Spikes is the only hazard we carry, at most one layer per turn so far
+            for layers in range(0, turn):
+                for our_active in range(len(our_mons)):
+                    for opponent_active in range(len(opponent_species)):
+                        n_positions += 1
+                        battle = build_battle(
+                            module.team,
+                            opponent_species,
+                            our_active=our_active,
+                            opponent_active=opponent_active,
+                            turn=turn,
+                            battle_tag=f"battle-gen9ubers-book{n_positions}",
+                            opponent_hazards=["Spikes"] * layers,
+                        )
+                        if team_key is None:
+                            team_key = module.OpeningBook.team_key(
+                                [to_id_str(m.base_species) for m in battle.teampreview_opponent_team]
+                            )
+                        description = module.DecisionCache.describe(agent.choose_move(battle))
+                        mine, theirs = battle.active_pokemon, battle.opponent_active_pokemon
+                        if description is None or mine is None or theirs is None:
+                            continue
+                        key = module.OpeningBook.position_key(
+                            turn,
+                            mine.species,
+                            to_id_str(theirs.base_species),
+                            battle.opponent_side_conditions,
+                        )
+                        lines[key] = list(description)
+        entries[team_key] = lines
+        print(f"{team_name}: {len(lines)} positions")
+
+    print(f"Evaluated {n_positions} positions")
+    return {"version": module.CustomAgent.parameters_version(), "turns": turns, "entries": entries}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Precompute opening replies against every bot team")
+    parser.add_argument("--agent", default=AGENT_PATH)
+    parser.add_argument("--turns", type=int, default=3)
+    args = parser.parse_args()
+
+    module = load_module(args.agent, "book_agent")
+    book = generate_book(module, args.turns)
+    os.makedirs(os.path.dirname(module.OpeningBook.BOOK_FILE), exist_ok=True)
+    with open(module.OpeningBook.BOOK_FILE, "w", encoding="utf-8") as file:
+        json.dump(book, file, separators=(",", ":"), sort_keys=True)
+    print(f"Opening book written to {module.OpeningBook.BOOK_FILE}")
+
+
+if __name__ == "__main__":
+    main()
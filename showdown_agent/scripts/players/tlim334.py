@@ -1,7 +1,24 @@
-from poke_env.battle import AbstractBattle
-from poke_env.player import Player
-from typing import Dict, List, Tuple, Optional
-from enum import Enum
+import asyncio
+import hashlib
+import importlib.metadata
+import importlib.util
+import itertools
+import json
+import marshal
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from poke_env.battle import AbstractBattle, Effect, Move, MoveCategory, Pokemon, PokemonType
+from poke_env.data import GenData, to_id_str
+from poke_env.player import BattleOrder, Player, SimpleHeuristicsPlayer, SingleBattleOrder
+from poke_env.teambuilder import Teambuilder
+import numpy as np
+from poke_env.stats import compute_raw_stats
+from typing import Any, Callable, Dict, List, NamedTuple, Tuple, Optional
+from enum import Enum, IntFlag
 
 team = """
 Deoxys-Speed @ Focus Sash
@@ -60,25 +77,171 @@ Adamant Nature
 """
 
 class CustomAgent(Player):   
-    def __init__(self, *args, **kwargs):
+    def __init__(
+        self,
+        *args,
+        offload_decisions: bool = False,
+        keep_last_battles: Optional[int] = None,
+        decision_log: Optional[str] = None,
+        **kwargs,
+    ):
         super().__init__(team=team, *args, **kwargs)
         self.knowledge_base = PokemonKnowledge()
         self.damage_calculator = DamageCalculator()
         self.expert_rules = EnhancedExpertRules()
-        self.decision_history = []
+        # Per-battle state lives in its BattleContext, freed when the battle ends; the
+        # knowledge base, caches and tables on the agent are shared by every battle
+        self.contexts: Dict[str, BattleContext] = {}
+        self.rule_stats = RuleStats()
         self.battle_count = 0
+        self.total_decisions = 0
+        self.decision_cache = DecisionCache()
+        self.opening_book = OpeningBook.load(self.parameters_version())
+        self.persistent_cache = PersistentCache.open(team)
+        self.rejections_avoided = 0
+        self.first_decision_seconds: Optional[float] = None
+        # Off by default: decisions run on one worker thread so the event loop keeps serving other
+        # battles and websocket keepalives, but decision_throughput.py measures fewer decisions per
+        # second this way. One worker keeps decisions serialized over the shared caches
+        self.executor = ThreadPoolExecutor(1, thread_name_prefix="decide") if offload_decisions else None
+        self.offloaded_decisions = 0
+        # None keeps every finished Battle as poke_env does; N keeps the last N and summarizes the rest
+        self.retention = BattleRetention(keep_last_battles)
+        # JSON lines of every decision and battle result, joined with replays by decision_outcomes.py
+        self.decision_log = DecisionLog(decision_log) if decision_log else None
 
-    def teampreview(self, _):
-        return "/team 123456"
+    def _battle_finished_callback(self, battle: AbstractBattle):
+        context = self.contexts.pop(battle.battle_tag, None)
+        self.retention.retire(self._battles, battle, context.decisions if context else 0)
+        self.persistent_cache.flush()
+        if self.decision_log is not None:
+            self.decision_log.result(battle)
+
+    # poke_env counts results from the battles dict; evicted battles still count through their records
+    @property
+    def n_finished_battles(self) -> int:
+        return super().n_finished_battles + self.retention.evicted_finished
+
+    @property
+    def n_won_battles(self) -> int:
+        return super().n_won_battles + self.retention.evicted_won
+
+    @property
+    def n_lost_battles(self) -> int:
+        return super().n_lost_battles + self.retention.evicted_lost
+
+    def reset_battles(self):
+        super().reset_battles()
+        self.retention.reset()
+
+    def close(self):
+        """Stops the decision thread and writes pending cache rows and log lines; call once done playing"""
+        if self.executor is not None:
+            self.executor.shutdown(wait=True)
+            self.executor = None
+        self.persistent_cache.flush()
+        if self.decision_log is not None:
+            self.decision_log.flush()
+
+    def teampreview(self, battle: AbstractBattle):
+        order = LeadPlanner.plan(battle, lambda: self._matchups(battle))
+        return "/team " + "".join(str(i + 1) for i in order)
+
+    async def _handle_battle_message(self, split_messages: List[List[str]]):
+        # Deltas are emitted before poke_env parses the chunk so that every
+        # derived model is current by the time a request triggers choose_move
+        battle_tag = split_messages[0][0][1:]
+        if battle_tag in self.retention.evicted_tags:
+            return  # poke_env would wait forever for a battle it no longer holds
+        battle = self.battles.get(battle_tag)
+        if battle is not None and battle.finished:
+            # Trailing messages after the win must not resurrect a freed context
+            await super()._handle_battle_message(split_messages)
+            return
+        tracker = self._delta_tracker(battle_tag)
+        if tracker.role is None and battle is not None:
+            tracker.role = battle.player_role
+        for split_message in split_messages[1:]:
+            tracker.feed(split_message)
+        await super()._handle_battle_message(split_messages)
 
     def choose_move(self, battle: AbstractBattle):
-        self.battle_count += 1
+        if self.executor is not None:
+            return self._offloaded_choose_move(battle)
+        return self._timed_choose_move(battle)
+
+    async def _offloaded_choose_move(self, battle: AbstractBattle) -> BattleOrder:
+        # The server sends nothing more for this battle until we answer, so its models are not fed meanwhile
+        self.offloaded_decisions += 1
+        return await asyncio.get_running_loop().run_in_executor(self.executor, self._timed_choose_move, battle)
+
+    def _timed_choose_move(self, battle: AbstractBattle):
+        if self.first_decision_seconds is not None:
+            return self._choose_move(battle)
+        # The first decision pays for every lazily loaded table, so it is timed on its own
+        start = time.perf_counter()
+        action = self._choose_move(battle)
+        self.first_decision_seconds = time.perf_counter() - start
+        return action
+
+    def _choose_move(self, battle: AbstractBattle):
+        context = self._context(battle.battle_tag)
+        context.decisions += 1
+        context.rule = None
+        action = self._decide(battle, context)
+        if self.decision_log is not None:
+            self.decision_log.decision(battle, context.rule, action)
+        return action
+
+    def _decide(self, battle: AbstractBattle, context: "BattleContext"):
+        tracker = self._delta_tracker(battle.battle_tag)
+        if not tracker.primed:
+            tracker.resync(battle)
+        opponent_model = self._opponent_model(battle)
+        opponent_model.update(battle)
+
+        if self.opening_book is not None:
+            action = self.opening_book.lookup(battle)
+            if action is not None:
+                context.rule = "opening_book"
+                self._log_decision_advanced(battle, None, f"Opening book, Action: {action}")
+                return action
+
+        self.decision_cache.validate(self.parameters_version())
+        key = DecisionCache.fingerprint(battle, tracker, opponent_model, self._win_plan(battle))
+        action = self.decision_cache.get(key, battle)
+        if action is not None:
+            context.rule = "decision_cache"
+            self._log_decision_advanced(battle, None, f"Cached decision, Action: {action}")
+            return action
+
         state = self._assess_battle_state(battle)
         strategy = self._determine_strategy(state)
-        action = self._select_action(battle, strategy)
-        if isinstance(action, str) or not hasattr(action, "id"):
-            self._log_decision_advanced(battle, None, f"Strategy: {strategy}, Action: {action}")
-        return action
+        order = self._legal_order(battle, self._select_action(battle))
+        self.decision_cache.put(key, order)
+        if isinstance(order, str) or not hasattr(order, "id"):
+            self._log_decision_advanced(battle, None, f"Strategy: {strategy}, Action: {order}")
+        return order
+
+    @staticmethod
+    def tuning_parameters() -> Dict:
+        """Every constant that changes decisions; the decision cache is keyed on it"""
+        return {
+            "matchup_speed_weight": MatchupMatrix.SPEED_WEIGHT,
+            "matchup_ko_weight": MatchupMatrix.KO_WEIGHT,
+            "matchup_stab_power": MatchupMatrix.STAB_POWER,
+            "plan_bonus": WinConditionPlanner.PLAN_BONUS,
+            "plan_hp_swing": WinConditionPlanner.HP_SWING,
+            "plan_setup_cap": WinConditionPlanner.SETUP_CAP,
+            "policy_min_observations": OpponentPolicyClassifier.MIN_OBSERVATIONS,
+            "tera_threshold": TeraDeltas.TERA_THRESHOLD,
+            **{f"weight_{name.lower()}": value for name, value in RuleWeights.as_dict().items()},
+        }
+
+    @staticmethod
+    def parameters_version() -> str:
+        parameters = CustomAgent.tuning_parameters()
+        return hashlib.sha1(repr(sorted(parameters.items())).encode("utf-8")).hexdigest()
 
     def _assess_battle_state(self, battle: AbstractBattle) -> Dict:
         state = {
@@ -121,50 +284,178 @@ class CustomAgent(Player):
         else:
             return "mid_game_aggressive"
 
-    def _select_action(self, battle: AbstractBattle, strategy: str):
-        switch_needed, _, target_poke = self.expert_rules.should_switch(battle)
+    def _select_action(self, battle: AbstractBattle):
+        context = self._context(battle.battle_tag)
+        matchups = self._matchups(battle)
+        start = time.perf_counter()
+        switch_needed, _, target_poke = self.expert_rules.should_switch(battle, matchups)
+        self.rule_stats.record("should_switch", switch_needed, time.perf_counter() - start)
         if switch_needed and target_poke and target_poke in battle.team:
+            self.rule_stats.decided("should_switch")
+            context.rule = "should_switch"
             return self.create_order(battle.team[target_poke])
 
+        plan = self._win_plan(battle)
+        plan_bonus = plan.step(battle)
+
         if battle.active_pokemon and battle.available_moves:
+            rules = context.rules
+            rules.update(battle)
             move_evals = []
             for move in battle.available_moves:
-                pri, reason = self.expert_rules.evaluate_move_priority_advanced(battle, move.id)
+                pri, reason = rules.move_priority(battle, move.id)
+                if move.id in plan_bonus:
+                    pri += plan_bonus[move.id]
+                    reason += f" | Plan: {plan.kind}"
                 move_evals.append((move, pri, reason))
             move_evals.sort(key=lambda x: x[1], reverse=True)
             best_move, best_pri, best_reason = move_evals[0]
 
-            hazard_moves = ["spikes", "stealthrock", "toxicspikes"]
+            ranked_best, stacked = best_move, False
             for m, pri, reason in move_evals:
-                if m.id in hazard_moves:
-                    hazard_score, h_reason = AdvancedBattleStrategy.evaluate_hazard_priority(battle)
-                    if hazard_score*15+pri > best_pri:
-                        best_move, best_pri, best_reason = m, hazard_score*15+pri, f"Hazard stacking: {h_reason}"
+                if MoveIndex.has(m.id, MoveTag.HAZARD):
+                    hazard_score, h_reason = rules.hazard_priority()
+                    hazard_pri = hazard_score * RuleWeights.HAZARD_MULTIPLIER + pri
+                    if hazard_pri > best_pri:
+                        best_move, best_pri, best_reason = m, hazard_pri, f"Hazard stacking: {h_reason}"
+                        stacked = best_move is not ranked_best
 
-            alive_count = sum(1 for p in battle.team.values() if not p.fainted)
-            opp_alive = sum(1 for p in battle.opponent_team.values() if not p.fainted) if hasattr(battle, 'opponent_team') else 6
-            if alive_count <= 2 or opp_alive <= 2:
-                if best_move.id.lower() in ["extremespeed", "suckerpunch", "bulletpunch"]:
-                    best_pri += 30
+            alive = self._delta_tracker(battle.battle_tag).alive
+            if alive["self"] <= 2 or alive["opponent"] <= 2:
+                if MoveIndex.has(best_move.id, MoveTag.PRIORITY):
+                    best_pri += RuleWeights.ENDGAME_PRIORITY_BONUS
                     best_reason += " | Endgame priority"
 
-            predictions = AdvancedBattleStrategy.predict_opponent_move(battle)
-            if predictions.get("switch", 0) > 0.6:
-                for name, poke in battle.team.items():
-                    if poke != battle.active_pokemon and not poke.fainted:
-                        opp_types = [t.name for t in battle.opponent_active_pokemon.types]
-                        poke_types = [t.name for t in poke.types]
-                        for ot in opp_types:
-                            if PokemonKnowledge.get_type_effectiveness(ot, poke_types) <= 0.5:
-                                return self.create_order(poke)
+            start = time.perf_counter()
+            predictions = self._opponent_model(battle).predict(battle)
+            target = None
+            if predictions.get("switch", 0) > RuleWeights.SWITCH_PREDICTION and matchups is not None:
+                col = matchups.column(battle.opponent_active_pokemon)
+                target = matchups.best_switch(col, battle.available_switches, max_defense=0.5) if col is not None else None
+            self.rule_stats.record("switch_prediction", target is not None, time.perf_counter() - start)
+            if target is not None:
+                self.rule_stats.decided("switch_prediction")
+                context.rule = "switch_prediction"
+                return self.create_order(battle.team[target])
+
+            if stacked:
+                self.rule_stats.decided("hazard_stacking")
+                context.rule = "hazard_stacking"
+            else:
+                extra = [("plan", plan_bonus[best_move.id])] if best_move.id in plan_bonus else []
+                context.rule = self._credit_deciding_rules(rules, move_evals, best_move, extra)
+
+            if battle.can_tera:
+                gain = TeraDeltas.tera_gain(battle.active_pokemon, battle.opponent_active_pokemon,
+                                            TeraDeltas.our_tera_type(battle), not battle.opponent_used_tera)
+                if gain >= TeraDeltas.TERA_THRESHOLD:
+                    self._log_decision_advanced(battle, best_move, best_reason + f" | Tera (+{gain:.2f})")
+                    return self.create_order(best_move, terastallize=True)
 
             self._log_decision_advanced(battle, best_move, best_reason)
             return self.create_order(best_move)
+
+        # Forced switch-in: one column lookup instead of a random pick,
+        # limited to the plan's members when the plan names any
+        if battle.available_switches and battle.opponent_active_pokemon and matchups is not None:
+            col = matchups.column(battle.opponent_active_pokemon)
+            planned = [battle.team[key[len("switch:"):]] for key in plan_bonus if key.startswith("switch:")]
+            target = matchups.best_switch(col, planned or battle.available_switches) if col is not None else None
+            if target is not None:
+                context.rule = "matchup_switch"
+                return self.create_order(battle.team[target])
+        context.rule = "random"
+        return self.choose_random_move(battle)
+
+    def _credit_deciding_rules(self, rules: "RuleNetwork", move_evals: List, best_move: Move,
+                               extra: List[Tuple[str, float]]) -> str:
+        """A rule decided the move if, without its bonus, the runner-up would have ranked first.
+
+        Returns the biggest such rule, "only_move" or "ranking" when no single rule was decisive.
+        """
+        others = [pri for m, pri, _ in move_evals if m is not best_move]
+        if not others:
+            return "only_move"
+        margin = next(pri for m, pri, _ in move_evals if m is best_move) - max(others)
+        deciding = "ranking"
+        largest = margin
+        for rule, delta in rules.contributions(best_move.id) + extra:
+            if delta > margin:
+                self.rule_stats.decided(rule)
+                if delta > largest:
+                    deciding, largest = rule, delta
+        return deciding
+
+    def _legal_order(self, battle: AbstractBattle, action: BattleOrder) -> BattleOrder:
+        """Checks an order against the request before sending it; a rejected order costs a round trip"""
+        problem = LegalOrders.problem(battle, action)
+        if problem is None:
+            return action
+        self.rejections_avoided += 1
+        self._context(battle.battle_tag).rule = "legal_repair"
+        legal: BattleOrder
+        if problem == "tera" and isinstance(action, SingleBattleOrder) and not isinstance(action.order, str):
+            legal = self.create_order(action.order)
+        else:
+            legal = self._best_legal_order(battle)
+        self._log_decision_advanced(battle, None, f"Illegal order ({problem}): {action}, Action: {legal}")
+        return legal
+
+    def _best_legal_order(self, battle: AbstractBattle) -> BattleOrder:
+        """Highest-rated available move, else the matrix's best available switch"""
+        if battle.available_moves:
+            rules = self._context(battle.battle_tag).rules
+            rules.update(battle)
+            best = max(battle.available_moves, key=lambda m: rules.move_priority(battle, m.id)[0])
+            return self.create_order(best)
+        matchups = self._matchups(battle)
+        if battle.available_switches and battle.opponent_active_pokemon and matchups is not None:
+            col = matchups.column(battle.opponent_active_pokemon)
+            target = matchups.best_switch(col, battle.available_switches) if col is not None else None
+            if target is not None:
+                return self.create_order(battle.team[target])
         return self.choose_random_move(battle)
 
+    def _context(self, battle_tag: str) -> "BattleContext":
+        context = self.contexts.get(battle_tag)
+        if context is None:
+            context = self.contexts[battle_tag] = BattleContext(battle_tag, self.username, self.rule_stats)
+            self.battle_count += 1
+        return context
+
+    def _delta_tracker(self, battle_tag: str) -> "BattleDeltaTracker":
+        return self._context(battle_tag).tracker
+
+    def _matchups(self, battle: AbstractBattle) -> Optional["MatchupMatrix"]:
+        context = self._context(battle.battle_tag)
+        if context.matchups is None:
+            if not battle.team or not (battle.teampreview_opponent_team or battle.opponent_team):
+                return None
+            context.matchups = MatchupMatrix.from_battle(battle, self.persistent_cache)
+            context.tracker.listeners.append(context.matchups.on_event)
+        if context.matchups.pending_tera:
+            context.matchups.apply_tera()
+        return context.matchups
+
+    def _win_plan(self, battle: AbstractBattle) -> "WinConditionPlanner":
+        context = self._context(battle.battle_tag)
+        if context.win_plan is None:
+            context.win_plan = WinConditionPlanner()
+            context.tracker.listeners.append(context.win_plan.on_event)
+        return context.win_plan
+
+    def _opponent_model(self, battle: AbstractBattle) -> "OpponentPolicyClassifier":
+        context = self._context(battle.battle_tag)
+        if context.opponent_model is None:
+            context.opponent_model = OpponentPolicyClassifier()
+            context.tracker.listeners.append(context.opponent_model.on_event)
+        return context.opponent_model
+
     def _log_decision_advanced(self, battle, move, reason):
+        context = self._context(battle.battle_tag)
         record = {
-            "battle_count": self.battle_count,
+            "battle_tag": battle.battle_tag,
+            "decision": context.decisions,
             "turn": battle.turn,
             "active_pokemon": battle.active_pokemon.species if battle.active_pokemon else None,
             "move_chosen": move.id if move else None,
@@ -172,15 +463,25 @@ class CustomAgent(Player):
             "my_hp": battle.active_pokemon.current_hp_fraction if battle.active_pokemon else 0,
             "opp_hp": battle.opponent_active_pokemon.current_hp_fraction if battle.opponent_active_pokemon else 0
         }
-        self.decision_history.append(record)
-        if len(self.decision_history) > 2000:
-            self.decision_history = self.decision_history[-1000:]
+        context.log(record)
+        self.total_decisions += 1
 
     def get_performance_metrics(self) -> Dict:
-        if not self.decision_history:
+        if not self.total_decisions:
             return {"error": "No decision history"}
-        total_decisions = len(self.decision_history)
-        return {"total_decisions": total_decisions, "battles_played": self.battle_count}
+        return {
+            "total_decisions": self.total_decisions,
+            "battles_played": self.battle_count,
+            "active_battles": len(self.contexts),
+            "decision_cache": self.decision_cache.stats(),
+            "opening_book_hits": self.opening_book.hits if self.opening_book else 0,
+            "persistent_cache": self.persistent_cache.stats(),
+            "rejections_avoided": self.rejections_avoided,
+            "first_decision_seconds": self.first_decision_seconds,
+            "knowledge_snapshot": KnowledgeSnapshot.stats(),
+            "offloaded_decisions": self.offloaded_decisions,
+            "retention": self.retention.stats(),
+        }
 
 # PHASE 1
 # Expert System Knowledge Base
@@ -236,12 +537,88 @@ class PokemonKnowledge:
         else:
             return "no_effect"
 
+class MoveTag(IntFlag):
+    """Move categories the rules care about; a move can carry several"""
+    HAZARD = 1
+    SETUP = 2
+    PRIORITY = 4
+    PIVOT = 8
+    HEALING = 16
+    PHAZING = 32
+    STATUS = 64
+    ANTI_SETUP = 128
+
+class MoveIndex:
+    """Move id -> MoveTag bitmask, built once from poke_env's gen 9 move data"""
+
+    ENTRY_HAZARDS = {"SPIKES", "STEALTH_ROCK", "TOXIC_SPIKES", "STICKY_WEB"}
+    SETUP_STATS = {"atk", "spa", "spe"}
+    ANTI_SETUP_VOLATILES = {"TAUNT", "ENCORE"}
+    # Analytics label for a move, first matching tag wins; damaging moves fall back to "attack"
+    LABELS = [
+        (MoveTag.HAZARD, "hazard"), (MoveTag.SETUP, "setup"), (MoveTag.ANTI_SETUP, "anti-setup"),
+        (MoveTag.PIVOT, "pivot"), (MoveTag.HEALING, "healing"), (MoveTag.PHAZING, "phazing"),
+        (MoveTag.STATUS, "status"),
+    ]
+    _tags: Optional[Dict[str, int]] = None
+
+    @staticmethod
+    def _classify(move: Move) -> MoveTag:
+        tags = MoveTag(0)
+        status = move.category == MoveCategory.STATUS
+        if status:
+            tags |= MoveTag.STATUS
+        if move.side_condition is not None and move.side_condition.name in MoveIndex.ENTRY_HAZARDS:
+            tags |= MoveTag.HAZARD
+        if status and move.boosts and move.target is not None and move.target.name == "SELF" and any(
+            move.boosts.get(stat, 0) > 0 for stat in MoveIndex.SETUP_STATS
+        ):
+            tags |= MoveTag.SETUP
+        if move.priority > 0 and move.base_power > 0:
+            tags |= MoveTag.PRIORITY
+        if move.self_switch:
+            tags |= MoveTag.PIVOT
+        if move.heal > 0 or (status and "heal" in move.flags):
+            tags |= MoveTag.HEALING
+        if move.force_switch:
+            tags |= MoveTag.PHAZING | MoveTag.ANTI_SETUP
+        if move.volatile_status is not None and move.volatile_status.name in MoveIndex.ANTI_SETUP_VOLATILES:
+            tags |= MoveTag.ANTI_SETUP
+        return tags
+
+    @staticmethod
+    def build() -> Dict[str, int]:
+        return {move_id: int(MoveIndex._classify(Move(move_id, gen=9))) for move_id in GenData.from_gen(9).moves}
+
+    @staticmethod
+    def index() -> Dict[str, int]:
+        if MoveIndex._tags is None:
+            snapshot = KnowledgeSnapshot.section("move_tags")
+            MoveIndex._tags = snapshot if snapshot is not None else MoveIndex.build()
+        return MoveIndex._tags
+
+    @staticmethod
+    def tags(move_id: str) -> MoveTag:
+        return MoveTag(MoveIndex.index().get(move_id, 0))
+
+    @staticmethod
+    def has(move_id: str, tag: MoveTag) -> bool:
+        return bool(MoveIndex.tags(move_id) & tag)
+
+    @staticmethod
+    def label(move_name: str) -> str:
+        tags = MoveIndex.tags(to_id_str(move_name))
+        for tag, label in MoveIndex.LABELS:
+            if tags & tag:
+                return label
+        return "attack" if to_id_str(move_name) in MoveIndex.index() else "other"
+
 class DamageCalculator:
     """Model-Based Reasoning System for damage calculations"""
     
     @staticmethod
     def calculate_damage(attacker_stats: Dict, defender_stats: Dict, move_power: int, 
-                        type_effectiveness: float, is_physical: bool = True) -> Tuple[int, int]:
+                        type_effectiveness: float, is_physical: bool = True, level: int = 50) -> Tuple[int, int]:
         """
         Calculate damage range using Pokémon damage formula
         Returns (min_damage, max_damage) tuple
@@ -249,9 +626,7 @@ class DamageCalculator:
         if move_power == 0 or type_effectiveness == 0:
             return (0, 0)
             
-        # Simplified damage calculation (Gen 9 formula)
-        level = 50  # Standard competitive level
-        
+        # Simplified damage calculation (Gen 9 formula), level 50 unless told otherwise
         if is_physical:
             attack = attacker_stats.get('attack', 100)
             defense = defender_stats.get('defense', 100)
@@ -278,15 +653,40 @@ class DamageCalculator:
             return 0.0
         return min(100.0, (damage / max_hp) * 100)
 
+class RuleWeights:
+    """Every hand-tuned rule weight in one place; sweeps override them with apply()"""
+
+    # Priority steps ExpertRules adds or subtracts per rule
+    CRITICAL = 100
+    HIGH = 75
+    MEDIUM = 50
+    LOW = 25
+    SETUP_MULTIPLIER = 20  # x setup opportunity score
+    HAZARD_MULTIPLIER = 15  # x hazard stacking score
+    ENDGAME_PRIORITY_BONUS = 30  # priority moves once either side is down to two
+    SETUP_COUNTER_BONUS = 25  # anti-setup moves against a known setup sweeper
+    SWITCH_PREDICTION = 0.6  # predicted switch chance above which we pre-empt it
+
+    @classmethod
+    def names(cls) -> List[str]:
+        return [name for name in vars(cls) if name.isupper()]
+
+    @classmethod
+    def as_dict(cls) -> Dict[str, float]:
+        return {name: getattr(cls, name) for name in cls.names()}
+
+    @classmethod
+    def apply(cls, overrides: Dict[str, float]):
+        unknown = set(overrides) - set(cls.names())
+        if unknown:
+            raise KeyError(f"Unknown rule weights: {', '.join(sorted(unknown))}")
+        for name, value in overrides.items():
+            setattr(cls, name, value)
+
+
 class ExpertRules:
     """Rule-Based System for battle decisions"""
     
-    class RulePriority(Enum):
-        CRITICAL = 100
-        HIGH = 75
-        MEDIUM = 50
-        LOW = 25
-    
     @staticmethod
     def evaluate_move_priority(battle: AbstractBattle, move_name: str) -> Tuple[float, str]:
         """
@@ -310,7 +710,7 @@ class ExpertRules:
         if not move:
             return (0.0, "Move not found")
             
-        priority_score = ExpertRules.RulePriority.MEDIUM.value
+        priority_score = RuleWeights.MEDIUM
         reasoning_parts = []
         
         # Rule 1: Type Advantage (High Priority)
@@ -319,14 +719,27 @@ class ExpertRules:
             effectiveness = PokemonKnowledge.get_type_effectiveness(move.type.name, opp_types)
             
             if effectiveness >= 2.0:
-                priority_score += ExpertRules.RulePriority.HIGH.value
+                priority_score += RuleWeights.HIGH
                 reasoning_parts.append("Super effective")
             elif effectiveness <= 0.5:
-                priority_score -= ExpertRules.RulePriority.MEDIUM.value  
+                priority_score -= RuleWeights.MEDIUM  
                 reasoning_parts.append("Not very effective")
         
         # Rule 2: OHKO Potential (Critical Priority)
+        tabled = None
         if move.base_power and move.base_power > 0:
+            tabled = ScoreTable.shared().lookup(
+                my_pokemon.species, move.id, opp_pokemon.species, KnownTeams.spread_bucket(opp_pokemon.species)
+            )
+        if tabled is not None:
+            min_fraction, max_fraction, _ = tabled
+            if max_fraction >= opp_pokemon.current_hp_fraction:
+                priority_score += RuleWeights.CRITICAL
+                reasoning_parts.append("Potential OHKO")
+            elif min_fraction >= opp_pokemon.current_hp_fraction * 0.8:
+                priority_score += RuleWeights.HIGH
+                reasoning_parts.append("High damage potential")
+        elif move.base_power and move.base_power > 0:
             # Use default stats if actual stats not available
             default_stats = {"attack": 100, "spa": 100, "defense": 100, "spd": 100, "hp": 100}
             
@@ -348,37 +761,40 @@ class ExpertRules:
             opp_current_hp = opp_pokemon.current_hp_fraction * opp_max_hp
             
             if max_damage >= opp_current_hp:
-                priority_score += ExpertRules.RulePriority.CRITICAL.value
+                priority_score += RuleWeights.CRITICAL
                 reasoning_parts.append("Potential OHKO")
             elif min_damage >= opp_current_hp * 0.8:
-                priority_score += ExpertRules.RulePriority.HIGH.value
+                priority_score += RuleWeights.HIGH
                 reasoning_parts.append("High damage potential")
         
         # Rule 3: Status Moves (Context Dependent)
         if move.base_power == 0:  # Status move
             if my_pokemon.current_hp_fraction < 0.3:
-                priority_score -= ExpertRules.RulePriority.MEDIUM.value
+                priority_score -= RuleWeights.MEDIUM
                 reasoning_parts.append("Low HP - avoid status")
             elif "heal" in move.id or "recover" in move.id:
-                priority_score += ExpertRules.RulePriority.HIGH.value
+                priority_score += RuleWeights.HIGH
                 reasoning_parts.append("Healing move")
         
         # Rule 4: PP Conservation
         if hasattr(move, 'current_pp') and move.current_pp is not None and move.current_pp <= 1:
-            priority_score -= ExpertRules.RulePriority.LOW.value
+            priority_score -= RuleWeights.LOW
             reasoning_parts.append("Low PP")
             
         reasoning = "; ".join(reasoning_parts) if reasoning_parts else "Standard move"
         return (priority_score, reasoning)
     
     @staticmethod
-    def should_switch(battle: AbstractBattle) -> Tuple[bool, str, Optional[str]]:
+    def should_switch(battle: AbstractBattle, matchups: Optional["MatchupMatrix"] = None) -> Tuple[bool, str, Optional[str]]:
         """
         Determine if switching is advisable
         Returns (should_switch, reasoning, recommended_pokemon)
         """
         if not battle.active_pokemon or not battle.opponent_active_pokemon:
             return (False, "No battle state", None)
+
+        if matchups is not None:
+            return ExpertRules._should_switch_from_matchups(battle, matchups)
             
         my_pokemon = battle.active_pokemon
         opp_pokemon = battle.opponent_active_pokemon
@@ -432,12 +848,44 @@ class ExpertRules:
         
         return (False, "Stay in", None)
 
+    @staticmethod
+    def _should_switch_from_matchups(battle: AbstractBattle, matchups: "MatchupMatrix") -> Tuple[bool, str, Optional[str]]:
+        """Same two rules as should_switch, answered from the precomputed matchup matrix"""
+        my_pokemon = battle.active_pokemon
+        row = matchups.row_of(my_pokemon)
+        col = matchups.column(battle.opponent_active_pokemon)
+        if row is None or col is None:
+            return (False, "Stay in", None)
+        threat = matchups.defense[row, col]
+
+        # Rule 1: Low HP and taking super effective damage - look for a resist
+        if my_pokemon.current_hp_fraction < 0.25 and threat >= 2.0:
+            target = matchups.best_switch(col, battle.available_switches, max_defense=0.5)
+            if target is not None:
+                return (True, f"Switch to resist {matchups.cols[col]}", target)
+
+        # Rule 2: Bad matchup - look for a counter that scores better than us
+        if threat >= 2.0 and my_pokemon.current_hp_fraction > 0.8:
+            target = matchups.best_switch(col, battle.available_switches, max_defense=0.5)
+            if target is not None and matchups.score[matchups.rows.index(target), col] > matchups.score[row, col]:
+                return (True, "Better matchup available", target)
+
+        return (False, "Stay in", None)
+
 # PHASE 2
 """
 Advanced Expert System Features - Phase 2
 Key improvements to beat classmates and reach #1
 """
 
+# Read by the expert rules and the rule network alike, so both score from the same values
+HAZARD_VALUES = {
+    "spikes": 3.0,  # Most important in Ubers
+    "stealthrock": 2.0,
+    "toxicspikes": 1.0
+}
+PASSIVE_WALLS = ("blissey", "toxapex", "skarmory")
+
 class MetaGameKnowledge:
     """Advanced competitive knowledge beyond basic type charts"""
     
@@ -466,11 +914,7 @@ class MetaGameKnowledge:
     }
     
     # Hazard stacking priorities
-    HAZARD_PRIORITY = {
-        "spikes": 3.0,  # Most important in Ubers
-        "stealthrock": 2.0,
-        "toxicspikes": 1.0
-    }
+    HAZARD_PRIORITY = HAZARD_VALUES
     
     # Speed tiers (crucial for Ubers)
     SPEED_TIERS = {
@@ -497,15 +941,14 @@ class AdvancedBattleStrategy:
         reasoning = []
         
         # Check if we have setup moves
-        setup_moves = ["swordsdance", "calmmind", "nastyplot", "agility"]
-        has_setup = any(move.id in setup_moves for move in my_pokemon.moves.values())
+        has_setup = any(MoveIndex.has(move.id, MoveTag.SETUP) for move in my_pokemon.moves.values())
         
         if not has_setup:
             return (0.0, "No setup moves available")
         
         # Opponent is passive/walls
         opp_name = opp_pokemon.species.lower()
-        if any(wall in opp_name for wall in ["blissey", "toxapex", "skarmory"]):
+        if any(wall in opp_name for wall in PASSIVE_WALLS):
             setup_score += 2.0
             reasoning.append("Passive opponent")
         
@@ -539,16 +982,10 @@ class AdvancedBattleStrategy:
         reasoning = []
         
         # Check for hazard moves
-        hazard_moves = {
-            "spikes": 3.0,
-            "stealthrock": 2.0,
-            "toxicspikes": 1.0
-        }
-        
         available_hazards = []
         for move in my_pokemon.moves.values():
-            if move.id in hazard_moves:
-                available_hazards.append((move.id, hazard_moves[move.id]))
+            if move.id in HAZARD_VALUES:
+                available_hazards.append((move.id, HAZARD_VALUES[move.id]))
         
         if not available_hazards:
             return (0.0, "No hazard moves")
@@ -612,42 +1049,39 @@ class WinConditionAnalyzer:
     """Determine and execute win conditions"""
     
     @staticmethod
-    def analyze_win_conditions(battle: AbstractBattle) -> List[Tuple[str, float, str]]:
-        """Identify possible win conditions and their viability"""
-        win_conditions = []
-        
-        # Setup sweep condition
+    def win_condition_members(battle: AbstractBattle) -> Dict[str, List[str]]:
+        """Team members able to carry out each win condition"""
+        members: Dict[str, List[str]] = {"setup_sweep": [], "hazard_stack": [], "revenge_kill": []}
         for pokemon_name, pokemon in battle.team.items():
             if pokemon.fainted:
                 continue
-                
-            setup_moves = ["swordsdance", "calmmind", "nastyplot", "agility"]
-            has_setup = any(move.id in setup_moves for move in pokemon.moves.values())
-            
+            # Setup sweep condition
+            has_setup = any(MoveIndex.has(move.id, MoveTag.SETUP) for move in pokemon.moves.values())
             if has_setup and pokemon.current_hp_fraction > 0.6:
-                viability = 0.7 if pokemon.active else 0.5
-                win_conditions.append(("setup_sweep", viability, f"Setup with {pokemon_name}"))
+                members["setup_sweep"].append(pokemon_name)
+            # Hazard stacking + residual damage
+            if any(MoveIndex.has(move.id, MoveTag.HAZARD) for move in pokemon.moves.values()):
+                members["hazard_stack"].append(pokemon_name)
+            # Revenge killing
+            if hasattr(pokemon, 'base_stats') and pokemon.base_stats.get('spe', 0) > 100:  # Fast Pokemon
+                members["revenge_kill"].append(pokemon_name)
+        return members
+
+    @staticmethod
+    def analyze_win_conditions(battle: AbstractBattle) -> List[Tuple[str, float, str]]:
+        """Identify possible win conditions and their viability"""
+        win_conditions = []
+        members = WinConditionAnalyzer.win_condition_members(battle)
         
-        # Hazard stacking + residual damage
-        hazard_setters = []
-        for pokemon_name, pokemon in battle.team.items():
-            if not pokemon.fainted:
-                hazard_moves = ["spikes", "stealthrock", "toxicspikes"]
-                if any(move.id in hazard_moves for move in pokemon.moves.values()):
-                    hazard_setters.append(pokemon_name)
+        for pokemon_name in members["setup_sweep"]:
+            viability = 0.7 if battle.team[pokemon_name].active else 0.5
+            win_conditions.append(("setup_sweep", viability, f"Setup with {pokemon_name}"))
         
-        if len(hazard_setters) >= 1:
-            win_conditions.append(("hazard_stack", 0.6, f"Hazard stack with {hazard_setters}"))
+        if len(members["hazard_stack"]) >= 1:
+            win_conditions.append(("hazard_stack", 0.6, f"Hazard stack with {members['hazard_stack']}"))
         
-        # Revenge killing
-        fast_attackers = []
-        for pokemon_name, pokemon in battle.team.items():
-            if not pokemon.fainted and hasattr(pokemon, 'base_stats'):
-                if pokemon.base_stats.get('spe', 0) > 100:  # Fast Pokemon
-                    fast_attackers.append(pokemon_name)
-        
-        if fast_attackers:
-            win_conditions.append(("revenge_kill", 0.4, f"Revenge with {fast_attackers}"))
+        if members["revenge_kill"]:
+            win_conditions.append(("revenge_kill", 0.4, f"Revenge with {members['revenge_kill']}"))
         
         # Sort by viability
         win_conditions.sort(key=lambda x: x[1], reverse=True)
@@ -667,22 +1101,23 @@ class EnhancedExpertRules(ExpertRules):
         reasoning_parts = [base_reasoning]
         
         # Setup move evaluation
-        if move_name.lower() in ["swordsdance", "calmmind", "nastyplot", "agility"]:
+        tags = MoveIndex.tags(move_name.lower())
+        if tags & MoveTag.SETUP:
             setup_score, setup_reason = AdvancedBattleStrategy.evaluate_setup_opportunity(battle)
-            advanced_priority += setup_score * 20  # High multiplier for good setup
+            advanced_priority += setup_score * RuleWeights.SETUP_MULTIPLIER
             reasoning_parts.append(f"Setup opportunity: {setup_reason}")
         
         # Hazard move evaluation  
-        if move_name.lower() in ["spikes", "stealthrock", "toxicspikes"]:
+        if tags & MoveTag.HAZARD:
             hazard_score, hazard_reason = AdvancedBattleStrategy.evaluate_hazard_priority(battle)
-            advanced_priority += hazard_score * 15
+            advanced_priority += hazard_score * RuleWeights.HAZARD_MULTIPLIER
             reasoning_parts.append(f"Hazard value: {hazard_reason}")
         
         # Priority move bonus in endgame
-        if move_name.lower() in ["extremespeed", "suckerpunch", "bulletpunch"]:
+        if tags & MoveTag.PRIORITY:
             alive_count = sum(1 for p in battle.team.values() if not p.fainted)
             if alive_count <= 2:  # Endgame
-                advanced_priority += 30
+                advanced_priority += RuleWeights.ENDGAME_PRIORITY_BONUS
                 reasoning_parts.append("Priority move endgame")
         
         # Meta-specific counters
@@ -692,9 +1127,2106 @@ class EnhancedExpertRules(ExpertRules):
                 # Bonus for moves that counter common threats
                 threat_info = MetaGameKnowledge.COMMON_SETS[opp_name]
                 if threat_info["threat_level"] == "setup_sweeper":
-                    if move_name.lower() in ["taunt", "roar", "whirlwind"]:
-                        advanced_priority += 25
+                    if tags & MoveTag.ANTI_SETUP:
+                        advanced_priority += RuleWeights.SETUP_COUNTER_BONUS
                         reasoning_parts.append("Counter setup sweeper")
         
         combined_reasoning = " | ".join(reasoning_parts)
-        return (advanced_priority, combined_reasoning)
\ No newline at end of file
+        return (advanced_priority, combined_reasoning)
+
+# PHASE 3
+"""
+Opponent modelling - the generic bots are (near) deterministic, so once we
+know which one we are facing we can replay its policy locally.
+"""
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data")
+
+
+class KnownTeams:
+    """Movesets of the bot teams shipped in bots/teams, keyed by species id"""
+
+    TEAMS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "bots", "teams")
+    _library: Optional[Dict[str, Dict]] = None
+
+    @staticmethod
+    def team_files() -> List[str]:
+        if not os.path.isdir(KnownTeams.TEAMS_DIR):
+            return []
+        return [os.path.join(KnownTeams.TEAMS_DIR, name)
+                for name in sorted(os.listdir(KnownTeams.TEAMS_DIR)) if name.endswith(".txt")]
+
+    @staticmethod
+    def build() -> Dict[str, Dict]:
+        """Parse every team file; a missing folder means an empty library"""
+        library: Dict[str, Dict] = {"movesets": {}, "spreads": {}, "tera_types": {}, "items": {}}
+        for team_file in KnownTeams.team_files():
+            with open(team_file, "r", encoding="utf-8") as file:
+                for mon in Teambuilder.parse_showdown_team(file.read()):
+                    species = to_id_str(mon.species or mon.nickname)
+                    library["movesets"].setdefault(species, [Move.retrieve_id(m) for m in mon.moves])
+                    library["spreads"].setdefault(species, list(mon.evs))
+                    if mon.tera_type:
+                        library["tera_types"].setdefault(species, mon.tera_type.strip().upper())
+                    if mon.item:
+                        library["items"].setdefault(species, to_id_str(mon.item))
+        return library
+
+    @staticmethod
+    def library() -> Dict[str, Dict]:
+        if KnownTeams._library is None:
+            snapshot = KnowledgeSnapshot.section("sets")
+            KnownTeams._library = snapshot if snapshot is not None else KnownTeams.build()
+        return KnownTeams._library
+
+    @staticmethod
+    def movesets() -> Dict[str, List[str]]:
+        return KnownTeams.library()["movesets"]
+
+    @staticmethod
+    def spread_bucket(species: str) -> str:
+        """ScoreTable bucket closest to a known set's EVs, the default bucket otherwise"""
+        evs = KnownTeams.library()["spreads"].get(species)
+        if not evs:
+            return ScoreTable.DEFAULT_BUCKET
+        hp, defense, spd = evs[0], evs[2], evs[4]
+        if hp + defense >= 400:
+            return "physdef"
+        if hp + spd >= 400:
+            return "specdef"
+        if hp + defense + spd <= 16:
+            return "offensive"
+        return "balanced"
+
+    @staticmethod
+    def tera_type(pokemon: Pokemon) -> Optional[PokemonType]:
+        """Revealed Tera type, else the one its known set declares"""
+        if pokemon.is_terastallized:
+            return pokemon.type_1
+        name = KnownTeams.library()["tera_types"].get(pokemon.species)
+        return PokemonType[name] if name is not None and name in PokemonType.__members__ else None
+
+    @staticmethod
+    def item(pokemon: Pokemon) -> str:
+        """Revealed item, else the one its known set holds; empty once it has been lost"""
+        if pokemon.item != GenData.UNKNOWN_ITEM:
+            return pokemon.item or ""
+        return KnownTeams.library()["items"].get(pokemon.species, "")
+
+    @staticmethod
+    def moves_for(pokemon: Pokemon) -> List[Move]:
+        """Full moveset when the species is in the library, else the revealed moves"""
+        known = KnownTeams.movesets().get(pokemon.species)
+        if known:
+            return [pokemon.moves[m] if m in pokemon.moves else Move(m, gen=9) for m in known]
+        return list(pokemon.moves.values())
+
+
+class OpponentPolicy:
+    """Local replica of a bot policy, evaluated from the opponent's side of the board"""
+
+    name = "unknown"
+
+    def predict(self, battle: AbstractBattle) -> Optional[str]:
+        """Returns a move id, "switch:<species>" or None when the policy can't tell"""
+        raise NotImplementedError
+
+
+class MaxDamagePolicy(OpponentPolicy):
+    """Mirror of bots/max_damage.py - highest base power move, first one on ties"""
+
+    name = "max_damage"
+
+    def predict(self, battle: AbstractBattle) -> Optional[str]:
+        opp_pokemon = battle.opponent_active_pokemon
+        if not opp_pokemon:
+            return None
+        moves = KnownTeams.moves_for(opp_pokemon)
+        if not moves:
+            return None
+        return max(moves, key=lambda move: move.base_power).id
+
+
+class SimpleHeuristicsPolicy(OpponentPolicy):
+    """Mirror of poke_env's SimpleHeuristicsPlayer (bots/simple.py)"""
+
+    name = "simple"
+
+    @staticmethod
+    def _estimate_matchup(mon: Pokemon, opponent: Pokemon) -> float:
+        score = max([opponent.damage_multiplier(t) for t in mon.types if t is not None])
+        score -= max([mon.damage_multiplier(t) for t in opponent.types if t is not None])
+        if mon.base_stats["spe"] > opponent.base_stats["spe"]:
+            score += SimpleHeuristicsPlayer.SPEED_TIER_COEFICIENT
+        elif opponent.base_stats["spe"] > mon.base_stats["spe"]:
+            score -= SimpleHeuristicsPlayer.SPEED_TIER_COEFICIENT
+        score += mon.current_hp_fraction * SimpleHeuristicsPlayer.HP_FRACTION_COEFICIENT
+        score -= opponent.current_hp_fraction * SimpleHeuristicsPlayer.HP_FRACTION_COEFICIENT
+        return score
+
+    @staticmethod
+    def _stat_estimation(mon: Pokemon, stat: str) -> float:
+        if mon.boosts[stat] > 1:
+            boost = (2 + mon.boosts[stat]) / 2
+        else:
+            boost = 2 / (2 - mon.boosts[stat])
+        return ((2 * mon.base_stats[stat] + 31) + 5) * boost
+
+    @staticmethod
+    def _their_switches(battle: AbstractBattle) -> List[Pokemon]:
+        active = battle.opponent_active_pokemon
+        bench = {mon.species: mon for mon in battle.teampreview_opponent_team}
+        bench.update({mon.species: mon for mon in battle.opponent_team.values()})
+        return [mon for mon in bench.values() if not mon.fainted and mon.species != (active.species if active else None)]
+
+    def _should_switch_out(self, battle: AbstractBattle, switches: List[Pokemon]) -> bool:
+        active = battle.opponent_active_pokemon
+        opponent = battle.active_pokemon
+        if [m for m in switches if self._estimate_matchup(m, opponent) > 0]:
+            if active.boosts["def"] <= -3 or active.boosts["spd"] <= -3:
+                return True
+            # Their real stats are hidden from us, base stats decide the attacking side
+            if active.boosts["atk"] <= -3 and active.base_stats["atk"] >= active.base_stats["spa"]:
+                return True
+            if active.boosts["spa"] <= -3 and active.base_stats["atk"] <= active.base_stats["spa"]:
+                return True
+            if self._estimate_matchup(active, opponent) < SimpleHeuristicsPlayer.SWITCH_OUT_MATCHUP_THRESHOLD:
+                return True
+        return False
+
+    def predict(self, battle: AbstractBattle) -> Optional[str]:
+        active = battle.opponent_active_pokemon
+        opponent = battle.active_pokemon
+        if not active or not opponent:
+            return None
+        moves = KnownTeams.moves_for(active)
+        switches = self._their_switches(battle)
+
+        if moves and (not self._should_switch_out(battle, switches) or not switches):
+            n_remaining_mons = len([m for m in switches if not m.fainted]) + 1
+            n_opp_remaining_mons = 6 - len([m for m in battle.team.values() if m.fainted])
+
+            for move in moves:
+                if (
+                    n_opp_remaining_mons >= 3
+                    and move.id in SimpleHeuristicsPlayer.ENTRY_HAZARDS
+                    and SimpleHeuristicsPlayer.ENTRY_HAZARDS[move.id] not in battle.side_conditions
+                ):
+                    return move.id
+                elif (
+                    battle.opponent_side_conditions
+                    and move.id in SimpleHeuristicsPlayer.ANTI_HAZARDS_MOVES
+                    and n_remaining_mons >= 2
+                ):
+                    return move.id
+
+            if active.current_hp_fraction == 1 and self._estimate_matchup(active, opponent) > 0:
+                for move in moves:
+                    if (
+                        move.boosts
+                        and sum(move.boosts.values()) >= 2
+                        and move.target == "self"
+                        and min([active.boosts[s] for s, v in move.boosts.items() if v > 0]) < 6
+                    ):
+                        return move.id
+
+            physical_ratio = self._stat_estimation(active, "atk") / self._stat_estimation(opponent, "def")
+            special_ratio = self._stat_estimation(active, "spa") / self._stat_estimation(opponent, "spd")
+            return max(
+                moves,
+                key=lambda m: m.base_power
+                * (1.5 if m.type in active.types else 1)
+                * (physical_ratio if m.category == MoveCategory.PHYSICAL else special_ratio)
+                * m.accuracy
+                * m.expected_hits
+                * opponent.damage_multiplier(m),
+            ).id
+
+        if switches:
+            return "switch:" + max(switches, key=lambda s: self._estimate_matchup(s, opponent)).species
+        return None
+
+
+class OpponentPolicyClassifier:
+    """Recognizes which known policy the opponent plays from the actions it chose freely"""
+
+    POLICIES: List[OpponentPolicy] = [MaxDamagePolicy(), SimpleHeuristicsPolicy()]
+    MIN_OBSERVATIONS = 3
+    MATCH_RATIO = 0.75  # a replica may miss the odd choice without losing the policy
+    # The policies pick from every move and switch, so turns these limit say nothing about them
+    CONSTRAINING_EFFECTS = (Effect.DISABLE, Effect.ENCORE, Effect.TAUNT, Effect.TORMENT,
+                            Effect.LOCKED_MOVE, Effect.TRAPPED, Effect.PARTIALLY_TRAPPED)
+
+    def __init__(self):
+        self.hits = {policy.name: 0 for policy in self.POLICIES}
+        self.misses = {policy.name: 0 for policy in self.POLICIES}
+        self._pending: Dict[str, Optional[str]] = {}
+        self._pending_turn: Optional[int] = None
+        self._forced_switch = False
+        self._moved = False  # a move has been used this turn, so later switches were not chosen
+        self._last_move: Optional[str] = None  # the opponent's last move since it switched in
+
+    def on_event(self, event: "BattleEvent"):
+        """Scores the pending predictions against the opponent's first chosen action of the turn"""
+        chosen = not self._moved
+        if event.kind is BattleEventKind.MOVE:
+            self._moved = True
+        if event.side != "opponent":
+            return
+        if event.kind is BattleEventKind.FAINT:
+            self._forced_switch = True
+        elif event.kind is BattleEventKind.SWITCH:
+            self._last_move = None
+            if self._forced_switch:
+                self._forced_switch = False
+            elif chosen:
+                # Chosen switches go before every move; later ones are drags, pivots and ejections
+                self._score("switch:" + event.species)
+        elif event.kind is BattleEventKind.MOVE:
+            self._last_move = event.value
+            self._score(event.value)
+
+    def _score(self, actual: str):
+        for name, predicted in self._pending.items():
+            if predicted is None:
+                continue
+            if predicted == actual:
+                self.hits[name] += 1
+            else:
+                self.misses[name] += 1
+        self._pending = {}
+
+    def constrained(self, battle: AbstractBattle) -> bool:
+        """Whether the opponent's choice this turn is narrowed by something no policy models"""
+        active = battle.opponent_active_pokemon
+        if active is None:
+            return False
+        if active.must_recharge or active.preparing or any(effect in active.effects for effect in self.CONSTRAINING_EFFECTS):
+            return True
+        return self._last_move is not None and KnownTeams.item(active).startswith("choice")
+
+    def update(self, battle: AbstractBattle):
+        """Predicts this turn's opponent action under every known policy"""
+        if self._pending_turn is not None and self._pending_turn < battle.turn:
+            self._pending = {}
+            self._pending_turn = None
+        if self._pending_turn is None and not battle.force_switch:
+            self._moved = False
+            self._pending_turn = battle.turn
+            if not self.constrained(battle):
+                self._pending = {policy.name: policy.predict(battle) for policy in self.POLICIES}
+
+    def pending(self, policy: OpponentPolicy) -> Optional[str]:
+        """This turn's prediction under a policy, if one has been made"""
+        return self._pending.get(policy.name)
+
+    def match_ratio(self, policy: OpponentPolicy) -> float:
+        observed = self.hits[policy.name] + self.misses[policy.name]
+        return self.hits[policy.name] / observed if observed else 0.0
+
+    @property
+    def recognized(self) -> Optional[OpponentPolicy]:
+        """The best-matching policy once it has enough observations at MATCH_RATIO or better"""
+        candidates = [policy for policy in self.POLICIES
+                      if self.hits[policy.name] + self.misses[policy.name] >= self.MIN_OBSERVATIONS
+                      and self.match_ratio(policy) >= self.MATCH_RATIO]
+        return max(candidates, key=self.match_ratio) if candidates else None
+
+    def predict(self, battle: AbstractBattle) -> Dict[str, float]:
+        """Single-branch prediction when recognized, generic meta guesses otherwise"""
+        policy = self.recognized
+        if policy is not None and not self.constrained(battle):
+            action = self.pending(policy) if self._pending else policy.predict(battle)
+            if action is not None:
+                return {"switch": 1.0} if action.startswith("switch:") else {action: 1.0}
+        return AdvancedBattleStrategy.predict_opponent_move(battle)
+
+
+"""
+Incremental battle-event deltas - derived models update from what changed
+in each battle message instead of rescanning the whole battle every turn.
+"""
+
+class BattleEventKind(Enum):
+    DAMAGE = "damage"
+    FAINT = "faint"
+    SWITCH = "switch"
+    MOVE = "move"
+    BOOST = "boost"
+    HAZARD_SET = "hazard_set"
+    HAZARD_CLEARED = "hazard_cleared"
+    TERA = "tera"
+
+
+class BattleEvent(NamedTuple):
+    kind: BattleEventKind
+    side: str  # "self" or "opponent"
+    ident: str  # e.g. "p2: Zacian"
+    species: str
+    value: Any = None  # hp fraction, move id, (stat, stages) or (hazard, layers)
+
+
+class BattleDeltaTracker:
+    """Turns raw battle messages into typed deltas and keeps cheap derived models"""
+
+    HAZARDS = {"spikes", "stealthrock", "toxicspikes", "stickyweb"}
+
+    def __init__(self, username: str):
+        self.username = to_id_str(username)
+        self.role: Optional[str] = None
+        self.primed = False
+        self.alive = {"self": 6, "opponent": 6}
+        self.hp: Dict[str, float] = {}
+        self.boosts: Dict[str, Dict[str, int]] = {}
+        self.revealed_moves: Dict[str, List[str]] = {}
+        self.hazards: Dict[str, Dict[str, int]] = {"self": {}, "opponent": {}}
+        self.species: Dict[str, str] = {}
+        self.active: Dict[str, Optional[str]] = {"self": None, "opponent": None}
+        self.listeners: List[Callable[[BattleEvent], None]] = []
+
+    def resync(self, battle: AbstractBattle):
+        """One full scan for battles we did not see from the start (offline states)"""
+        self.role = self.role or battle.player_role
+        self.alive["self"] = sum(1 for p in battle.team.values() if not p.fainted)
+        self.alive["opponent"] = 6 - sum(1 for p in battle.opponent_team.values() if p.fainted)
+        for side, conditions in (("self", battle.side_conditions), ("opponent", battle.opponent_side_conditions)):
+            self.hazards[side] = {c.name.lower().replace("_", ""): n for c, n in conditions.items()
+                                  if c.name.lower().replace("_", "") in self.HAZARDS}
+        self.primed = True
+
+    def _side(self, ident: str) -> str:
+        return "self" if ident[:2] == self.role else "opponent"
+
+    @staticmethod
+    def _ident(pokemon_str: str) -> str:
+        # "p2a: Zacian" -> "p2: Zacian", matching poke_env's team keys
+        return pokemon_str[:2] + pokemon_str[3:] if pokemon_str[2:3] != ":" else pokemon_str
+
+    def _species_of(self, ident: str) -> str:
+        # Bots don't nickname, so the ident name is a good guess until a switch line is seen
+        return self.species.get(ident) or to_id_str(ident[4:])
+
+    @staticmethod
+    def _hp_fraction(hp_status: str) -> float:
+        hp = hp_status.split(" ")[0]
+        if hp == "0" or "fnt" in hp_status:
+            return 0.0
+        current, _, maximum = hp.partition("/")
+        return float(current) / float(maximum) if maximum else 0.0
+
+    def feed(self, split_message: List[str]) -> List[BattleEvent]:
+        """Parses one protocol line, updates the derived models and returns its deltas"""
+        if len(split_message) < 3:
+            return []
+        tag = split_message[1]
+        if tag == "player" and len(split_message) >= 4 and to_id_str(split_message[3]) == self.username:
+            self.role = split_message[2]
+            return []
+        if tag == "teamsize" and len(split_message) >= 4:
+            self.alive["self" if split_message[2] == self.role else "opponent"] = int(split_message[3])
+            return []
+        if not split_message[2][:1] == "p" or self.role is None:
+            return []
+
+        self.primed = True
+        ident = self._ident(split_message[2])
+        side = self._side(ident)
+        events: List[BattleEvent] = []
+
+        if tag in ("switch", "drag") and len(split_message) >= 5:
+            species = to_id_str(split_message[3].split(",")[0])
+            previous = self.active[side]
+            if previous is not None:
+                self.boosts.pop(previous, None)
+            self.species[ident] = species
+            self.active[side] = ident
+            self.hp[ident] = self._hp_fraction(split_message[4])
+            events.append(BattleEvent(BattleEventKind.SWITCH, side, ident, species, self.hp[ident]))
+        elif tag in ("-damage", "-heal") and len(split_message) >= 4:
+            self.hp[ident] = self._hp_fraction(split_message[3])
+            events.append(BattleEvent(BattleEventKind.DAMAGE, side, ident, self._species_of(ident), self.hp[ident]))
+        elif tag == "faint":
+            self.hp[ident] = 0.0
+            self.alive[side] = max(0, self.alive[side] - 1)
+            events.append(BattleEvent(BattleEventKind.FAINT, side, ident, self._species_of(ident)))
+        elif tag == "move" and len(split_message) >= 4:
+            if any(arg.startswith("[from]") for arg in split_message[4:]):
+                return []
+            move_id = Move.retrieve_id(split_message[3])
+            revealed = self.revealed_moves.setdefault(ident, [])
+            if move_id not in revealed:
+                revealed.append(move_id)
+            events.append(BattleEvent(BattleEventKind.MOVE, side, ident, self._species_of(ident), move_id))
+        elif tag in ("-boost", "-unboost") and len(split_message) >= 5:
+            stages = int(split_message[4]) * (1 if tag == "-boost" else -1)
+            boosts = self.boosts.setdefault(ident, {})
+            boosts[split_message[3]] = max(-6, min(6, boosts.get(split_message[3], 0) + stages))
+            events.append(BattleEvent(BattleEventKind.BOOST, side, ident, self._species_of(ident), (split_message[3], stages)))
+        elif tag in ("-sidestart", "-sideend") and len(split_message) >= 4:
+            hazard = to_id_str(split_message[3].replace("move: ", ""))
+            if hazard in self.HAZARDS:
+                hazards = self.hazards[side]
+                if tag == "-sidestart":
+                    hazards[hazard] = hazards.get(hazard, 0) + 1
+                    events.append(BattleEvent(BattleEventKind.HAZARD_SET, side, ident, "", (hazard, hazards[hazard])))
+                else:
+                    hazards.pop(hazard, None)
+                    events.append(BattleEvent(BattleEventKind.HAZARD_CLEARED, side, ident, "", (hazard, 0)))
+        elif tag == "-terastallize" and len(split_message) >= 4:
+            events.append(BattleEvent(BattleEventKind.TERA, side, ident, self._species_of(ident), split_message[3].upper()))
+
+        for event in events:
+            for listener in self.listeners:
+                listener(event)
+        return events
+
+
+"""
+Team-vs-opponent matchup matrix - built once at team preview, patched from
+battle deltas, and read with a single lookup when choosing a switch-in.
+"""
+
+class MatchupMatrix:
+    """Our six (rows) against their six (columns): type pressure, speed and KO odds"""
+
+    SPEED_WEIGHT = 0.1
+    KO_WEIGHT = 1.0
+    STAB_POWER = 80  # stand-in power when none of an opponent's moves are known
+
+    def __init__(self, team: Dict[str, Pokemon], opponents: List[Pokemon],
+                 cache: Optional["PersistentCache"] = None):
+        self.cache = cache
+        self.rows: List[str] = list(team.keys())
+        self.mons: List[Pokemon] = list(team.values())
+        self.cols: List[str] = []
+        self.opponents: List[Pokemon] = []
+        n_rows = len(self.rows)
+        self.offense = np.ones((n_rows, 0))
+        self.defense = np.ones((n_rows, 0))
+        self.speed = np.zeros((n_rows, 0))
+        self.dmg_for = np.zeros((n_rows, 0, 2))
+        self.dmg_against = np.zeros((n_rows, 0, 2))
+        self.hp_rows = np.array([mon.current_hp_fraction for mon in self.mons], dtype=float)
+        self.hp_cols = np.zeros(0)
+        self.score = np.zeros((n_rows, 0))
+        # Tera events arrive before poke_env retypes the mon, so they are applied on the next read
+        self.pending_tera: List[Tuple[str, str]] = []
+        for opponent in opponents:
+            self.add_column(opponent)
+
+    @classmethod
+    def from_battle(cls, battle: AbstractBattle, cache: Optional["PersistentCache"] = None) -> "MatchupMatrix":
+        opponents = {mon.species: mon for mon in battle.opponent_team.values()}
+        for mon in battle.teampreview_opponent_team:
+            if not any(MatchupMatrix._same_species(mon, known) for known in opponents.values()):
+                opponents[mon.species] = mon
+        return cls(battle.team, [opponents[species] for species in sorted(opponents)], cache)
+
+    @staticmethod
+    def _same_species(mon: Pokemon, other: Pokemon) -> bool:
+        # Team preview hides formes ("Zacian-*"), so fall back on the base species
+        return mon.species == other.species or mon.base_species == other.base_species
+
+    @staticmethod
+    def _stats(mon: Pokemon) -> Dict[str, float]:
+        if mon.stats and all(v is not None for v in mon.stats.values()):
+            stats: Dict[str, float] = {stat: value for stat, value in mon.stats.items() if value is not None}
+            stats.setdefault("hp", mon.max_hp)
+        else:
+            values = compute_raw_stats(mon.species, [84] * 6, [31] * 6, mon.level, "serious", mon._data)
+            stats = dict(zip(["hp", "atk", "def", "spa", "spd", "spe"], values))
+        return stats
+
+    @staticmethod
+    def _attacks(mon: Pokemon, moves: List[Move]) -> List[Tuple[PokemonType, int, bool]]:
+        attacks = [(m.type, m.base_power, m.category == MoveCategory.PHYSICAL) for m in moves if m.base_power > 0]
+        if not attacks:
+            physical = mon.base_stats["atk"] >= mon.base_stats["spa"]
+            attacks = [(t, MatchupMatrix.STAB_POWER, physical) for t in mon.types if t is not None]
+        return attacks
+
+    @staticmethod
+    def _profile(mon: Pokemon, attacks) -> Tuple:
+        """Everything damage and speed depend on for one Pokemon, as part of a persistent cache key"""
+        return (mon.species, mon.level, [t.name for t in mon.types if t], sorted(MatchupMatrix._stats(mon).items()),
+                [(t.name, power, physical) for t, power, physical in attacks])
+
+    @staticmethod
+    def _damage_range(attacker: Pokemon, defender: Pokemon, attacks,
+                      cache: Optional["PersistentCache"] = None) -> Tuple[float, float, float]:
+        """Best attack's (effectiveness, min, max) with damage as a fraction of max HP"""
+        atk_stats, def_stats = MatchupMatrix._stats(attacker), MatchupMatrix._stats(defender)
+        key = None
+        if cache is not None:
+            key = repr((MatchupMatrix._profile(attacker, attacks), MatchupMatrix._profile(defender, [])))
+            cached = cache.get("damage", key)
+            if cached is not None:
+                return tuple(cached)
+        best = (1.0, 0.0, 0.0)
+        for move_type, power, physical in attacks:
+            effectiveness = defender.damage_multiplier(move_type)
+            stab = 1.5 if move_type in attacker.types else 1.0
+            min_damage, max_damage = DamageCalculator.calculate_damage(
+                {"attack": atk_stats["atk"], "spa": atk_stats["spa"]},
+                {"defense": def_stats["def"], "spd": def_stats["spd"]},
+                power, effectiveness * stab, physical, attacker.level,
+            )
+            candidate = (effectiveness, min_damage / def_stats["hp"], max_damage / def_stats["hp"])
+            if candidate[2] > best[2] or (best[2] == 0 and effectiveness > best[0]):
+                best = candidate
+        if cache is not None and key is not None:
+            cache.put("damage", key, best)
+        return best
+
+    def _column_values(self, opponent: Pokemon) -> Tuple[List, List, List, List, List]:
+        offense, defense, speed = [], [], []
+        dmg_for, dmg_against = [], []
+        opp_attacks = self._attacks(opponent, KnownTeams.moves_for(opponent))
+        for mon in self.mons:
+            eff_for, lo_for, hi_for = self._damage_range(
+                mon, opponent, self._attacks(mon, list(mon.moves.values())), self.cache
+            )
+            eff_against, lo_against, hi_against = self._damage_range(opponent, mon, opp_attacks, self.cache)
+            offense.append(eff_for)
+            defense.append(eff_against)
+            dmg_for.append((lo_for, hi_for))
+            dmg_against.append((lo_against, hi_against))
+            speed.append(float(np.sign(self._stats(mon)["spe"] - self._stats(opponent)["spe"])))
+        return offense, defense, speed, dmg_for, dmg_against
+
+    def add_column(self, opponent: Pokemon) -> int:
+        key = values = None
+        if self.cache is not None:
+            # A column only depends on the sets on either side, so it survives across battles
+            key = repr(([self._profile(mon, self._attacks(mon, list(mon.moves.values()))) for mon in self.mons],
+                        self._profile(opponent, self._attacks(opponent, KnownTeams.moves_for(opponent)))))
+            values = self.cache.get("matchup", key)
+        if values is None:
+            values = self._column_values(opponent)
+            if self.cache is not None and key is not None:
+                self.cache.put("matchup", key, values)
+        self.cols.append(opponent.species)
+        self.opponents.append(opponent)
+        n_rows = len(self.rows)
+        self.offense = np.column_stack([self.offense, np.ones(n_rows)])
+        self.defense = np.column_stack([self.defense, np.ones(n_rows)])
+        self.speed = np.column_stack([self.speed, np.zeros(n_rows)])
+        self.dmg_for = np.concatenate([self.dmg_for, np.zeros((n_rows, 1, 2))], axis=1)
+        self.dmg_against = np.concatenate([self.dmg_against, np.zeros((n_rows, 1, 2))], axis=1)
+        # Team preview entries carry no HP yet, treat them as full
+        self.hp_cols = np.append(self.hp_cols, opponent.current_hp_fraction if opponent.max_hp else 1.0)
+        self.score = np.column_stack([self.score, np.zeros(n_rows)])
+        self._set_column(len(self.cols) - 1, values)
+        return len(self.cols) - 1
+
+    def _set_column(self, j: int, values: Tuple[List, List, List, List, List]):
+        offense, defense, speed, dmg_for, dmg_against = values
+        self.offense[:, j] = offense
+        self.defense[:, j] = defense
+        self.speed[:, j] = speed
+        self.dmg_for[:, j] = dmg_for
+        self.dmg_against[:, j] = dmg_against
+        self._refresh(cols=[j])
+
+    def apply_tera(self):
+        """Re-derives the rows/columns of every mon that terastallized since the last read"""
+        pending, self.pending_tera = self.pending_tera, []
+        for side, name in pending:
+            if side == "opponent":
+                j = next((k for k, mon in enumerate(self.opponents)
+                          if mon.species == name or name.startswith(to_id_str(mon.base_species))), None)
+                if j is not None:
+                    self._set_column(j, self._column_values(self.opponents[j]))
+            elif name in self.rows:
+                i = self.rows.index(name)
+                mon = self.mons[i]
+                my_attacks = self._attacks(mon, list(mon.moves.values()))
+                for j, opponent in enumerate(self.opponents):
+                    eff_for, lo_for, hi_for = self._damage_range(mon, opponent, my_attacks, self.cache)
+                    eff_against, lo_against, hi_against = self._damage_range(
+                        opponent, mon, self._attacks(opponent, KnownTeams.moves_for(opponent)), self.cache
+                    )
+                    self.offense[i, j], self.defense[i, j] = eff_for, eff_against
+                    self.dmg_for[i, j] = (lo_for, hi_for)
+                    self.dmg_against[i, j] = (lo_against, hi_against)
+                self._refresh(rows=[i])
+
+    @staticmethod
+    def _ko_odds(dmg: np.ndarray, hp: np.ndarray) -> np.ndarray:
+        """Share of the damage roll that KOs a target at the given HP fraction"""
+        return KERNELS.ko_odds(dmg[..., 0], dmg[..., 1], hp)
+
+    def _refresh(self, rows: Optional[List[int]] = None, cols: Optional[List[int]] = None):
+        r = np.arange(len(self.rows)) if rows is None else np.asarray(rows)
+        c = np.arange(len(self.cols)) if cols is None else np.asarray(cols)
+        cells = np.ix_(r, c)
+        ko_for = self._ko_odds(self.dmg_for[cells], self.hp_cols[c][None, :])
+        ko_against = self._ko_odds(self.dmg_against[cells], self.hp_rows[r][:, None])
+        self.score[cells] = (
+            self.offense[cells] - self.defense[cells]
+            + self.SPEED_WEIGHT * self.speed[cells]
+            + self.KO_WEIGHT * (ko_for - ko_against)
+        )
+
+    def row_of(self, pokemon: Pokemon) -> Optional[int]:
+        for i, mon in enumerate(self.mons):
+            if mon is pokemon:
+                return i
+        return None
+
+    def column(self, opponent: Pokemon) -> Optional[int]:
+        if opponent.species in self.cols:
+            return self.cols.index(opponent.species)
+        for j, known in enumerate(self.opponents):
+            if self._same_species(opponent, known):
+                self.cols[j] = opponent.species
+                self.opponents[j] = opponent
+                return j
+        return self.add_column(opponent)
+
+    def best_switch(self, col: int, candidates: List[Pokemon], max_defense: Optional[float] = None) -> Optional[str]:
+        """Team key of the best-scoring candidate against column col"""
+        rows = [i for i, mon in enumerate(self.mons) if any(mon is c for c in candidates)]
+        if max_defense is not None:
+            rows = [i for i in rows if self.defense[i, col] <= max_defense]
+        if not rows:
+            return None
+        return self.rows[max(rows, key=lambda i: self.score[i, col])]
+
+    def on_event(self, event: "BattleEvent"):
+        if event.kind is BattleEventKind.TERA:
+            self.pending_tera.append((event.side, event.ident if event.side == "self" else event.species))
+            return
+        if event.kind not in (BattleEventKind.DAMAGE, BattleEventKind.FAINT, BattleEventKind.SWITCH):
+            return
+        hp = 0.0 if event.kind is BattleEventKind.FAINT else event.value
+        if event.side == "self":
+            if event.ident in self.rows:
+                i = self.rows.index(event.ident)
+                self.hp_rows[i] = hp
+                self._refresh(rows=[i])
+        else:
+            j = self.cols.index(event.species) if event.species in self.cols else None
+            if j is None:
+                j = next((k for k, mon in enumerate(self.opponents)
+                          if event.species and event.species.startswith(to_id_str(mon.base_species))), None)
+            if j is not None:
+                self.hp_cols[j] = hp
+                self._refresh(cols=[j])
+
+
+class LeadPlanner:
+    """Scores every lead and back-line ordering against the revealed team, cached per opponent team"""
+
+    # Position weights: the lead matters most, the back line only breaks ties
+    POSITION_WEIGHTS = np.array([1.0, 0.3, 0.2, 0.15, 0.1, 0.05])
+    _cache: Dict[str, Tuple[int, ...]] = {}
+    _permutations: Dict[int, np.ndarray] = {}
+
+    @staticmethod
+    def team_hash(battle: AbstractBattle) -> str:
+        ours = ",".join(mon.species for mon in battle.team.values())
+        theirs = ",".join(sorted(mon.species for mon in battle.teampreview_opponent_team))
+        return hashlib.sha1(f"{ours}|{theirs}".encode("utf-8")).hexdigest()
+
+    @staticmethod
+    def permutations(n: int) -> np.ndarray:
+        if n not in LeadPlanner._permutations:
+            LeadPlanner._permutations[n] = np.array(list(itertools.permutations(range(n))), dtype=np.int8)
+        return LeadPlanner._permutations[n]
+
+    @staticmethod
+    def score_orderings(score: np.ndarray) -> np.ndarray:
+        """Value of every ordering of our rows given a (ours x theirs) matchup score"""
+        n = score.shape[0]
+        lead_value = score.mean(axis=1)  # their lead is unknown, bots pick it at random
+        back_value = (score > 0).mean(axis=1)  # share of their team each mon handles
+        perms = LeadPlanner.permutations(n)
+        weights = LeadPlanner.POSITION_WEIGHTS[:n]
+        return lead_value[perms[:, 0]] * weights[0] + back_value[perms[:, 1:]] @ weights[1:]
+
+    @staticmethod
+    def plan(battle: AbstractBattle, matchups: Callable[[], Optional["MatchupMatrix"]]) -> Tuple[int, ...]:
+        n = len(battle.team)
+        if not battle.teampreview_opponent_team or n == 0:
+            return tuple(range(max(n, 6)))
+        key = LeadPlanner.team_hash(battle)
+        if key not in LeadPlanner._cache:
+            matrix = matchups()
+            if matrix is None or matrix.score.shape[1] == 0:
+                return tuple(range(n))
+            values = LeadPlanner.score_orderings(matrix.score)
+            LeadPlanner._cache[key] = tuple(int(i) for i in LeadPlanner.permutations(n)[int(np.argmax(values))])
+        return LeadPlanner._cache[key]
+
+
+class WinConditionPlanner:
+    """Commits to one win condition per battle and replans only on triggering events"""
+
+    HP_SWING = 0.4
+    PLAN_BONUS = 20
+    HAZARD_LAYERS = {"spikes": 3, "toxicspikes": 2, "stealthrock": 1}
+    SETUP_CAP = 2  # stop boosting once the sweeper is at +2
+
+    def __init__(self):
+        self.kind: Optional[str] = None
+        self.members: List[str] = []
+        self.reason = ""
+        self.dirty = True
+        self.replans = 0
+        self._hp: Dict[str, float] = {}
+        self._seen_species: set = set()
+
+    def on_event(self, event: "BattleEvent"):
+        if event.kind is BattleEventKind.FAINT:
+            self.dirty = True
+        elif event.kind is BattleEventKind.SWITCH:
+            if event.side == "opponent" and event.species not in self._seen_species:
+                self._seen_species.add(event.species)
+                self.dirty = True
+            self._hp[event.ident] = event.value
+        elif event.kind is BattleEventKind.DAMAGE:
+            if abs(self._hp.get(event.ident, 1.0) - event.value) >= self.HP_SWING:
+                self.dirty = True
+            self._hp[event.ident] = event.value
+
+    def _replan(self, battle: AbstractBattle):
+        conditions = WinConditionAnalyzer.analyze_win_conditions(battle)
+        self.kind, self.members, self.reason = None, [], ""
+        if conditions:
+            self.kind, _, self.reason = conditions[0]
+            self.members = WinConditionAnalyzer.win_condition_members(battle)[self.kind]
+            if self.kind == "setup_sweep":
+                # The top setup entry is the active sweeper when there is one
+                active = [name for name in self.members if battle.team[name].active]
+                self.members = active[:1] or self.members[:1]
+        self.dirty = False
+        self.replans += 1
+
+    def step(self, battle: AbstractBattle) -> Dict[str, float]:
+        """Cheap per-turn check: bonuses for the moves or switches that advance the plan"""
+        if self.dirty or self.kind is None:
+            self._replan(battle)
+        bonuses: Dict[str, float] = {}
+        active = battle.active_pokemon
+        active_name = next((name for name, mon in battle.team.items() if mon is active), None)
+
+        if self.kind == "setup_sweep" and active_name in self.members:
+            if max(active.boosts.values()) < self.SETUP_CAP:
+                for move in active.moves.values():
+                    if MoveIndex.has(move.id, MoveTag.SETUP):
+                        bonuses[move.id] = self.PLAN_BONUS
+        elif self.kind == "hazard_stack" and active_name in self.members:
+            layers = {c.name.lower().replace("_", ""): n for c, n in battle.opponent_side_conditions.items()}
+            for move in active.moves.values():
+                if move.id in self.HAZARD_LAYERS and layers.get(move.id, 0) < self.HAZARD_LAYERS[move.id]:
+                    bonuses[move.id] = self.PLAN_BONUS
+        elif self.kind == "revenge_kill":
+            for mon in battle.available_switches:
+                name = next((n for n, m in battle.team.items() if m is mon), None)
+                if name in self.members:
+                    bonuses["switch:" + name] = self.PLAN_BONUS
+        return bonuses
+
+
+"""
+Order validation - every order is checked against the current request
+before it is sent, so a choice the server would reject is repaired here.
+"""
+
+class LegalOrders:
+    """What the server would reject, checked against the current request"""
+
+    @staticmethod
+    def problem(battle: AbstractBattle, action: BattleOrder) -> Optional[str]:
+        """None when the order is legal, otherwise a short reason"""
+        if not isinstance(action, SingleBattleOrder):
+            return None
+        order = action.order
+        if isinstance(order, Move):
+            if battle.force_switch:
+                return "forced switch"
+            if not any(m.id == order.id for m in battle.available_moves):
+                return f"{order.id} unavailable"
+            if action.terastallize and not battle.can_tera:
+                return "tera"
+        elif isinstance(order, Pokemon):
+            if order is battle.active_pokemon and not battle.force_switch:
+                return f"{order.species} already active"
+            if battle.trapped:
+                return "trapped"
+            if not any(mon is order for mon in battle.available_switches):
+                return f"{order.species} cannot switch in"
+        return None
+
+
+"""
+Decision cache - our team and the bot teams are fixed, so positions repeat
+across battles, especially in the opening turns.
+"""
+
+class DecisionCache:
+    """Bounded LRU of chosen actions keyed on a canonical fingerprint of the position"""
+
+    MAX_ENTRIES = 4096
+    LOW_PP = 1  # ExpertRules only asks whether a move is down to its last PP
+    LAST_DISTINCT_TURN = 4  # _determine_strategy only tells turns 1-3 apart
+
+    def __init__(self, max_entries: int = MAX_ENTRIES):
+        self.max_entries = max_entries
+        self.entries: "OrderedDict[Tuple, Tuple[str, str]]" = OrderedDict()
+        self.version: Optional[str] = None
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    def validate(self, version: str):
+        """Drops every entry when the agent's tuning parameters change"""
+        if version != self.version:
+            if self.version is not None:
+                self.invalidations += 1
+            self.entries.clear()
+            self.version = version
+
+    @staticmethod
+    def _mon_key(mon: Optional[Pokemon]) -> Tuple:
+        # Exact HP: the rules compare it with KO damage and with thresholds at arbitrary fractions
+        if mon is None:
+            return ()
+        boosts = tuple(sorted((k, v) for k, v in mon.boosts.items() if v))
+        return (mon.species, mon.level, mon.current_hp, mon.max_hp, tuple(t.name for t in mon.types),
+                boosts, mon.status.name if mon.status else None)
+
+    @staticmethod
+    def fingerprint(battle: AbstractBattle, tracker: "BattleDeltaTracker",
+                    opponent_model: "OpponentPolicyClassifier", plan: "WinConditionPlanner") -> Tuple:
+        opp = battle.opponent_active_pokemon
+        policy = opponent_model.recognized
+        return (
+            DecisionCache._mon_key(battle.active_pokemon),
+            DecisionCache._mon_key(opp),
+            tuple(sorted((c.name, n) for c, n in battle.side_conditions.items())),
+            tuple(sorted((c.name, n) for c, n in battle.opponent_side_conditions.items())),
+            tuple(sorted(opp.moves)) if opp else (),
+            tuple((m.id, min(m.current_pp, DecisionCache.LOW_PP + 1)) for m in battle.available_moves),
+            tuple(sorted(m.species for m in battle.available_switches)),
+            tuple(sorted(DecisionCache._mon_key(m) for m in battle.team.values())),
+            tuple(sorted(DecisionCache._mon_key(m) for m in battle.opponent_team.values())),
+            tracker.alive["self"], tracker.alive["opponent"],
+            min(battle.turn, DecisionCache.LAST_DISTINCT_TURN),
+            battle.can_tera, battle.opponent_used_tera,
+            policy.name if policy else None,
+            opponent_model.pending(policy) if policy else None,
+            plan.kind, tuple(plan.members), plan.dirty,
+        )
+
+    @staticmethod
+    def describe(action: BattleOrder) -> Optional[Tuple[str, str]]:
+        """Battle-independent ("move" | "tera", id) / ("switch", species) form of an order"""
+        if not isinstance(action, SingleBattleOrder):
+            return None
+        order = action.order
+        if isinstance(order, Move):
+            return ("tera" if action.terastallize else "move", order.id)
+        if isinstance(order, Pokemon):
+            return ("switch", order.species)
+        return None
+
+    @staticmethod
+    def resolve(description: Tuple[str, str], battle: AbstractBattle) -> Optional[SingleBattleOrder]:
+        """Turns a description back into an order, if it is still one of the legal options"""
+        kind, name = description
+        if kind == "tera" and not battle.can_tera:
+            return None
+        if kind in ("move", "tera"):
+            options = [m for m in battle.available_moves if m.id == name]
+        else:
+            options = [m for m in battle.available_switches if m.species == name]
+        return Player.create_order(options[0], terastallize=kind == "tera") if options else None
+
+    def get(self, key: Tuple, battle: AbstractBattle) -> Optional[SingleBattleOrder]:
+        entry = self.entries.get(key)
+        if entry is not None:
+            order = self.resolve(entry, battle)
+            if order is not None:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return order
+        self.misses += 1
+        return None
+
+    def put(self, key: Tuple, action: BattleOrder):
+        description = self.describe(action)
+        if description is None:
+            return
+        self.entries[key] = description
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+
+    def stats(self) -> Dict:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self.entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "invalidations": self.invalidations,
+        }
+
+
+class OpeningBook:
+    """Precomputed replies for the first turns against each known bot team (built by opening_book.py)"""
+
+    BOOK_FILE = os.path.join(DATA_DIR, "opening_book.json")
+    BOOK_TURNS = 3
+    BOOK_LEVEL = 100  # opening_book.py builds every position at level 100
+    _loaded: Dict[str, Dict] = {}
+
+    def __init__(self, entries: Dict[str, Dict[str, List[str]]], turns: int = BOOK_TURNS):
+        self.entries = entries
+        self.turns = turns
+        self.hits = 0
+
+    @staticmethod
+    def team_key(species: List[str]) -> str:
+        # Base species, since team preview hides some formes ("Zacian-*")
+        return ",".join(sorted(species))
+
+    @staticmethod
+    def position_key(turn: int, my_species: str, opp_species: str, opp_side: Dict) -> str:
+        hazards = "".join(f"{to_id_str(c.name)}{n}" for c, n in sorted(opp_side.items(), key=lambda x: x[0].name))
+        return f"{turn}|{my_species}|{opp_species}|{hazards}"
+
+    @staticmethod
+    def is_pristine(mon: Optional[Pokemon]) -> bool:
+        """Book lines assume untouched Pokemon: full HP, no boosts, no status"""
+        return (
+            mon is not None
+            and mon.current_hp == mon.max_hp
+            and not any(mon.boosts.values())
+            and mon.status is None
+        )
+
+    @classmethod
+    def is_book_position(cls, battle: AbstractBattle) -> bool:
+        """The book was built with both teams untouched, no hazards on our side and Tera unused"""
+        opponent = battle.opponent_active_pokemon
+        return (
+            battle.can_tera
+            and not battle.opponent_used_tera
+            and not battle.side_conditions
+            and opponent is not None
+            and opponent.level == cls.BOOK_LEVEL
+            and all(cls.is_pristine(mon) for mon in battle.team.values())
+            and all(cls.is_pristine(mon) for mon in battle.opponent_team.values())
+        )
+
+    @classmethod
+    def load(cls, version: str, path: str = BOOK_FILE) -> Optional["OpeningBook"]:
+        """Reads the book once per process; a book built for other parameters is ignored"""
+        if path not in cls._loaded:
+            book: Dict = {}
+            if os.path.exists(path):
+                with open(path, "r", encoding="utf-8") as file:
+                    book = json.load(file)
+            cls._loaded[path] = book
+        book = cls._loaded[path]
+        if book.get("version") != version:
+            return None
+        return cls(book["entries"], book.get("turns", cls.BOOK_TURNS))
+
+    def lookup(self, battle: AbstractBattle) -> Optional[SingleBattleOrder]:
+        if battle.turn > self.turns or battle.force_switch:
+            return None
+        if not self.is_book_position(battle):
+            return None
+        team = self.entries.get(self.team_key([to_id_str(m.base_species) for m in battle.teampreview_opponent_team]))
+        if team is None:
+            return None
+        key = self.position_key(battle.turn, battle.active_pokemon.species,
+                                to_id_str(battle.opponent_active_pokemon.base_species), battle.opponent_side_conditions)
+        entry = team.get(key)
+        if entry is None:
+            return None
+        order = DecisionCache.resolve((entry[0], entry[1]), battle)
+        if order is not None:
+            self.hits += 1
+        return order
+
+
+"""
+Precomputed score and KO tables - our six sets never change, so the damage
+of every move against every gen 9 species can be worked out ahead of time.
+"""
+
+class ScoreTable:
+    """(our set, our move, opposing species, spread bucket) -> damage range and OHKO odds"""
+
+    TABLE_FILE = os.path.join(DATA_DIR, "score_table.npz")
+    # (HP, Def, SpD) EVs assumed for each bucket of opposing spreads
+    SPREAD_BUCKETS = {
+        "offensive": (0, 0, 0),
+        "balanced": (84, 84, 84),
+        "physdef": (252, 252, 4),
+        "specdef": (252, 4, 252),
+    }
+    DEFAULT_BUCKET = "balanced"
+    ITEM_MULTIPLIERS = {"lifeorb": (1.3, 1.3), "choiceband": (1.5, 1.0), "choicespecs": (1.0, 1.5)}
+    PLATE_TYPES = {"dreadplate": "DARK", "pixieplate": "FAIRY", "earthplate": "GROUND", "flameplate": "FIRE",
+                   "splashplate": "WATER", "zapplate": "ELECTRIC", "meadowplate": "GRASS", "icicleplate": "ICE",
+                   "fistplate": "FIGHTING", "toxicplate": "POISON", "skyplate": "FLYING", "mindplate": "PSYCHIC",
+                   "insectplate": "BUG", "stoneplate": "ROCK", "spookyplate": "GHOST", "dracoplate": "DRAGON",
+                   "ironplate": "STEEL"}
+    LEVEL = 100
+    _shared: Dict[str, "ScoreTable"] = {}  # team string -> its table, so no call re-hashes the team
+
+    def __init__(self, version_hash: str, moves: List[str], species: List[str], table: np.ndarray):
+        self.version_hash = version_hash
+        self.move_index = {key: i for i, key in enumerate(moves)}
+        self.species_index = {key: i for i, key in enumerate(species)}
+        self.bucket_index = {key: i for i, key in enumerate(self.SPREAD_BUCKETS)}
+        self.table = table
+
+    @staticmethod
+    def team_hash(team_string: str) -> str:
+        return hashlib.sha1(team_string.strip().encode("utf-8")).hexdigest()
+
+    @staticmethod
+    def _stat(base: np.ndarray, ev: int, level: int, is_hp: bool = False) -> np.ndarray:
+        raw = np.floor((2 * base + 31 + ev // 4) * level / 100)
+        return raw + level + 10 if is_hp else raw + 5
+
+    @classmethod
+    def build(cls, team_string: str) -> "ScoreTable":
+        """Vectorized over the whole dex: one pass per (our move, spread bucket)"""
+        data = GenData.from_gen(9)
+        dex = {k: v for k, v in data.pokedex.items() if v.get("num", 0) > 0}
+        species = sorted(dex)
+        type_names = [t.name for t in PokemonType if t.name in data.type_chart]
+        type_row = {name: i for i, name in enumerate(type_names)}
+        # chart[attacking, defending], with a neutral extra column for mono-types
+        chart = np.ones((len(type_names), len(type_names) + 1))
+        for defending, row in data.type_chart.items():
+            for attacking, multiplier in row.items():
+                if attacking in type_row:
+                    chart[type_row[attacking], type_row[defending]] = multiplier
+        types = np.array([[type_row[t.upper()] for t in dex[k]["types"]] + [len(type_names)] * (2 - len(dex[k]["types"]))
+                          for k in species])
+        base = {stat: np.array([dex[k]["baseStats"][stat] for k in species], dtype=float)
+                for stat in ("hp", "def", "spd")}
+        buckets = list(cls.SPREAD_BUCKETS.values())
+        bucket_hp = np.column_stack([cls._stat(base["hp"], hp_ev, cls.LEVEL, is_hp=True) for hp_ev, _, _ in buckets])
+        bucket_def = np.column_stack([cls._stat(base["def"], def_ev, cls.LEVEL) for _, def_ev, _ in buckets])
+        bucket_spd = np.column_stack([cls._stat(base["spd"], spd_ev, cls.LEVEL) for _, _, spd_ev in buckets])
+
+        moves, rows = [], []
+        for mon in Teambuilder.parse_showdown_team(team_string):
+            mon_id = to_id_str(mon.species or mon.nickname)
+            mon_types = [t.upper() for t in data.pokedex[mon_id]["types"]]
+            stats = dict(zip(["hp", "atk", "def", "spa", "spd", "spe"], compute_raw_stats(
+                mon_id, mon.evs, mon.ivs, mon.level or cls.LEVEL, (mon.nature or "serious").lower(), data)))
+            item = to_id_str(mon.item or "")
+            for move_name in mon.moves:
+                move = Move(Move.retrieve_id(move_name), gen=9)
+                if move.base_power <= 0:
+                    continue
+                move_type = mon_types[0] if move.id == "judgment" else move.type.name
+                physical = move.category == MoveCategory.PHYSICAL
+                modifier = 1.5 if move_type in mon_types else 1.0
+                modifier *= cls.ITEM_MULTIPLIERS.get(item, (1.0, 1.0))[0 if physical else 1]
+                if cls.PLATE_TYPES.get(item) == move_type:
+                    modifier *= 1.2
+                effectiveness = KERNELS.type_products(chart, type_row[move_type], types[:, 0], types[:, 1])
+                defense = bucket_def if physical else bucket_spd
+                attack = stats["atk"] if physical else stats["spa"]
+                # Same formula as DamageCalculator.calculate_damage, over every (species, bucket) at once
+                low, high = KERNELS.damage_fractions(
+                    cls.LEVEL, move.base_power, attack, defense, effectiveness[:, None], modifier, bucket_hp
+                )
+                ko = KERNELS.ko_odds(low, high, 1.0)
+                moves.append(f"{mon_id}:{move.id}")
+                rows.append(np.stack([low, high, ko], axis=-1))
+        table = np.stack(rows).astype(np.float16)  # (move, species, bucket, [min, max, ko])
+        return cls(cls.team_hash(team_string), moves, species, table)
+
+    def save(self, path: str = TABLE_FILE):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        np.savez_compressed(
+            path, team_hash=np.array(self.version_hash), moves=np.array(list(self.move_index)),
+            species=np.array(list(self.species_index)), table=self.table,
+        )
+
+    @classmethod
+    def load(cls, team_string: str, path: str = TABLE_FILE) -> "ScoreTable":
+        """Reads the shipped table, rebuilding (and re-saving) it when the team string changed"""
+        expected = cls.team_hash(team_string)
+        if os.path.exists(path):
+            with np.load(path) as data:
+                if str(data["team_hash"]) == expected:
+                    return cls(expected, list(data["moves"]), list(data["species"]), data["table"])
+        table = cls.build(team_string)
+        try:
+            table.save(path)
+        except OSError:
+            pass  # read-only install: keep the freshly built table in memory only
+        return table
+
+    @classmethod
+    def shared(cls, team_string: str = team) -> "ScoreTable":
+        table = cls._shared.get(team_string)
+        if table is None:
+            table = cls._shared[team_string] = cls.load(team_string)
+        return table
+
+    def lookup(self, my_species: str, move_id: str, opp_species: str,
+               bucket: str = DEFAULT_BUCKET) -> Optional[Tuple[float, float, float]]:
+        """(min, max) damage as a fraction of the target's max HP and OHKO odds, None if not tabled"""
+        i = self.move_index.get(f"{my_species}:{move_id}")
+        j = self.species_index.get(opp_species)
+        if i is None or j is None:
+            return None
+        low, high, ko = self.table[i, j, self.bucket_index[bucket]]
+        return (float(low), float(high), float(ko))
+
+
+"""
+Persistent memo cache - damage and matchup results outlive the process, so
+a fresh expert_main.py run starts with everything earlier runs computed.
+"""
+
+class PersistentCache:
+    """SQLite-backed memo tables, warm-loaded into dicts and invalidated by a version hash"""
+
+    CACHE_FILE = os.path.join(DATA_DIR, "agent_cache.sqlite")
+    NAMESPACES = ("damage", "matchup")
+    FLUSH_EVERY = 512
+
+    def __init__(self, version: str, path: Optional[str] = None):
+        self.version = version
+        self.path = path
+        self.tables: Dict[str, Dict[str, Any]] = {namespace: {} for namespace in self.NAMESPACES}
+        self.pending: List[Tuple[str, str, str]] = []
+        self.hits = 0
+        self.misses = 0
+        self.warm_entries = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def version_hash(team_string: str) -> str:
+        """Team string + this agent's source + poke_env release; any change makes old entries stale"""
+        digest = hashlib.sha1(team_string.strip().encode("utf-8"))
+        try:
+            with open(__file__, "rb") as file:
+                digest.update(file.read())
+        except OSError:
+            pass
+        try:
+            digest.update(importlib.metadata.version("poke_env").encode("utf-8"))
+        except importlib.metadata.PackageNotFoundError:
+            pass
+        return digest.hexdigest()
+
+    @classmethod
+    def open(cls, team_string: str, path: str = CACHE_FILE) -> "PersistentCache":
+        """Drops stale rows and warm-loads current ones; an unusable file means a memory-only cache"""
+        cache = cls(cls.version_hash(team_string), path)
+        try:
+            with cache._connect() as connection:
+                connection.execute("DELETE FROM memo WHERE version != ?", (cache.version,))
+                for namespace, key, value in connection.execute(
+                    "SELECT namespace, key, value FROM memo WHERE version = ?", (cache.version,)
+                ):
+                    if namespace in cache.tables:
+                        cache.tables[namespace][key] = json.loads(value)
+                        cache.warm_entries += 1
+        except (OSError, sqlite3.Error):
+            cache.path = None
+        return cache
+
+    def _connect(self) -> sqlite3.Connection:
+        if self.path is None:
+            raise sqlite3.OperationalError("memory-only cache")
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        connection = sqlite3.connect(self.path, timeout=5.0)
+        connection.execute(
+            "CREATE TABLE IF NOT EXISTS memo (namespace TEXT, key TEXT, version TEXT, value TEXT,"
+            " PRIMARY KEY (namespace, key))"
+        )
+        return connection
+
+    def get(self, namespace: str, key: str) -> Optional[Any]:
+        value = self.tables[namespace].get(key)
+        if value is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return value
+
+    def put(self, namespace: str, key: str, value: Any):
+        # Round-trip through JSON so an in-process hit looks exactly like a warm-loaded one
+        encoded = json.dumps(value)
+        with self._lock:
+            self.tables[namespace][key] = json.loads(encoded)
+            self.pending.append((namespace, key, encoded))
+            should_flush = len(self.pending) >= self.FLUSH_EVERY
+        if should_flush:
+            self.flush()
+
+    def flush(self):
+        with self._lock:
+            pending, self.pending = self.pending, []
+        if not pending or self.path is None:
+            return
+        try:
+            with self._connect() as connection:
+                connection.executemany(
+                    "INSERT OR REPLACE INTO memo (namespace, key, version, value) VALUES (?, ?, ?, ?)",
+                    [(namespace, key, self.version, value) for namespace, key, value in pending],
+                )
+        except sqlite3.Error:
+            self.path = None  # keep serving from memory rather than failing a battle
+
+    def stats(self) -> Dict:
+        return {
+            "warm_entries": self.warm_entries,
+            "entries": sum(len(table) for table in self.tables.values()),
+            "hits": self.hits,
+            "misses": self.misses,
+        }
+
+
+"""
+Terastallization deltas - how each type profile shifts under each Tera type,
+tabled once from the type chart so Tera is a cheap delta on the matchup score.
+"""
+
+class TeraDeltas:
+    """Type-chart tables indexed by type id, where id len(types) means "no second type" / "no Tera\""""
+
+    TERA_THRESHOLD = 1.0  # minimum matchup-score gain before we spend our once-per-battle Tera
+    _types: Optional[Dict[PokemonType, int]] = None
+    _defense: Optional[np.ndarray] = None  # [d1, d2, attacking] -> multiplier
+    _stab: Optional[np.ndarray] = None  # [o1, o2, tera, attacking] -> STAB multiplier
+    MAX_PROFILES = 4096
+    _profiles: Dict[Tuple, Optional[Tuple]] = {}
+
+    @staticmethod
+    def build() -> Dict[str, Any]:
+        chart_data = GenData.from_gen(9).type_chart
+        names = [t.name for t in PokemonType if t.name in chart_data]
+        n = len(names)
+        chart = np.ones((n, n + 1))  # [attacking, defending], last column neutral
+        for d, defending in enumerate(names):
+            for a, attacking in enumerate(names):
+                chart[a, d] = chart_data[defending].get(attacking, 1.0)
+        defense = chart.T[:, None, :] * chart.T[None, :, :]
+        stab = np.ones((n + 1, n + 1, n + 1, n), dtype=np.float16)  # 1, 1.5 and 2 are exact in float16
+        for o1, o2 in itertools.product(range(n + 1), repeat=2):
+            original = {o1, o2} - {n}
+            for a in original:
+                stab[o1, o2, :, a] = 1.5
+            for tera in range(n):
+                stab[o1, o2, tera, tera] = 2.0 if tera in original else 1.5
+        return {"types": names, "defense": defense.astype(np.float16), "stab": stab}
+
+    @staticmethod
+    def tables() -> Tuple[Dict[PokemonType, int], np.ndarray, np.ndarray]:
+        if TeraDeltas._types is None:
+            tables = KnowledgeSnapshot.section("tera")
+            if tables is None:
+                tables = TeraDeltas.build()
+            TeraDeltas._types = {PokemonType[name]: i for i, name in enumerate(tables["types"])}
+            TeraDeltas._defense, TeraDeltas._stab = tables["defense"], tables["stab"]
+        assert TeraDeltas._defense is not None and TeraDeltas._stab is not None
+        return TeraDeltas._types, TeraDeltas._defense, TeraDeltas._stab
+
+    @staticmethod
+    def _profile(mon: Pokemon, tera: Optional[PokemonType], moves: List[Move]) -> Optional[Tuple]:
+        """(defensive type ids, STAB row, attacking type ids) with or without a Tera type"""
+        if mon.is_terastallized:
+            original_types, tera = tuple(mon.original_types), mon.type_1
+        else:
+            original_types = tuple(mon.types)
+        # Same types, Tera and moveset give the same profile, whichever battle the mon is in
+        key = (original_types, tera, tuple(m.id for m in moves))
+        if key not in TeraDeltas._profiles:
+            if len(TeraDeltas._profiles) >= TeraDeltas.MAX_PROFILES:
+                TeraDeltas._profiles.clear()
+            TeraDeltas._profiles[key] = TeraDeltas._build_profile(original_types, tera, moves)
+        return TeraDeltas._profiles[key]
+
+    @staticmethod
+    def _build_profile(original_types: Tuple, tera: Optional[PokemonType], moves: List[Move]) -> Optional[Tuple]:
+        types, _, stab = TeraDeltas.tables()
+        none = len(types)
+        o1, o2 = ([types.get(t, none) for t in original_types] + [none, none])[:2]
+        if tera is not None and tera not in types:
+            return None  # Stellar and unknown types fall outside the table
+        t = none if tera is None else types[tera]
+        defending = (o1, o2) if tera is None else (t, none)
+        attacking = [types[m.type] for m in moves if m.base_power > 0 and m.type in types]
+        if not attacking:
+            attacking = [i for i in (o1, o2) if i != none]
+        return defending, stab[o1, o2, t], attacking
+
+    @staticmethod
+    def _score(mine: Tuple, theirs: Tuple) -> float:
+        """Offense minus threat as best STAB-weighted effectiveness, a neutral STAB hit being 1.0"""
+        _, defense, _ = TeraDeltas.tables()
+        my_def, my_stab, my_attacks = mine
+        opp_def, opp_stab, opp_attacks = theirs
+        offense = max((float(defense[opp_def[0], opp_def[1], a]) * float(my_stab[a]) for a in my_attacks), default=1.5)
+        threat = max((float(defense[my_def[0], my_def[1], a]) * float(opp_stab[a]) for a in opp_attacks), default=1.5)
+        return (offense - threat) / 1.5
+
+    @staticmethod
+    def our_tera_type(battle: AbstractBattle) -> Optional[PokemonType]:
+        """poke_env skips the request's teraType, so read it back from the active request"""
+        if battle.active_pokemon is not None and battle.active_pokemon.tera_type is not None:
+            return battle.active_pokemon.tera_type
+        for active in battle.last_request.get("active", []):
+            if active.get("canTerastallize"):
+                return PokemonType.from_name(active["canTerastallize"])
+        return None
+
+    @staticmethod
+    def _scenarios(mine: Optional[Pokemon], opponent: Optional[Pokemon], my_tera: Optional[PokemonType],
+                   opponent_can_tera: bool) -> Optional[Tuple[Tuple, Tuple, List[Tuple]]]:
+        """(our profile with Tera, without, the opponent's possible profiles), None if Tera is moot"""
+        if mine is None or opponent is None or mine.is_terastallized or my_tera is None:
+            return None
+        my_moves = list(mine.moves.values())
+        opp_moves = KnownTeams.moves_for(opponent)
+        with_tera = TeraDeltas._profile(mine, my_tera, my_moves)
+        without = TeraDeltas._profile(mine, None, my_moves)
+        candidates = [TeraDeltas._profile(opponent, None, opp_moves)]
+        opp_tera = KnownTeams.tera_type(opponent)
+        if opponent_can_tera and opp_tera is not None and not opponent.is_terastallized:
+            candidates.append(TeraDeltas._profile(opponent, opp_tera, opp_moves))
+        scenarios = [theirs for theirs in candidates if theirs is not None]
+        if with_tera is None or without is None or not scenarios:
+            return None
+        return with_tera, without, scenarios
+
+    @staticmethod
+    def tera_gain(mine: Optional[Pokemon], opponent: Optional[Pokemon], my_tera: Optional[PokemonType],
+                  opponent_can_tera: bool = True) -> float:
+        """Matchup-score change from terastallizing now, worst case over the opponent's own Tera"""
+        found = TeraDeltas._scenarios(mine, opponent, my_tera, opponent_can_tera)
+        if found is None:
+            return 0.0
+        with_tera, without, scenarios = found
+        return min(TeraDeltas._score(with_tera, theirs) - TeraDeltas._score(without, theirs) for theirs in scenarios)
+
+
+
+"""
+Knowledge snapshot - the derived knowledge base (move tags, set library,
+Tera type tables) precompiled into one marshal file and read on first use.
+"""
+
+class KnowledgeSnapshot:
+    """Sections keyed by name; a missing or stale snapshot means each table is rebuilt from source"""
+
+    SNAPSHOT_FILE = os.path.join(DATA_DIR, "knowledge.marshal")
+    SCHEMA = 2  # bump whenever a section's builder changes shape or meaning
+    _sections: Optional[Dict[str, Any]] = None
+    load_seconds = 0.0
+    loaded_from = "source"
+
+    @staticmethod
+    def fingerprint() -> str:
+        """Schema, poke_env release and the bot team files the set library is parsed from"""
+        digest = hashlib.sha1(str(KnowledgeSnapshot.SCHEMA).encode("utf-8"))
+        try:
+            digest.update(importlib.metadata.version("poke_env").encode("utf-8"))
+        except importlib.metadata.PackageNotFoundError:
+            pass
+        for team_file in KnownTeams.team_files():
+            with open(team_file, "rb") as file:
+                digest.update(file.read())
+        return digest.hexdigest()
+
+    @staticmethod
+    def _encode(value: Any) -> Any:
+        # marshal has no ndarray, so arrays travel as (dtype, shape, raw bytes)
+        if isinstance(value, np.ndarray):
+            return ("ndarray", value.dtype.str, value.shape, value.tobytes())
+        if isinstance(value, dict):
+            return {k: KnowledgeSnapshot._encode(v) for k, v in value.items()}
+        return value
+
+    @staticmethod
+    def _decode(value: Any) -> Any:
+        if isinstance(value, tuple) and len(value) == 4 and value[0] == "ndarray":
+            return np.frombuffer(value[3], dtype=value[1]).reshape(value[2])
+        if isinstance(value, dict):
+            return {k: KnowledgeSnapshot._decode(v) for k, v in value.items()}
+        return value
+
+    @classmethod
+    def _load(cls) -> Dict[str, Any]:
+        start = time.perf_counter()
+        sections: Dict[str, Any] = {}
+        try:
+            with open(cls.SNAPSHOT_FILE, "rb") as file:
+                data = marshal.loads(file.read())
+        except (OSError, EOFError, ValueError, TypeError):
+            data = None
+        if isinstance(data, dict) and data.get("fingerprint") == cls.fingerprint():
+            sections = data["sections"]
+            cls.loaded_from = "snapshot"
+        cls._sections = sections
+        cls.load_seconds = time.perf_counter() - start
+        return sections
+
+    @classmethod
+    def section(cls, name: str) -> Optional[Any]:
+        sections = cls._sections if cls._sections is not None else cls._load()
+        value = sections.get(name)
+        return None if value is None else cls._decode(value)
+
+    @classmethod
+    def build(cls) -> Dict[str, Any]:
+        return {
+            "move_tags": MoveIndex.build(),
+            "sets": KnownTeams.build(),
+            "tera": TeraDeltas.build(),
+        }
+
+    @classmethod
+    def save(cls):
+        os.makedirs(os.path.dirname(cls.SNAPSHOT_FILE), exist_ok=True)
+        data = {"fingerprint": cls.fingerprint(), "sections": cls._encode(cls.build())}
+        with open(cls.SNAPSHOT_FILE, "wb") as file:
+            marshal.dump(data, file)
+
+    @classmethod
+    def stats(cls) -> Dict:
+        return {"loaded_from": cls.loaded_from, "load_seconds": cls.load_seconds}
+
+
+"""
+Numeric kernels - the damage formula, type products and KO odds behind one
+interface: a NumPy reference, and a Numba build when numba is installed.
+"""
+
+class NumpyKernels:
+    """Reference backend; every other backend must return bit-identical arrays"""
+
+    name = "numpy"
+
+    def damage_fractions(self, level: float, power, attack, defense, effectiveness, modifier, hp) -> Tuple[np.ndarray, np.ndarray]:
+        """(min, max) roll of the damage formula as fractions of hp, all arguments broadcast"""
+        damage = ((2 * level / 5 + 2) * np.asarray(power, dtype=float) * attack / defense / 50 + 2) * effectiveness * modifier
+        return np.floor(damage * 0.85) / hp, np.floor(damage) / hp
+
+    def type_products(self, chart: np.ndarray, attacking, defending_1, defending_2) -> np.ndarray:
+        """chart[attacking, defending] multiplied over both defending types"""
+        return chart[attacking, defending_1] * chart[attacking, defending_2]
+
+    def ko_odds(self, low, high, hp) -> np.ndarray:
+        """Share of the damage roll that KOs a target at the given HP fraction, 0 for fainted targets"""
+        return np.where(hp > 0, np.clip((high - hp) / np.maximum(high - low, 1e-9), 0.0, 1.0), 0.0)
+
+
+class NumbaKernels(NumpyKernels):
+    """Same maths as explicit loops compiled with numba.njit; compiled on first use"""
+
+    name = "numba"
+    # Per-turn matrices are a few dozen cells: the call overhead outweighs the loop there
+    # and the first call would pay numba's import inside a turn, so those stay on NumPy
+    MIN_ELEMENTS = 4096
+    _compiled: Optional[Dict[str, Callable]] = None
+
+    @classmethod
+    def _kernels(cls) -> Dict[str, Callable]:
+        if cls._compiled is None:
+            import numba
+
+            @numba.njit
+            def damage_fractions(level, power, attack, defense, effectiveness, modifier, hp, low, high):
+                for i in range(power.shape[0]):
+                    damage = ((2 * level / 5 + 2) * power[i] * attack[i] / defense[i] / 50 + 2) * effectiveness[i] * modifier[i]
+                    low[i] = np.floor(damage * 0.85) / hp[i]
+                    high[i] = np.floor(damage) / hp[i]
+
+            @numba.njit
+            def type_products(chart, attacking, defending_1, defending_2, out):
+                for i in range(attacking.shape[0]):
+                    out[i] = chart[attacking[i], defending_1[i]] * chart[attacking[i], defending_2[i]]
+
+            @numba.njit
+            def ko_odds(low, high, hp, out):
+                for i in range(low.shape[0]):
+                    if hp[i] > 0:
+                        odds = (high[i] - hp[i]) / max(high[i] - low[i], 1e-9)
+                        out[i] = min(max(odds, 0.0), 1.0)
+                    else:
+                        out[i] = 0.0
+
+            cls._compiled = {"damage_fractions": damage_fractions, "type_products": type_products, "ko_odds": ko_odds}
+        return cls._compiled
+
+    @staticmethod
+    def _flat(*arrays, dtype=float) -> Tuple[Tuple[int, ...], List[np.ndarray]]:
+        broadcast = np.broadcast_arrays(*[np.asarray(a, dtype=dtype) for a in arrays])
+        return broadcast[0].shape, [np.ascontiguousarray(a).ravel() for a in broadcast]
+
+    def damage_fractions(self, level: float, power, attack, defense, effectiveness, modifier, hp) -> Tuple[np.ndarray, np.ndarray]:
+        shape, flat = self._flat(power, attack, defense, effectiveness, modifier, hp)
+        if flat[0].size < self.MIN_ELEMENTS:
+            return super().damage_fractions(level, power, attack, defense, effectiveness, modifier, hp)
+        low, high = np.empty(flat[0].size), np.empty(flat[0].size)
+        self._kernels()["damage_fractions"](float(level), *flat, low, high)
+        return low.reshape(shape), high.reshape(shape)
+
+    def type_products(self, chart: np.ndarray, attacking, defending_1, defending_2) -> np.ndarray:
+        shape, flat = self._flat(attacking, defending_1, defending_2, dtype=np.int64)
+        if flat[0].size < self.MIN_ELEMENTS:
+            return super().type_products(chart, attacking, defending_1, defending_2)
+        out = np.empty(flat[0].size, dtype=chart.dtype)
+        self._kernels()["type_products"](np.ascontiguousarray(chart), *flat, out)
+        return out.reshape(shape)
+
+    def ko_odds(self, low, high, hp) -> np.ndarray:
+        shape, flat = self._flat(low, high, hp)
+        if flat[0].size < self.MIN_ELEMENTS:
+            return super().ko_odds(low, high, hp)
+        out = np.empty(flat[0].size)
+        self._kernels()["ko_odds"](*flat, out)
+        return out.reshape(shape)
+
+
+KERNEL_BACKENDS = {"numpy": NumpyKernels, "numba": NumbaKernels}
+
+
+def select_kernels(name: Optional[str] = None) -> NumpyKernels:
+    """Numba when it can be imported, else the NumPy reference; name forces a backend"""
+    if name is None:
+        name = "numba" if importlib.util.find_spec("numba") is not None else "numpy"
+    return KERNEL_BACKENDS[name]()
+
+
+KERNELS = select_kernels()
+
+
+"""
+Battle contexts - one per battle_tag, holding everything a single battle owns
+so concurrent battles never read each other's trackers, models or logs.
+"""
+
+class BattleContext:
+    """A battle's delta tracker, the models listening to it, and its decision log"""
+
+    MAX_HISTORY = 1000
+
+    def __init__(self, battle_tag: str, username: str, rule_stats: Optional["RuleStats"] = None):
+        self.battle_tag = battle_tag
+        self.tracker = BattleDeltaTracker(username)
+        self.opponent_model: Optional[OpponentPolicyClassifier] = None
+        self.matchups: Optional[MatchupMatrix] = None
+        self.win_plan: Optional[WinConditionPlanner] = None
+        self.rules = RuleNetwork(rule_stats)
+        self.rule: Optional[str] = None  # what decided the latest action, for the decision log
+        self.decisions = 0
+        self.history: List[Dict] = []
+
+    def log(self, record: Dict):
+        self.history.append(record)
+        if len(self.history) > 2 * self.MAX_HISTORY:
+            self.history = self.history[-self.MAX_HISTORY:]
+
+
+"""
+Battle retention - finished battles become compact records and only the last
+N Battle objects stay in the player's battles dict, so long runs stay flat.
+"""
+
+class BattleRecord(NamedTuple):
+    battle_tag: str
+    opponent: Optional[str]
+    won: Optional[bool]
+    turns: int
+    decisions: int
+    fainted: int
+    opponent_fainted: int
+
+
+class BattleRetention:
+    """Summarizes every finished battle and evicts all but the newest keep_last from the battles dict"""
+
+    def __init__(self, keep_last: Optional[int] = None):
+        if keep_last is not None and keep_last < 0:
+            raise ValueError("keep_last must be None or >= 0")
+        self.keep_last = keep_last
+        self.records: List[BattleRecord] = []
+        self.finished: "OrderedDict[str, None]" = OrderedDict()  # retained finished tags, oldest first
+        self.evicted_tags: set = set()
+        self.evicted_finished = 0
+        self.evicted_won = 0
+        self.evicted_lost = 0
+
+    @staticmethod
+    def summarize(battle: AbstractBattle, decisions: int) -> BattleRecord:
+        return BattleRecord(
+            battle.battle_tag,
+            battle.opponent_username,
+            battle.won,
+            battle.turn,
+            decisions,
+            sum(mon.fainted for mon in battle.team.values()),
+            sum(mon.fainted for mon in battle.opponent_team.values()),
+        )
+
+    def retire(self, battles: Dict[str, AbstractBattle], battle: AbstractBattle, decisions: int):
+        self.records.append(self.summarize(battle, decisions))
+        if self.keep_last is None:
+            return
+        self.finished[battle.battle_tag] = None
+        while len(self.finished) > self.keep_last:
+            tag, _ = self.finished.popitem(last=False)
+            evicted = battles.pop(tag, None)
+            if evicted is None:
+                continue
+            self.evicted_tags.add(tag)
+            self.evicted_finished += 1
+            self.evicted_won += bool(evicted.won)
+            self.evicted_lost += bool(evicted.lost)
+
+    def reset(self):
+        """Mirrors Player.reset_battles: result counts restart, records and evicted tags are kept"""
+        self.finished.clear()
+        self.evicted_finished = self.evicted_won = self.evicted_lost = 0
+
+    def stats(self) -> Dict:
+        return {
+            "keep_last": self.keep_last,
+            "records": len(self.records),
+            "evicted": len(self.evicted_tags),
+            "won": sum(bool(record.won) for record in self.records),
+        }
+
+
+"""
+Rule network - the move-scoring rules of ExpertRules, EnhancedExpertRules and
+AdvancedBattleStrategy as a Rete-style network: facts feed memoized conditions,
+conditions feed rules, and a turn only re-evaluates what its changed facts reach.
+"""
+
+class RuleNode:
+    """A memoized condition or rule; inputs name facts or earlier nodes"""
+
+    __slots__ = ("node_id", "name", "rule", "inputs", "compute", "value", "dependents", "evaluations")
+
+    def __init__(self, node_id: int, name: str, inputs: Tuple[str, ...], compute: Callable):
+        self.node_id = node_id
+        self.name = name
+        self.rule = name.split(":")[0]  # per-move productions share their rule's counters
+        self.inputs = inputs
+        self.compute = compute
+        self.value: Any = None
+        self.dependents: List["RuleNode"] = []
+        self.evaluations = 0
+
+
+class RuleNetwork:
+    """One battle's move-scoring rules, kept current by update(battle) each decision.
+
+    A node recomputes only when one of its inputs changed, and only passes the change on when
+    its own value moved, so a turn costs what its changed facts reach rather than every rule.
+    Per-move productions are built the first time a move is scored. Scores and reasons match
+    EnhancedExpertRules.evaluate_move_priority_advanced, which stays as the from-scratch reference.
+    """
+
+
+    def __init__(self, rule_stats: Optional["RuleStats"] = None):
+        self.rule_stats = rule_stats
+        self.facts: Dict[str, Any] = {}
+        self.nodes: Dict[str, RuleNode] = {}
+        self.order: List[RuleNode] = []
+        self.fact_dependents: Dict[str, List[RuleNode]] = {}
+        self.moves: Dict[str, None] = {}  # move ids with productions, in the order they were built
+        self.updates = 0
+        self.evaluations = 0
+
+    # Facts
+    @staticmethod
+    def _stats(pokemon: Optional[Pokemon]) -> Tuple:
+        if pokemon is None or not pokemon.stats:
+            return ()
+        return tuple((k, v) for k, v in pokemon.stats.items() if v is not None)
+
+    def extract(self, battle: AbstractBattle) -> Dict[str, Any]:
+        """Every fact the rules read, as plain comparable values"""
+        my, opp = battle.active_pokemon, battle.opponent_active_pokemon
+        facts = {
+            "weights": tuple(RuleWeights.as_dict().items()),
+            "my_active": my is not None,
+            "both_active": my is not None and opp is not None,
+            "turn": battle.turn,
+            "my_alive": sum(1 for p in battle.team.values() if not p.fainted),
+            "opp_alive": sum(1 for p in battle.opponent_team.values() if not p.fainted),
+            "my_side": frozenset(getattr(battle, "side_conditions", {})),
+            "my_species": my.species if my else None,
+            "my_hp": my.current_hp_fraction if my else None,
+            "my_moves": tuple(m.id for m in my.moves.values()) if my else (),
+            "my_stats": self._stats(my),
+            "opp_species": opp.species if opp else None,
+            "opp_hp": opp.current_hp_fraction if opp else None,
+            "opp_types": tuple(t.name if hasattr(t, "name") else str(t) for t in opp.types) if opp else (),
+            "opp_stats": self._stats(opp),
+        }
+        known: Dict[str, Move] = {}
+        if my is not None:
+            for move in my.moves.values():
+                known.setdefault(move.id, move)
+        for move_id in self.moves:
+            move = known.get(move_id)
+            facts[f"move:{move_id}"] = (
+                (move.type.name if move.type else None, move.base_power, getattr(move, "current_pp", None))
+                if move is not None else None
+            )
+        return facts
+
+    # Network maintenance
+    def _value(self, source: str) -> Any:
+        node = self.nodes.get(source)
+        return node.value if node is not None else self.facts.get(source)
+
+    def _evaluate(self, node: RuleNode) -> Any:
+        node.evaluations += 1
+        self.evaluations += 1
+        if self.rule_stats is None:
+            return node.compute(*[self._value(source) for source in node.inputs])
+        start = time.perf_counter()
+        value = node.compute(*[self._value(source) for source in node.inputs])
+        self.rule_stats.record(node.rule, RuleStats.fired(value), time.perf_counter() - start)
+        return value
+
+    def _node(self, name: str, inputs: Tuple[str, ...], compute: Callable) -> RuleNode:
+        node = self.nodes.get(name)
+        if node is not None:
+            return node
+        node = RuleNode(len(self.order), name, inputs, compute)
+        for source in inputs:
+            if source in self.nodes:
+                self.nodes[source].dependents.append(node)
+            else:
+                self.fact_dependents.setdefault(source, []).append(node)
+        node.value = self._evaluate(node)
+        self.nodes[name] = node
+        self.order.append(node)
+        return node
+
+    def update(self, battle: AbstractBattle) -> int:
+        """Diffs the battle's facts against the last update and propagates; returns nodes re-evaluated"""
+        self.updates += 1
+        queued: Dict[int, RuleNode] = {}
+        for name, value in self.extract(battle).items():
+            if name in self.facts and self.facts[name] == value:
+                continue
+            self.facts[name] = value
+            for node in self.fact_dependents.get(name, ()):
+                queued[node.node_id] = node
+        if not self.nodes:
+            self._build_shared()  # the first update evaluates every shared condition once
+            return len(self.order)
+        evaluated = 0
+        # Nodes only depend on earlier nodes, so id order is a topological order
+        while queued:
+            node = queued.pop(min(queued))
+            evaluated += 1
+            value = self._evaluate(node)
+            if value == node.value:
+                continue
+            node.value = value
+            for dependent in node.dependents:
+                queued[dependent.node_id] = dependent
+        return evaluated
+
+    # Shared conditions, built once per battle
+    def _build_shared(self):
+        node = self._node
+        node("has_setup", ("my_moves",), lambda moves: any(MoveIndex.has(m, MoveTag.SETUP) for m in moves))
+        node("passive_opponent", ("opp_species",),
+             lambda species: species is not None and any(wall in species.lower() for wall in PASSIVE_WALLS))
+        node("weakened_opponent", ("opp_hp",), lambda hp: hp is not None and hp < 0.4)
+        node("healthy", ("my_hp",), lambda hp: hp is not None and hp > 0.8)
+        node("numbers_advantage", ("my_alive", "opp_alive"), lambda mine, theirs: mine >= theirs)
+        node("setup_opportunity",
+             ("both_active", "has_setup", "passive_opponent", "weakened_opponent", "healthy", "numbers_advantage"),
+             self._setup_opportunity)
+
+        node("hazard_moves", ("my_moves",),
+             lambda moves: tuple((m, HAZARD_VALUES[m]) for m in moves if m in HAZARD_VALUES))
+        node("early_game", ("turn",), lambda turn: turn <= 2)
+        # Compared as side_conditions keys, exactly as evaluate_hazard_priority does
+        node("hazards_needed", ("hazard_moves", "my_side"),
+             lambda hazards, side: tuple((m, value) for m, value in hazards if m not in side))
+        node("multiple_targets", ("opp_alive",), lambda alive: alive >= 4)
+        node("hazard_priority", ("my_active", "hazard_moves", "early_game", "hazards_needed", "multiple_targets"),
+             self._hazard_priority)
+
+        node("endgame", ("my_alive",), lambda alive: alive <= 2)
+        node("setup_sweeper_opponent", ("opp_species",), lambda species: species is not None and MetaGameKnowledge.COMMON_SETS.get(
+            species.lower(), {}).get("threat_level") == "setup_sweeper")
+        node("bucket", ("opp_species",), lambda species: KnownTeams.spread_bucket(species) if species else None)
+
+    @staticmethod
+    def _setup_opportunity(active, has_setup, passive, weakened, healthy, numbers) -> Tuple[float, str]:
+        if not active:
+            return (0.0, "No battle state")
+        if not has_setup:
+            return (0.0, "No setup moves available")
+        score, reasoning = 0.0, []
+        for fired, value, reason in ((passive, 2.0, "Passive opponent"), (weakened, 1.5, "Weakened opponent"),
+                                     (healthy, 1.0, "Healthy setup"), (numbers, 1.0, "Numbers advantage")):
+            if fired:
+                score += value
+                reasoning.append(reason)
+        return (score, "; ".join(reasoning))
+
+    @staticmethod
+    def _hazard_priority(active, hazards, early, needed, multiple) -> Tuple[float, str]:
+        if not active:
+            return (0.0, "No active pokemon")
+        if not hazards:
+            return (0.0, "No hazard moves")
+        score, reasoning = 0.0, []
+        if early:
+            score += 2.0
+            reasoning.append("Early game setup")
+        for hazard, value in needed:
+            score += value
+            reasoning.append(f"Need {hazard}")
+        if multiple:
+            score += 1.5
+            reasoning.append("Multiple targets")
+        return (score, "; ".join(reasoning))
+
+    # Per-move productions
+    def _build_move(self, move_id: str):
+        self.moves[move_id] = None
+        move_fact = f"move:{move_id}"
+        self.facts[move_fact] = None  # filled by the next update()
+        node = self._node
+
+        node(f"effectiveness:{move_id}", (move_fact, "opp_types"),
+             lambda move, types: PokemonKnowledge.get_type_effectiveness(move[0], list(types)) if move and move[0] else None)
+        node(f"type:{move_id}", (f"effectiveness:{move_id}", "weights"), self._type_rule)
+        node(f"tabled:{move_id}", (move_fact, "my_species", "opp_species", "bucket"),
+             lambda move, mine, theirs, bucket: ScoreTable.shared().lookup(mine, move_id, theirs, bucket)
+             if move and move[1] and move[1] > 0 and theirs is not None else None)
+        node(f"damage:{move_id}",
+             (move_fact, f"tabled:{move_id}", f"effectiveness:{move_id}", "my_stats", "opp_stats", "opp_hp", "weights"),
+             self._damage_rule)
+        node(f"status:{move_id}", (move_fact, "my_hp", "weights"),
+             lambda move, hp, _: self._status_rule(move_id, move, hp))
+        node(f"pp:{move_id}", (move_fact, "weights"),
+             lambda move, _: (-RuleWeights.LOW, "Low PP") if move and move[2] is not None and move[2] <= 1 else None)
+        node(f"base:{move_id}",
+             ("both_active", move_fact, f"type:{move_id}", f"damage:{move_id}", f"status:{move_id}", f"pp:{move_id}", "weights"),
+             self._base_rule)
+
+        tags = MoveIndex.tags(move_id)
+        advanced = [f"base:{move_id}"]
+        if tags & MoveTag.SETUP:
+            advanced.append(node(f"setup:{move_id}", ("setup_opportunity", "weights"), lambda opportunity, _: (
+                opportunity[0] * RuleWeights.SETUP_MULTIPLIER, f"Setup opportunity: {opportunity[1]}")).name)
+        if tags & MoveTag.HAZARD:
+            advanced.append(node(f"hazard:{move_id}", ("hazard_priority", "weights"), lambda hazard, _: (
+                hazard[0] * RuleWeights.HAZARD_MULTIPLIER, f"Hazard value: {hazard[1]}")).name)
+        if tags & MoveTag.PRIORITY:
+            advanced.append(node(f"endgame:{move_id}", ("endgame", "weights"), lambda endgame, _: (
+                RuleWeights.ENDGAME_PRIORITY_BONUS, "Priority move endgame") if endgame else None).name)
+        if tags & MoveTag.ANTI_SETUP:
+            advanced.append(node(f"counter:{move_id}", ("setup_sweeper_opponent", "weights"), lambda sweeper, _: (
+                RuleWeights.SETUP_COUNTER_BONUS, "Counter setup sweeper") if sweeper else None).name)
+        node(f"priority:{move_id}", tuple(advanced), self._priority_rule)
+
+    @staticmethod
+    def _type_rule(effectiveness, _) -> Optional[Tuple[float, str]]:
+        if effectiveness is None:
+            return None
+        if effectiveness >= 2.0:
+            return (RuleWeights.HIGH, "Super effective")
+        if effectiveness <= 0.5:
+            return (-RuleWeights.MEDIUM, "Not very effective")
+        return None
+
+    @staticmethod
+    def _damage_rule(move, tabled, effectiveness, my_stats, opp_stats, opp_hp, _) -> Optional[Tuple[float, str]]:
+        if not move or opp_hp is None:
+            return None
+        if tabled is not None:
+            min_fraction, max_fraction, _ = tabled
+            if max_fraction >= opp_hp:
+                return (RuleWeights.CRITICAL, "Potential OHKO")
+            if min_fraction >= opp_hp * 0.8:
+                return (RuleWeights.HIGH, "High damage potential")
+            return None
+        if not (move[1] and move[1] > 0):
+            return None
+        defaults = {"attack": 100, "spa": 100, "defense": 100, "spd": 100, "hp": 100}
+        mine, theirs = {**defaults, **dict(my_stats)}, {**defaults, **dict(opp_stats)}
+        # Move has no damage_class in poke_env, so the reference always takes the special branch
+        min_damage, max_damage = DamageCalculator.calculate_damage(mine, theirs, move[1], effectiveness, False)
+        opp_current_hp = opp_hp * theirs.get("hp", 100)
+        if max_damage >= opp_current_hp:
+            return (RuleWeights.CRITICAL, "Potential OHKO")
+        if min_damage >= opp_current_hp * 0.8:
+            return (RuleWeights.HIGH, "High damage potential")
+        return None
+
+    @staticmethod
+    def _status_rule(move_id: str, move, hp) -> Optional[Tuple[float, str]]:
+        if not move or move[1] != 0 or hp is None:
+            return None
+        if hp < 0.3:
+            return (-RuleWeights.MEDIUM, "Low HP - avoid status")
+        if "heal" in move_id or "recover" in move_id:
+            return (RuleWeights.HIGH, "Healing move")
+        return None
+
+    @staticmethod
+    def _base_rule(active, move, *rules_and_weights) -> Tuple[float, str]:
+        if not active:
+            return (0.0, "No active Pokémon")
+        if not move:
+            return (0.0, "Move not found")
+        score, reasoning = RuleWeights.MEDIUM, []
+        for fired in rules_and_weights[:-1]:
+            if fired is not None:
+                score += fired[0]
+                reasoning.append(fired[1])
+        return (score, "; ".join(reasoning) if reasoning else "Standard move")
+
+    @staticmethod
+    def _priority_rule(base, *advanced) -> Tuple[float, str]:
+        score, reasoning = base[0], [base[1]]
+        for fired in advanced:
+            if fired is not None:
+                score += fired[0]
+                reasoning.append(fired[1])
+        return (score, " | ".join(reasoning))
+
+    # Queries, valid after update(battle)
+    def move_priority(self, battle: AbstractBattle, move_id: str) -> Tuple[float, str]:
+        if move_id not in self.moves:
+            self._build_move(move_id)
+            self.update(battle)
+        return self.nodes[f"priority:{move_id}"].value
+
+    def hazard_priority(self) -> Tuple[float, str]:
+        return self.nodes["hazard_priority"].value
+
+    def contributions(self, move_id: str) -> List[Tuple[str, float]]:
+        """(rule, delta) for every rule currently adding to or taking from a move's priority"""
+        base = self.nodes[f"base:{move_id}"]
+        sources = list(base.inputs[2:-1]) + list(self.nodes[f"priority:{move_id}"].inputs[1:])
+        if base.value[1] in ("No active Pokémon", "Move not found"):
+            sources = sources[4:]  # the base rules were not summed
+        return [(self.nodes[source].rule, self.nodes[source].value[0])
+                for source in sources if self.nodes[source].value is not None]
+
+    def stats(self) -> Dict:
+        return {
+            "nodes": len(self.order),
+            "updates": self.updates,
+            "evaluations": self.evaluations,
+            "evaluations_per_update": self.evaluations / self.updates if self.updates else 0.0,
+        }
+
+
+"""
+Rule statistics - how often each rule is evaluated, fires and decides the move,
+and what it costs, summed over every battle an agent plays.
+"""
+
+class RuleStats:
+    """Per-rule counters: evaluated, fired, deciding and cumulative seconds"""
+
+    def __init__(self):
+        self.rules: Dict[str, List[float]] = {}
+
+    @staticmethod
+    def fired(value: Any) -> bool:
+        """A scored rule fires when it moves the score; a condition when it holds"""
+        if isinstance(value, tuple) and len(value) == 2 and isinstance(value[0], (int, float)):
+            return value[0] != 0
+        return bool(value)
+
+    def _row(self, rule: str) -> List[float]:
+        row = self.rules.get(rule)
+        if row is None:
+            row = self.rules[rule] = [0, 0, 0, 0.0]
+        return row
+
+    def record(self, rule: str, fired: bool, seconds: float):
+        row = self._row(rule)
+        row[0] += 1
+        row[1] += bool(fired)
+        row[3] += seconds
+
+    def decided(self, rule: str):
+        self._row(rule)[2] += 1
+
+    def table(self) -> List[Dict]:
+        """One row per rule, most expensive first"""
+        rows = [
+            {"rule": rule, "evaluated": evaluated, "fired": fired, "deciding": deciding,
+             "total_ms": seconds * 1000, "us_per_eval": seconds * 1e6 / evaluated if evaluated else 0.0}
+            for rule, (evaluated, fired, deciding, seconds) in self.rules.items()
+        ]
+        return sorted(rows, key=lambda row: row["total_ms"], reverse=True)
+
+
+"""
+Decision log - one JSON line per decision and one per finished battle, written
+beside the replays so decisions can be joined with outcomes after a run.
+"""
+
+class DecisionLog:
+    """Append-only JSON lines, buffered and written when each battle finishes"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.pending: List[str] = []
+        self._lock = threading.Lock()
+
+    def _append(self, record: Dict):
+        with self._lock:
+            self.pending.append(json.dumps(record, separators=(",", ":")))
+
+    def decision(self, battle: AbstractBattle, rule: Optional[str], action: Any):
+        self._append({
+            "kind": "decision",
+            "battle_tag": battle.battle_tag,
+            "turn": battle.turn,
+            "rule": rule,
+            "action": getattr(action, "message", str(action)),
+        })
+
+    def result(self, battle: AbstractBattle):
+        self._append({
+            "kind": "result",
+            "battle_tag": battle.battle_tag,
+            "username": battle.player_username,
+            "opponent": battle.opponent_username,
+            "won": battle.won,
+            "turns": battle.turn,
+        })
+        self.flush()
+
+    def flush(self):
+        with self._lock:
+            pending, self.pending = self.pending, []
+        if not pending:
+            return
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(self.path, "a", encoding="utf-8") as file:
+            file.write("\n".join(pending) + "\n")
@@ -0,0 +1,159 @@
+import glob
+import html
+import logging
+import os
+import re
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from poke_env.battle import Battle, Move
+from poke_env.data import GenData, to_id_str
+from poke_env.stats import compute_raw_stats
+
+LOG_PATTERN = re.compile(r'<script type="text/plain" class="battle-log-data">(.*?)</script>', re.S)
+
+
+def replay_path(folder: str, username: str, battle_tag: str) -> Optional[str]:
+    """The HTML poke_env saved for a battle, falling back to any player's copy of it"""
+    path = os.path.join(folder, f"{username} - {battle_tag}.html")
+    if os.path.exists(path):
+        return path
+    matches = glob.glob(os.path.join(folder, f"* - {glob.escape(battle_tag)}.html"))
+    return matches[0] if matches else None
+
+
+def read_log(path: str) -> List[List[str]]:
+    """Protocol lines of a saved replay, split as poke_env splits server messages"""
+    with open(path, "r", encoding="utf-8") as file:
+        match = LOG_PATTERN.search(file.read())
+    if match is None:
+        return []
+    lines = []
+    for line in html.unescape(match.group(1)).splitlines():
+        line = line.strip()
+        # the first line carries the room id (">battle-...") ahead of |init|
+        if line.startswith(">"):
+            line = line[line.find("|"):] if "|" in line else ""
+        if line.startswith("|"):
+            lines.append(line.split("|"))
+    return lines
+
+
+def battle_tag(path: str) -> str:
+    return os.path.basename(path)[:-len(".html")].split(" - ", 1)[-1]
+
+
+def iter_replays(folder: str) -> Iterator[Tuple[str, List[List[str]]]]:
+    """(battle tag, protocol lines) for every replay in a folder"""
+    for path in sorted(glob.glob(os.path.join(folder, "*.html"))):
+        yield battle_tag(path), read_log(path)
+
+
+def players(lines: List[List[str]]) -> Dict[str, str]:
+    """Role ("p1"/"p2") to username"""
+    return {line[2]: line[3] for line in lines if len(line) > 3 and line[1] == "player" and line[3]}
+
+
+def role_of(lines: List[List[str]], username: str) -> Optional[str]:
+    for role, name in players(lines).items():
+        if name == username:
+            return role
+    return None
+
+
+def hp_fraction(condition: str) -> float:
+    """0.0-1.0 from "213/213", "54/100 par" or "0 fnt" """
+    value = condition.split()[0]
+    if "/" not in value:
+        return 0.0
+    current, maximum = value.split("/")
+    return float(current) / float(maximum) if float(maximum) else 0.0
+
+
+# Lines a Player handles itself rather than passing to Battle.parse_message
+PLAYER_EVENTS = {"request", "win", "tie", "error", "bigerror", "showteam", "init", "title", "j", "l", "n", "raw"}
+
+
+def revealed_sets(lines: List[List[str]], role: str) -> Dict[str, Dict]:
+    """Moves and Tera type each of our Pokemon shows over the whole battle; our side knows its own sets"""
+    sets: Dict[str, Dict] = {}
+    for line in lines:
+        if len(line) > 3 and line[1] in ("move", "-terastallize") and line[2].startswith(role):
+            mon = sets.setdefault(line[2].split(": ", 1)[1], {"moves": [], "tera": None})
+            if line[1] == "-terastallize":
+                mon["tera"] = line[3]
+            elif to_id_str(line[3]) not in mon["moves"] and len(mon["moves"]) < 4:
+                mon["moves"].append(to_id_str(line[3]))
+    return sets
+
+
+def observed_request(battle: Battle, sets: Dict[str, Dict], can_tera: bool) -> Dict:
+    """The request the server would have sent our side, built from what the log shows of our team"""
+    data = GenData.from_gen(9)
+    side: Dict = {"name": battle.player_username, "id": battle.player_role, "pokemon": []}
+    active = None
+    for ident, mon in battle.team.items():
+        name = ident.split(": ", 1)[1]
+        known = sets.get(name, {"moves": [], "tera": None})
+        # spreads are never shown, so assume the random-battle default
+        stats = compute_raw_stats(mon.species, [84] * 6, [31] * 6, mon.level, "serious", data)
+        condition = "0 fnt" if mon.fainted else f"{mon.current_hp}/{mon.max_hp}"
+        if mon.status is not None and not mon.fainted:
+            condition += f" {mon.status.name.lower()}"
+        side["pokemon"].append({
+            "ident": ident,
+            "details": mon._last_details or mon.species,
+            "condition": condition,
+            "active": mon.active,
+            "stats": dict(zip(["atk", "def", "spa", "spd", "spe"], stats[1:])),
+            "moves": known["moves"],
+            "baseAbility": mon.ability or "",
+            "item": mon.item or "",
+            "pokeball": "pokeball",
+            "ability": mon.ability or "",
+            "teraType": known["tera"] or mon.type_1.name.title(),
+            "terastallized": mon.tera_type.name.title() if mon.is_terastallized and mon.tera_type else "",
+        })
+        if mon.active and not mon.fainted:
+            active = (mon, known)
+
+    request: Dict = {"side": side, "rqid": 1}
+    if active is None:
+        request["forceSwitch"] = [True]
+    else:
+        mon, known = active
+        moves = []
+        for move_id in known["moves"]:
+            move = mon.moves.get(move_id) or Move(move_id, gen=9)
+            moves.append({"move": move.entry.get("name", move_id), "id": move_id, "pp": move.current_pp,
+                          "maxpp": move.max_pp, "target": move.entry.get("target", "normal"), "disabled": False})
+        active_request: Dict = {"moves": moves}
+        if can_tera and known["tera"]:
+            active_request["canTerastallize"] = known["tera"]
+        request["active"] = [active_request]
+    return request
+
+
+def rebuild_battles(lines: List[List[str]], username: str, battle_tag: str) -> Iterator[Battle]:
+    """One fresh Battle per turn, as `username` saw it when asked to choose that turn's move.
+
+    Each state is parsed from the start of the log so callers can keep or mutate them freely, and
+    is tagged "<battle_tag>-turn<N>" so an agent keeps no per-battle models from another state.
+    """
+    role = role_of(lines, username)
+    if role is None:
+        return
+    sets = revealed_sets(lines, role)
+    turn_lines = [i for i, line in enumerate(lines) if len(line) > 2 and line[1] == "turn"]
+    for end in turn_lines:
+        tag = f"{battle_tag}-turn{lines[end][2]}"
+        battle = Battle(tag, username, logging.getLogger(tag), gen=9)
+        tera_used = False
+        for line in lines[:end + 1]:
+            if len(line) < 2 or line[1] in PLAYER_EVENTS:
+                continue
+            tera_used |= line[1] == "-terastallize" and line[2].startswith(role)
+            battle.parse_message(line)
+        if not battle.team:
+            continue
+        battle.parse_request(observed_request(battle, sets, not tera_used))
+        yield battle
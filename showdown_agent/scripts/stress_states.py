@@ -0,0 +1,168 @@
+import argparse
+import inspect
+import os
+import random
+import time
+import traceback
+from collections import Counter
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+from poke_env.data import GenData
+from poke_env.player import DefaultBattleOrder
+from poke_env.battle import Pokemon
+from poke_env.teambuilder import Teambuilder
+from tabulate import tabulate
+
+from offline_battles import AGENT_PATH, build_battle, create_agent, load_module, read_bot_teams, species_name
+
+ALL_HAZARDS = ["Spikes"] * 3 + ["Toxic Spikes"] * 2 + ["Stealth Rock", "Sticky Web"]
+
+
+def species_pools() -> Tuple[List[str], List[str]]:
+    """Species our bots field, and the rest of the Gen 9 dex that no table or book has seen"""
+    known = sorted({species_name(m) for team in read_bot_teams().values() for m in Teambuilder.parse_showdown_team(team)})
+    dex = GenData.from_gen(9).pokedex
+    unseen = sorted(entry["name"] for entry in dex.values() if entry.get("num", 0) > 0 and entry["name"] not in known)
+    return known, unseen
+
+
+def generate(rng: random.Random, our_team: str, known: List[str], unseen: List[str], index: int) -> Tuple[Dict, Dict]:
+    """build_battle arguments for one adversarial but legal position, and the knobs that made it"""
+    n_ours = len(Teambuilder.parse_showdown_team(our_team))
+    knobs = {
+        "force_switch": rng.random() < 0.15,
+        "trapped": rng.random() < 0.2,
+        "no_moves": rng.random() < 0.1,
+        "no_pp": rng.random() < 0.1,
+        "all_hazards": rng.random() < 0.2,
+        "one_hp": rng.random() < 0.3,
+        "unseen_species": rng.random() < 0.3,
+        "no_preview": rng.random() < 0.2,
+    }
+    pool = unseen if knobs["unseen_species"] else known
+    opponents = rng.sample(pool, rng.randint(1, 6))
+
+    our_hp = [rng.choice([1.0, rng.random(), 0.001, 0.0]) for _ in range(n_ours)]
+    our_active = None if knobs["force_switch"] else rng.randrange(n_ours)
+    if our_active is not None:
+        our_hp[our_active] = 0.001 if knobs["one_hp"] else max(our_hp[our_active], 0.01)
+    if knobs["force_switch"] and all(hp == 0 for hp in our_hp):
+        our_hp[rng.randrange(n_ours)] = 1.0
+
+    hazards = lambda: ALL_HAZARDS if knobs["all_hazards"] else rng.sample(ALL_HAZARDS, rng.randint(0, 2))
+    kwargs: Dict[str, Any] = {
+        "opponent_species": opponents,
+        "our_active": our_active,
+        "opponent_active": rng.randrange(len(opponents)),
+        "turn": rng.randint(1, 60),
+        "battle_tag": f"battle-gen9ubers-stress{index}",
+        "our_hp": our_hp,
+        "opponent_hp": "1/100" if knobs["one_hp"] else f"{rng.randint(1, 100)}/100",
+        "opponent_level": rng.choice([100, 100, rng.randint(1, 100)]),
+        "opponent_preview": not knobs["no_preview"],
+        "opponent_hazards": hazards(),
+        "our_hazards": hazards(),
+        "force_switch": knobs["force_switch"],
+        "trapped": knobs["trapped"],
+        "can_tera": rng.random() < 0.5,
+    }
+    if our_active is not None:
+        moves = [m.lower().replace(" ", "").replace("-", "") for m in Teambuilder.parse_showdown_team(our_team)[our_active].moves]
+        kwargs["disabled"] = moves if knobs["no_moves"] else rng.sample(moves, rng.randint(0, 1))
+        kwargs["pp"] = {m: 0 for m in moves} if knobs["no_pp"] else None
+    return kwargs, knobs
+
+
+def illegal_reason(battle, order) -> Optional[str]:
+    """Why the server would reject the order, or None"""
+    if order is None:
+        return "no order"
+    if isinstance(order, DefaultBattleOrder):
+        return None
+    chosen = getattr(order, "order", None)
+    if isinstance(chosen, Pokemon):
+        if chosen not in battle.available_switches:
+            return f"switch to {chosen.species} not available"
+        return None
+    if battle.force_switch:
+        return "move during a forced switch"
+    if chosen is None or chosen.id not in {m.id for m in battle.available_moves}:
+        return f"move {getattr(chosen, 'id', chosen)} not available"
+    if getattr(order, "terastallize", False) and not battle.can_tera:
+        return "tera not available"
+    return None
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Drive choose_move through seeded adversarial positions; report crashes, illegal orders and latency outliers"
+    )
+    parser.add_argument("--agent", default=AGENT_PATH)
+    parser.add_argument("--states", type=int, default=5000)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--slowest", type=int, default=5, help="latency outliers to list")
+    parser.add_argument("--show", type=int, help="print the generated arguments of one state index and exit")
+    args = parser.parse_args()
+
+    module = load_module(args.agent, "stress_agent")
+    agent = create_agent(module, "stress")
+    known, unseen = species_pools()
+
+    crashes: Counter = Counter()
+    first_seen: Dict[str, int] = {}
+    illegal: Counter = Counter()
+    unbuildable = 0
+    timings: List[Tuple[float, int, Dict]] = []
+
+    for index in range(args.states):
+        # one generator per state, so any index can be regenerated alone with --show
+        rng = random.Random(args.seed * 1_000_003 + index)
+        kwargs, knobs = generate(rng, module.team, known, unseen, index)
+        if args.show == index:
+            print(kwargs)
+            return
+        if args.show is not None:
+            continue
+        try:
+            battle = build_battle(module.team, **kwargs)
+        except Exception:
+            unbuildable += 1
+            continue
+
+        begin = time.perf_counter()
+        try:
+            order = agent.choose_move(battle)
+            if inspect.isawaitable(order):
+                raise TypeError("asynchronous choose_move is not supported offline")
+        except Exception as error:
+            frame = traceback.extract_tb(error.__traceback__)[-1]
+            key = f"{type(error).__name__}: {error} ({os.path.basename(frame.filename)}:{frame.lineno})"
+            crashes[key] += 1
+            first_seen.setdefault(key, index)
+            continue
+        timings.append((time.perf_counter() - begin, index, knobs))
+
+        reason = illegal_reason(battle, order)
+        if reason is not None:
+            key = f"{reason} [{', '.join(k for k, v in knobs.items() if v) or 'plain'}]"
+            illegal[key] += 1
+            first_seen.setdefault(key, index)
+
+    decided = np.array([t for t, _, _ in timings]) * 1000
+    print(f"{args.states} states (seed {args.seed}): {len(timings)} decided, {sum(crashes.values())} crashed, "
+          f"{sum(illegal.values())} illegal, {unbuildable} could not be built")
+    if len(decided):
+        print(f"latency ms: p50 {np.percentile(decided, 50):.2f}  p99 {np.percentile(decided, 99):.2f}  "
+              f"max {decided.max():.2f}")
+    if crashes:
+        print(tabulate([[n, first_seen[k], k] for k, n in crashes.most_common()], headers=["Crashes", "First state", "Error"]))
+    if illegal:
+        print(tabulate([[n, first_seen[k], k] for k, n in illegal.most_common()], headers=["Illegal", "First state", "Order"]))
+    slowest = sorted(timings, key=lambda t: t[0], reverse=True)[:args.slowest]
+    print(tabulate([[f"{t * 1000:.2f}", i, ", ".join(k for k, v in knobs.items() if v) or "plain"] for t, i, knobs in slowest],
+                   headers=["Slowest ms", "State", "Knobs"]))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+"""Checks for the pure helpers the agent and the analysis scripts lean on"""
+
+import pytest
+
+from offline_battles import AGENT_PATH, load_module
+from weight_sweep import expand_grid, number, parse_axis, wilson_interval
+
+
+@pytest.fixture(scope="module")
+def module():
+    return load_module(AGENT_PATH, "helpers_agent")
+
+
+# The hand-written move lists MoveIndex replaced; every one must still carry its tag
+OLD_MOVE_LISTS = {
+    "SETUP": ["swordsdance", "calmmind", "nastyplot", "agility"],
+    "HAZARD": ["spikes", "stealthrock", "toxicspikes"],
+    "PRIORITY": ["extremespeed", "suckerpunch", "bulletpunch"],
+    "ANTI_SETUP": ["taunt", "roar", "whirlwind"],
+}
+
+
+@pytest.mark.parametrize("tag", sorted(OLD_MOVE_LISTS))
+def test_move_index_covers_the_old_lists(module, tag):
+    for move_id in OLD_MOVE_LISTS[tag]:
+        assert module.MoveIndex.has(move_id, module.MoveTag[tag]), move_id
+
+
+def test_move_index_snapshot_matches_move_data(module):
+    assert module.MoveIndex.index() == module.MoveIndex.build()
+    assert not module.MoveIndex.has("earthquake", module.MoveTag.STATUS)
+    assert not module.MoveIndex.has("swordsdance", module.MoveTag.PRIORITY)
+    assert module.MoveIndex.label("U-turn") == "pivot"
+    assert module.MoveIndex.label("Earthquake") == "attack"
+    assert module.MoveIndex.label("not a move") == "other"
+
+
+def test_rule_weights_apply(module):
+    weights = module.RuleWeights
+    saved = weights.as_dict()
+    version = module.CustomAgent.parameters_version()
+    try:
+        weights.apply({"HIGH": 80, "SWITCH_PREDICTION": 0.5})
+        assert weights.HIGH == 80 and weights.SWITCH_PREDICTION == 0.5
+        # a sweep point must not reuse decisions cached under other weights
+        assert module.CustomAgent.parameters_version() != version
+        with pytest.raises(KeyError):
+            weights.apply({"HIGH": 90, "NOT_A_WEIGHT": 1})
+        assert weights.HIGH == 80
+    finally:
+        weights.apply(saved)
+    assert weights.as_dict() == saved
+    assert module.CustomAgent.parameters_version() == version
+
+
+def test_wilson_interval():
+    assert wilson_interval(0, 0) == (0.0, 1.0)
+    low, high = wilson_interval(50, 100)
+    assert low < 0.5 < high
+    assert high - low == pytest.approx(0.19, abs=0.01)
+    assert wilson_interval(0, 10)[0] == 0.0
+    assert wilson_interval(10, 10)[1] == 1.0
+    # more games, tighter interval
+    assert wilson_interval(500, 1000)[1] < high
+
+
+def test_sweep_axes():
+    assert parse_axis("high=75,80.5") == ("HIGH", [75, 80.5])
+    assert isinstance(number("75.0"), int)
+    assert expand_grid({}) == [{}]
+    assert expand_grid({"LOW": [1, 2], "HIGH": [3]}) == [{"HIGH": 3, "LOW": 1}, {"HIGH": 3, "LOW": 2}]
+
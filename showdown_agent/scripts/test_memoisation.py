@@ -0,0 +1,130 @@
+"""A memo must never change a decision: every cached answer is checked against fresh scoring"""
+import copy
+import random
+from typing import Any, Dict
+
+import pytest
+from poke_env.data import to_id_str
+from poke_env.teambuilder import Teambuilder
+
+from offline_battles import AGENT_PATH, build_battle, create_agent, load_module, read_bot_teams, species_name
+from stress_states import generate, species_pools
+
+
+@pytest.fixture(scope="module")
+def module():
+    return load_module(AGENT_PATH, "memo_agent")
+
+
+def make_agent(module, username: str, book: bool = False, cache: bool = True):
+    agent = create_agent(module, username)
+    # in memory only, so neither earlier runs nor this test touch decisions through agent_cache.sqlite
+    agent.persistent_cache = module.PersistentCache(module.PersistentCache.version_hash(module.team))
+    if not book:
+        agent.opening_book = None
+    if not cache:
+        agent.decision_cache = module.DecisionCache(max_entries=0)
+    return agent
+
+
+def nudge(rng: random.Random, kwargs: dict, index: int) -> dict:
+    """The same position with one HP or PP value moved by less than a tenth"""
+    variant = copy.deepcopy(kwargs)
+    variant["battle_tag"] = f"{kwargs['battle_tag']}v{index}"
+    active = variant["our_active"]
+    what = rng.choice(["opponent", "opponent", "ours", "bench", "pp"])
+    if what == "opponent":
+        hp = int(variant["opponent_hp"].split("/")[0])
+        variant["opponent_hp"] = f"{min(100, max(1, hp + rng.randint(-4, 4)))}/100"
+    elif what == "ours" and active is not None:
+        variant["our_hp"][active] = min(1.0, max(0.01, variant["our_hp"][active] + rng.uniform(-0.049, 0.049)))
+    elif what == "bench":
+        k = rng.randrange(len(variant["our_hp"]))
+        if k != active and variant["our_hp"][k] > 0:
+            variant["our_hp"][k] = min(1.0, max(0.01, variant["our_hp"][k] + rng.uniform(-0.049, 0.049)))
+    elif what == "pp" and variant.get("pp"):
+        variant["pp"] = {move: rng.choice([0, 1, 2, 16]) for move in variant["pp"]}
+    return variant
+
+
+def test_decision_cache_matches_fresh_scoring(module):
+    known, unseen = species_pools()
+    cached = make_agent(module, "cached")
+    fresh = make_agent(module, "fresh", cache=False)
+    hits = 0
+    for i in range(120):
+        rng = random.Random(i)
+        kwargs, _ = generate(rng, module.team, known, unseen, i)
+        kwargs["turn"] = rng.randint(4, 30)  # past the opening book
+        kwargs["opponent_preview"] = True
+        if kwargs["our_active"] is not None:
+            moves = [to_id_str(m) for m in Teambuilder.parse_showdown_team(module.team)[kwargs["our_active"]].moves]
+            kwargs["pp"] = {move: 16 for move in moves}
+        for variant in [kwargs] + [nudge(rng, kwargs, j) for j in range(4)]:
+            before = cached.decision_cache.hits
+            ours = cached.choose_move(build_battle(module.team, **variant)).message
+            theirs = fresh.choose_move(build_battle(module.team, **dict(variant, battle_tag=variant["battle_tag"] + "f"))).message
+            if cached.decision_cache.hits > before:
+                hits += 1
+                assert ours == theirs, (i, variant)
+    assert hits > 0, "no position repeated a fingerprint"
+
+
+def book_position(rng: random.Random, opponents: list, change: str) -> dict:
+    turn, our_active, our_hp = rng.randint(1, 3), rng.randrange(6), [1.0] * 6
+    kwargs: Dict[str, Any] = dict(opponent_species=opponents, our_active=our_active, our_hp=our_hp,
+                                  opponent_active=rng.randrange(len(opponents)), turn=turn,
+                                  opponent_hazards=["Spikes"] * rng.randrange(turn))
+    if change == "opponent_hp":
+        kwargs["opponent_hp"] = "95/100"
+    elif change == "our_hp":
+        our_hp[our_active] = 0.95
+    elif change == "bench":
+        our_hp[(our_active + 1 + rng.randrange(5)) % 6] = rng.choice([0.0, 0.5])
+    elif change == "our_hazards":
+        kwargs["our_hazards"] = ["Stealth Rock"]
+    return kwargs
+
+
+@pytest.mark.parametrize("change", ["none", "opponent_hp", "our_hp", "bench", "our_hazards"])
+def test_opening_book_matches_fresh_scoring(module, change):
+    teams = [[species_name(m) for m in Teambuilder.parse_showdown_team(t)] for t in read_bot_teams().values()]
+    booked = make_agent(module, "booked", book=True, cache=False)
+    fresh = make_agent(module, "fresh", cache=False)
+    assert booked.opening_book is not None, "regenerate the book with opening_book.py"
+    hits = 0
+    for i in range(40):
+        rng = random.Random(i)
+        kwargs = book_position(rng, rng.choice(teams), change)
+        before = booked.opening_book.hits
+        ours = booked.choose_move(build_battle(module.team, battle_tag=f"battle-book{i}", **kwargs)).message
+        theirs = fresh.choose_move(build_battle(module.team, battle_tag=f"battle-fresh{i}", **kwargs)).message
+        if booked.opening_book.hits > before:
+            hits += 1
+            assert ours == theirs, (i, kwargs)
+    # the book answers untouched positions only
+    assert hits > 0 if change == "none" else hits == 0
+
+
+def column(module, cache, level: int) -> tuple:
+    battle = build_battle(module.team, ["Darkrai", "Kingambit"], turn=6, opponent_level=level,
+                          battle_tag=f"battle-matchup{level}")
+    matrix = module.MatchupMatrix.from_battle(battle, cache)
+    j = matrix.column(battle.opponent_active_pokemon)
+    return matrix.offense[:, j].tolist(), matrix.defense[:, j].tolist(), matrix.dmg_for[:, j].tolist(), \
+        matrix.dmg_against[:, j].tolist()
+
+
+def test_persistent_matchups_are_keyed_on_the_full_sets(module, tmp_path):
+    path = str(tmp_path / "cache.sqlite")
+    expected = {level: column(module, None, level) for level in (20, 100)}
+
+    writer = module.PersistentCache.open(module.team, path)
+    assert column(module, writer, 20) == expected[20]
+    writer.flush()
+
+    # a later process warm-loads the L20 entries, and must not serve them to an L100 opponent
+    reader = module.PersistentCache.open(module.team, path)
+    assert reader.warm_entries > 0
+    assert column(module, reader, 100) == expected[100]
+    assert column(module, reader, 20) == expected[20]
@@ -0,0 +1,120 @@
+"""The opponent classifier must recognise the bots from the actions they chose, and only from those"""
+import glob
+import os
+from collections import defaultdict
+
+import pytest
+from poke_env.teambuilder import Teambuilder
+
+from offline_battles import AGENT_PATH, build_battle, load_module, read_bot_teams, species_name
+from replay_log import battle_tag, players, read_log, rebuild_battles
+
+SCRIPTS = os.path.dirname(os.path.abspath(__file__))
+REPLAYS = sorted(glob.glob(os.path.join(SCRIPTS, "replays", "**", "*.html"), recursive=True))
+
+
+@pytest.fixture(scope="module")
+def module():
+    return load_module(AGENT_PATH, "classifier_agent")
+
+
+def classify(module, path: str):
+    """(opponent bot, classifier) after predicting each turn of a saved battle and reading its messages"""
+    lines = read_log(path)
+    username = os.path.basename(path).split(" - ", 1)[0]
+    bot = next(name for name in players(lines).values() if name != username).split("-")[0]
+    classifier = module.OpponentPolicyClassifier()
+    tracker = module.BattleDeltaTracker(username)
+    tracker.listeners.append(classifier.on_event)
+    turns = {int(line[2]): i for i, line in enumerate(lines) if len(line) > 2 and line[1] == "turn"}
+    for line in lines[:min(turns.values()) + 1]:
+        tracker.feed(line)
+    for battle in rebuild_battles(lines, username, battle_tag(path)):
+        classifier.update(battle)
+        end = turns.get(battle.turn + 1, len(lines))
+        for line in lines[turns[battle.turn] + 1:end]:
+            tracker.feed(line)
+    return bot, classifier
+
+
+@pytest.mark.skipif(not REPLAYS, reason="no saved replays")
+def test_replays_recognise_the_bot_that_played(module):
+    recognized = set()
+    hits, observed = defaultdict(int), defaultdict(int)
+    for path in REPLAYS:
+        bot, classifier = classify(module, path)
+        policy = classifier.recognized
+        if bot == "random":
+            assert policy is None, path
+        elif policy is not None:
+            assert policy.name == bot, path
+            recognized.add(bot)
+        for name in classifier.hits:
+            hits[bot, name] += classifier.hits[name]
+            observed[bot, name] += classifier.hits[name] + classifier.misses[name]
+    assert recognized == {"max_damage", "simple"}
+    for name in ("max_damage", "simple"):
+        # each replica predicts its own bot far better than a bot that picks at random
+        assert hits[name, name] / observed[name, name] > 2 * hits["random", name] / observed["random", name]
+
+
+def opening(module, team: str, species: str, turn: int = 1):
+    opponents = [species_name(mon) for mon in Teambuilder.parse_showdown_team(read_bot_teams()[team])]
+    return build_battle(module.team, opponents, opponent_active=opponents.index(species), turn=turn,
+                        battle_tag=f"battle-gen9ubers-classifier-{team}")
+
+
+def event(module, kind: str, side: str, species: str, value=None):
+    ident = ("p2: " if side == "opponent" else "p1: ") + species
+    return module.BattleEvent(module.BattleEventKind[kind], side, ident, species.lower(), value)
+
+
+def observations(classifier, policy: str = "max_damage") -> int:
+    return classifier.hits[policy] + classifier.misses[policy]
+
+
+def test_drags_and_replacements_are_not_scored(module):
+    classifier = module.OpponentPolicyClassifier()
+    classifier.update(opening(module, "uber", "Arceus-Fairy"))
+    assert classifier.pending(module.MaxDamagePolicy()) is not None
+    # our Roar drags them out: their switch comes after a move, so they never chose it
+    classifier.on_event(event(module, "MOVE", "self", "Pikachu", "roar"))
+    classifier.on_event(event(module, "SWITCH", "opponent", "Zacian-Crowned", 1.0))
+    assert observations(classifier) == 0
+
+    classifier = module.OpponentPolicyClassifier()
+    classifier.update(opening(module, "uber", "Arceus-Fairy"))
+    classifier.on_event(event(module, "FAINT", "opponent", "Arceus-Fairy"))
+    classifier.on_event(event(module, "SWITCH", "opponent", "Zacian-Crowned", 1.0))
+    assert observations(classifier) == 0
+
+
+def test_constrained_turns_are_skipped(module):
+    classifier = module.OpponentPolicyClassifier()
+    battle = opening(module, "uber", "Arceus-Fairy")
+    battle.opponent_active_pokemon.start_effect("Disable")
+    classifier.update(battle)
+    assert classifier.constrained(battle) and not classifier.pending(module.MaxDamagePolicy())
+    classifier.on_event(event(module, "MOVE", "opponent", "Arceus-Fairy", "judgment"))
+    assert observations(classifier) == 0
+
+    # Darkrai's set holds a Choice Scarf, so once it has moved it is locked into that move
+    classifier = module.OpponentPolicyClassifier()
+    classifier.update(opening(module, "ou", "Darkrai"))
+    classifier.on_event(event(module, "MOVE", "opponent", "Darkrai", "darkpulse"))
+    assert observations(classifier) == 1
+    classifier.update(opening(module, "ou", "Darkrai", turn=2))
+    assert not classifier.pending(module.MaxDamagePolicy())
+    classifier.on_event(event(module, "MOVE", "opponent", "Darkrai", "darkpulse"))
+    assert observations(classifier) == 1
+
+
+def test_recognition_tolerates_the_odd_miss(module):
+    classifier = module.OpponentPolicyClassifier()
+    classifier.misses["simple"] = 4
+    classifier.hits["max_damage"] = 2
+    assert classifier.recognized is None  # too few observations
+    classifier.hits["max_damage"], classifier.misses["max_damage"] = 3, 1
+    assert classifier.recognized is not None and classifier.recognized.name == "max_damage"
+    classifier.misses["max_damage"] = 2
+    assert classifier.recognized is None
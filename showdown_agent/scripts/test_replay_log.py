@@ -0,0 +1,33 @@
+"""States rebuilt from saved replays must reach the agent's live decision path"""
+import glob
+import os
+
+import pytest
+
+from offline_battles import create_agent, load_module
+from replay_log import battle_tag, read_log, rebuild_battles
+
+SCRIPTS = os.path.dirname(os.path.abspath(__file__))
+AGENT_PATH = os.path.join(SCRIPTS, "players", "tlim334.py")
+REPLAYS = sorted(glob.glob(os.path.join(SCRIPTS, "replays", "**", "*.html"), recursive=True))[:4]
+
+
+@pytest.mark.skipif(not REPLAYS, reason="no saved replays")
+def test_rebuilt_states_get_their_own_matchup_rows():
+    module = load_module(AGENT_PATH, "replay_agent")
+    agent = create_agent(module, "replays")
+    agent.persistent_cache = module.PersistentCache(module.PersistentCache.version_hash(module.team))
+    checked = 0
+    for path in REPLAYS:
+        username = os.path.basename(path).split(" - ", 1)[0]
+        states = list(rebuild_battles(read_log(path), username, battle_tag(path)))
+        assert len({battle.battle_tag for battle in states}) == len(states)
+        for battle in states:
+            agent.choose_move(battle)
+            matchups = agent.contexts[battle.battle_tag].matchups
+            if matchups is None or battle.active_pokemon is None:
+                continue
+            # rows are matched by identity, so the matrix must have been built from this very Battle
+            assert matchups.row_of(battle.active_pokemon) is not None, (path, battle.turn)
+            checked += 1
+    assert checked > 0
@@ -0,0 +1,75 @@
+"""The rule network must score every move exactly as the from-scratch expert rules do"""
+import random
+
+import pytest
+from poke_env.teambuilder import Teambuilder
+
+from offline_battles import AGENT_PATH, build_battle, load_module, read_bot_teams, species_name
+from stress_states import generate, species_pools
+
+
+@pytest.fixture(scope="module")
+def module():
+    return load_module(AGENT_PATH, "network_agent")
+
+
+def reference(module, battle):
+    moves = {move.id: module.EnhancedExpertRules.evaluate_move_priority_advanced(battle, move.id)
+             for move in battle.available_moves}
+    return moves, module.AdvancedBattleStrategy.evaluate_hazard_priority(battle)
+
+
+def scored(network, battle):
+    network.update(battle)
+    return {move.id: network.move_priority(battle, move.id) for move in battle.available_moves}, network.hazard_priority()
+
+
+def test_network_matches_rules_across_unrelated_positions(module):
+    # one network fed positions that share nothing, so most facts change between updates
+    known, unseen = species_pools()
+    network = module.RuleNetwork()
+    for i in range(150):
+        kwargs, _ = generate(random.Random(i), module.team, known, unseen, i)
+        battle = build_battle(module.team, **kwargs)
+        assert scored(network, battle) == reference(module, battle), (i, kwargs)
+
+
+def play_turn(rng: random.Random, battle, opponents: list) -> None:
+    """One turn's worth of damage, switches, hazards or faints, sent the way the server sends them"""
+    roll = rng.random()
+    pick = rng.choice(opponents)
+    if roll < 0.4 and battle.opponent_active_pokemon is not None:
+        name = next(o for o in opponents if battle.opponent_team.get(f"p2: {o}") is battle.opponent_active_pokemon)
+        battle.parse_message(["", "-damage", f"p2a: {name}", f"{rng.randint(1, 100)}/100"])
+    elif roll < 0.55:
+        battle.parse_message(["", "switch", f"p2a: {pick}", f"{pick}, L100", f"{rng.randint(1, 100)}/100"])
+    elif roll < 0.65:
+        battle.parse_message(["", "-sidestart", "p1: offline", "Spikes"])
+    elif roll < 0.75:
+        benched = [mon for mon in battle.opponent_team.values() if not mon.active]
+        if benched:
+            battle.parse_message(["", "faint", f"p2a: {rng.choice(benched).name}"])
+    elif roll < 0.85:
+        benched = [mon for mon in battle.team.values() if not mon.active and not mon.fainted]
+        if benched:
+            battle.parse_message(["", "faint", f"p1a: {rng.choice(benched).name}"])
+    elif battle.active_pokemon is not None:
+        battle.active_pokemon.damage(f"{rng.randint(1, battle.active_pokemon.max_hp)}/{battle.active_pokemon.max_hp}")
+    battle.parse_message(["", "turn", str(battle.turn + 1)])
+
+
+def test_network_matches_rules_through_a_battle(module):
+    # one network per battle, updated turn by turn as the live agent does
+    rng = random.Random(1)
+    checks = 0
+    for name, bot_team in read_bot_teams().items():
+        opponents = [species_name(mon) for mon in Teambuilder.parse_showdown_team(bot_team)]
+        for start in range(0, len(opponents), 2):
+            battle = build_battle(module.team, opponents, our_active=start, opponent_active=start,
+                                  battle_tag=f"battle-gen9ubers-{name}{start}", turn=1)
+            network = module.RuleNetwork()
+            for _ in range(20):
+                play_turn(rng, battle, opponents)
+                assert scored(network, battle) == reference(module, battle), (name, start, battle.turn)
+                checks += 1
+    assert checks > 0
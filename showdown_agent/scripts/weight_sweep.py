@@ -0,0 +1,142 @@
+# node pokemon-showdown start --no-security
+
+import argparse
+import asyncio
+import itertools
+import json
+import math
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Dict, List, Tuple
+
+from poke_env import AccountConfiguration
+from tabulate import tabulate
+
+from offline_battles import AGENT_PATH, load_module, read_bot_teams, spawn_context
+
+BOTS_FOLDER = os.path.join(os.path.dirname(os.path.abspath(__file__)), "bots")
+
+
+def number(value) -> float:
+    # 75 rather than 75.0, so a grid point equal to a default keeps the same parameters version
+    value = float(value)
+    return int(value) if value.is_integer() else value
+
+
+def parse_axis(text: str) -> Tuple[str, List[float]]:
+    """NAME=v1,v2,... as given to --set"""
+    name, _, values = text.partition("=")
+    if not values:
+        raise argparse.ArgumentTypeError(f"expected NAME=v1,v2,... got {text!r}")
+    return name.strip().upper(), [number(v) for v in values.split(",")]
+
+
+def expand_grid(axes: Dict[str, List[float]]) -> List[Dict[str, float]]:
+    """Every combination of the swept weights; an empty grid is just the current defaults"""
+    names = sorted(axes)
+    return [dict(zip(names, values)) for values in itertools.product(*(axes[name] for name in names))]
+
+
+def wilson_interval(wins: int, n: int, z: float = 1.96) -> Tuple[float, float]:
+    if n == 0:
+        return 0.0, 1.0
+    p = wins / n
+    centre = (p + z * z / (2 * n)) / (1 + z * z / n)
+    margin = z * math.sqrt(p * (1 - p) / n + z * z / (4 * n * n)) / (1 + z * z / n)
+    return max(0.0, centre - margin), min(1.0, centre + margin)
+
+
+def list_opponents(bot_names: List[str]) -> List[Tuple[str, str]]:
+    """(bot module, team name) for every bot against every bot team, as expert_main does"""
+    bots = sorted(f[:-3] for f in os.listdir(BOTS_FOLDER) if f.endswith(".py") and f != "__init__.py")
+    if bot_names:
+        bots = [b for b in bots if b in bot_names]
+    return [(bot, team) for bot in bots for team in read_bot_teams()]
+
+
+def play_job(job: int, agent_path: str, weights: Dict[str, float], bot: str, team_name: str, n_battles: int) -> Tuple[int, int]:
+    """Runs in a worker process: one weight configuration against one bot, returns (wins, finished)"""
+    module = load_module(agent_path, "sweep_agent")
+    module.RuleWeights.apply(weights)
+    bot_module = load_module(os.path.join(BOTS_FOLDER, f"{bot}.py"), f"sweep_{bot}")
+
+    # Showdown names are capped at 18 characters and must be unique across concurrent workers
+    agent = module.CustomAgent(
+        account_configuration=AccountConfiguration(f"sweep-{job}", None),
+        battle_format="gen9ubers",
+    )
+    opponent = bot_module.CustomAgent(
+        team=read_bot_teams()[team_name],
+        account_configuration=AccountConfiguration(f"b{job}-{bot[:6]}-{team_name}", None),
+        battle_format="gen9ubers",
+    )
+    asyncio.run(agent.battle_against(opponent, n_battles=n_battles))
+    return agent.n_won_battles, agent.n_finished_battles
+
+
+def sweep(agent_path: str, configs: List[Dict[str, float]], opponents: List[Tuple[str, str]], n_battles: int,
+          workers: int) -> List[Dict]:
+    results: List[Dict] = [{"weights": config, "wins": 0, "battles": 0} for config in configs]
+    jobs = [(i, bot, team) for i in range(len(configs)) for bot, team in opponents]
+    with ProcessPoolExecutor(workers, mp_context=spawn_context()) as pool:
+        futures = {
+            pool.submit(play_job, job, agent_path, configs[i], bot, team, n_battles): (i, bot, team)
+            for job, (i, bot, team) in enumerate(jobs)
+        }
+        for done, future in enumerate(as_completed(futures), 1):
+            i, bot, team = futures[future]
+            try:
+                wins, finished = future.result()
+            except Exception as error:
+                print(f"[{done}/{len(jobs)}] config {i} vs {bot}-{team} failed: {error}")
+                continue
+            results[i]["wins"] += wins
+            results[i]["battles"] += finished
+            print(f"[{done}/{len(jobs)}] config {i} vs {bot}-{team}: {wins}/{finished}")
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Win rate with 95% Wilson intervals for each rule-weight configuration")
+    parser.add_argument("--agent", default=AGENT_PATH)
+    parser.add_argument("--set", dest="axes", action="append", type=parse_axis, default=[],
+                        help="NAME=v1,v2,... for one RuleWeights entry; repeat to sweep several")
+    parser.add_argument("--grid", help="JSON file mapping RuleWeights names to lists of values")
+    parser.add_argument("--bots", nargs="*", default=[], help="bot modules to play (default: all)")
+    parser.add_argument("--battles", type=int, default=10, help="battles per configuration per bot team")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--output", help="write the results as JSON")
+    args = parser.parse_args()
+
+    axes: Dict[str, List[float]] = {}
+    if args.grid:
+        with open(args.grid, "r", encoding="utf-8") as file:
+            axes.update({name.upper(): [number(v) for v in values] for name, values in json.load(file).items()})
+    axes.update(dict(args.axes))
+
+    module = load_module(args.agent, "sweep_agent")
+    unknown = set(axes) - set(module.RuleWeights.names())
+    if unknown:
+        parser.error(f"unknown weights {sorted(unknown)}; choose from {module.RuleWeights.names()}")
+
+    configs = expand_grid(axes)
+    opponents = list_opponents(args.bots)
+    print(f"{len(configs)} configurations x {len(opponents)} opponents x {args.battles} battles on {args.workers} workers")
+    results = sweep(args.agent, configs, opponents, args.battles, args.workers)
+
+    rows = []
+    for result in sorted(results, key=lambda r: r["wins"] / max(r["battles"], 1), reverse=True):
+        low, high = wilson_interval(result["wins"], result["battles"])
+        result["win_rate"] = result["wins"] / max(result["battles"], 1)
+        result["interval"] = [low, high]
+        rows.append([", ".join(f"{k}={v:g}" for k, v in result["weights"].items()) or "defaults",
+                     f"{result['wins']}/{result['battles']}", result["win_rate"], f"[{low:.2f}, {high:.2f}]"])
+    print(tabulate(rows, headers=["Weights", "Wins", "Win rate", "95% CI"], floatfmt=".2f"))
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as file:
+            json.dump(results, file, indent=2)
+
+
+if __name__ == "__main__":
+    main()